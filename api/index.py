@@ -1,3 +1,12 @@
-from backend.app import app, socketio
+"""
+Vercel serverless entry point
+"""
+import os
+import sys
+
+# The backend modules import each other as top-level modules (`from models import db`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from backend.app import app
 
 __all__ = ['app']
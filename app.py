@@ -1,3 +1,9 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (`from models import db`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
 from backend.app import app, socketio
 
 if __name__ == '__main__':
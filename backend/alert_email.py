@@ -0,0 +1,362 @@
+"""
+Alert emails through a transactional outbox
+
+Creating an alert queues one alert_deliveries row per recipient in the
+same transaction (changes.before_commit), with a single INSERT ... SELECT
+over the users table: every active user for broadcast alerts, otherwise
+the users with the alert's target_role. The request that creates the alert
+never talks to the mail server.
+
+A background worker drains the outbox in batches of ALERT_EMAIL_BATCH_SIZE.
+It claims due rows with one UPDATE ... RETURNING (FOR UPDATE SKIP LOCKED
+on PostgreSQL), so workers in several processes never send the same email
+twice, and a claimed row whose worker died becomes due again once its
+lease expires. A batch is split over up to ALERT_EMAIL_CONNECTIONS SMTP
+connections, which stay open between batches; the outcome of the whole
+batch is written back in one statement.
+
+Failures are retried with exponential backoff (ALERT_EMAIL_RETRY_SECONDS,
+doubling, at most an hour) until ALERT_EMAIL_MAX_ATTEMPTS; permanent (5xx)
+rejections fail at once. The SMTP settings are the Flask-Mail MAIL_* keys.
+
+The worker thread starts with the first queued alert in each process
+(ALERT_EMAIL_WORKER, off in serverless mode). Without it, run
+`flask alerts deliver` periodically to drain the outbox.
+"""
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from itertools import repeat
+from sqlalchemy import bindparam, insert, literal, select, update
+import changes
+from models import db, Alert, AlertDelivery, DeliveryStatus, User, UserRole
+
+logger = logging.getLogger(__name__)
+
+CLAIM_LEASE_SECONDS = 300
+MAX_RETRY_SECONDS = 3600
+IDLE_CHECK_SECONDS = 10  # pooled connections idle longer are checked with NOOP before reuse
+MAX_IDLE_SECONDS = 60  # and closed after this long
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def recipients_query(alert):
+    """SELECT (user id, email) of the users an alert with these values is emailed to"""
+    users = User.__table__
+    query = select(users.c.id, users.c.email).where(users.c.is_active.is_not(False))
+    if not alert.get('is_broadcast'):
+        query = query.where(users.c.role == (alert.get('target_role') or UserRole.CITIZEN))
+    return query
+
+
+def render(alert, sender, recipient):
+    message = EmailMessage()
+    message['Subject'] = f"[{(alert.alert_level or 'info').upper()}] {alert.title}"
+    message['From'] = sender
+    message['To'] = recipient
+    message.set_content(f'{alert.message}\n\n-- \nDisaster Management System alert #{alert.id}\n')
+    return message
+
+
+def _is_permanent(error):
+    """5xx replies, and messages that cannot be built, will never be accepted"""
+    if not isinstance(error, (smtplib.SMTPException, OSError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _describe(error):
+    return f'{type(error).__name__}: {error}'[:255]
+
+
+class SMTPPool:
+    """SMTP connections opened on demand and kept open between batches"""
+
+    def __init__(self, settings, connect=None):
+        self.settings = settings
+        self.connect = connect or self._connect
+        self._idle = []  # (connection, released at)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        s = self.settings
+        smtp_class = smtplib.SMTP_SSL if s['use_ssl'] else smtplib.SMTP
+        connection = smtp_class(s['server'], s['port'], timeout=s['timeout'])
+        if s['use_tls']:
+            connection.starttls()
+        if s['username']:
+            connection.login(s['username'], s['password'])
+        return connection
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                connection, released = self._idle.pop() if self._idle else (None, None)
+            if connection is None:
+                return self.connect()
+            idle = time.monotonic() - released
+            if idle > MAX_IDLE_SECONDS:
+                self._close(connection)
+            elif idle > IDLE_CHECK_SECONDS and not self._alive(connection):
+                self._close(connection)
+            else:
+                return connection
+
+    def release(self, connection):
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    def discard(self, connection):
+        self._close(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    @staticmethod
+    def _alive(connection):
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+
+class AlertMailer:
+    """Queues alert emails at commit time and sends them from a worker thread"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.run_worker = False
+        self.batch_size = 200
+        self.connections = 2
+        self.max_attempts = 5
+        self.retry_seconds = 30.0
+        self.poll_seconds = 10.0
+        self.sender = None
+        self.pool = None
+        self._executor = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, connect=None):
+        self.shutdown()
+        config = app.config
+        self.app = app
+        self.enabled = config.get('ALERT_EMAIL_ENABLED', False)
+        self.run_worker = config.get('ALERT_EMAIL_WORKER', True)
+        self.batch_size = config.get('ALERT_EMAIL_BATCH_SIZE', 200)
+        self.connections = max(1, config.get('ALERT_EMAIL_CONNECTIONS', 2))
+        self.max_attempts = config.get('ALERT_EMAIL_MAX_ATTEMPTS', 5)
+        self.retry_seconds = config.get('ALERT_EMAIL_RETRY_SECONDS', 30.0)
+        self.poll_seconds = config.get('ALERT_EMAIL_POLL_SECONDS', 10.0)
+        self.sender = config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME') or 'alerts@localhost'
+        self.pool = SMTPPool({
+            'server': config.get('MAIL_SERVER') or 'localhost',
+            'port': config.get('MAIL_PORT', 25),
+            'use_tls': config.get('MAIL_USE_TLS', False),
+            'use_ssl': config.get('MAIL_USE_SSL', False),
+            'username': config.get('MAIL_USERNAME'),
+            'password': config.get('MAIL_PASSWORD'),
+            'timeout': config.get('MAIL_TIMEOUT', 30.0),
+        }, connect)
+        changes.before_commit(self.enqueue)
+        changes.on_commit(self.notify)
+
+    def enqueue(self, session, pending):
+        """Queue a delivery per recipient of every alert inserted in this transaction"""
+        if not self.enabled:
+            return
+        deliveries = AlertDelivery.__table__
+        status = deliveries.c.status.type
+        now = _utcnow()
+        for change in pending:
+            if change.model is not Alert or change.kind != 'insert':
+                continue
+            recipients = recipients_query(change.values).subquery()
+            session.connection().execute(insert(deliveries).from_select(
+                ['alert_id', 'user_id', 'email', 'status', 'attempts', 'next_attempt_at', 'created_at'],
+                select(
+                    literal(change.values['id']), recipients.c.id, recipients.c.email,
+                    literal(DeliveryStatus.PENDING, status), literal(0), literal(now), literal(now)
+                )
+            ))
+
+    def notify(self, committed):
+        if self.enabled and self.run_worker and any(
+            c.model is Alert and c.kind == 'insert' for c in committed
+        ):
+            self._ensure_worker()
+            self._wake.set()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='alert-email', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.deliver_pending()
+            except Exception:
+                logger.exception('Alert email delivery failed')
+            self._wake.wait(self.poll_seconds)
+
+    def deliver_pending(self):
+        """Send due emails batch by batch until none are left; {'sent', 'retry', 'failed'} counts"""
+        totals = {'sent': 0, 'retry': 0, 'failed': 0}
+        while not self._stop.is_set():
+            outcome = self.deliver_batch()
+            if outcome is None:
+                break
+            for key, count in outcome.items():
+                totals[key] += count
+        return totals
+
+    def deliver_batch(self):
+        """Claim, send and settle one batch; None when nothing is due"""
+        claimed, alerts = self._claim()
+        if not claimed:
+            return None
+
+        chunks = [claimed[n::self.connections] for n in range(self.connections)]
+        errors = {}
+        for result in self._pool_executor().map(self._send_chunk, [c for c in chunks if c], repeat(alerts)):
+            errors.update(result)
+        return self._settle(claimed, errors)
+
+    def _claim(self):
+        """(claimed delivery rows, {alert id: alert row}) in one short transaction"""
+        table = AlertDelivery.__table__
+        now = _utcnow()
+        due = (table.c.status == DeliveryStatus.PENDING, table.c.next_attempt_at <= now)
+        ids = select(table.c.id).where(*due).order_by(table.c.next_attempt_at, table.c.id) \
+            .limit(self.batch_size).with_for_update(skip_locked=True)
+        alerts = Alert.__table__
+        with db.engine.begin() as conn:
+            claimed = conn.execute(
+                update(table).where(table.c.id.in_(ids.scalar_subquery()), *due)
+                .values(attempts=table.c.attempts + 1,
+                        next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+                .returning(table.c.id, table.c.alert_id, table.c.email, table.c.attempts)
+            ).all()
+            if not claimed:
+                return [], {}
+            rows = conn.execute(select(alerts).where(alerts.c.id.in_({row.alert_id for row in claimed})))
+            return claimed, {row.id: row for row in rows}
+
+    def _pool_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.connections, thread_name_prefix='alert-smtp')
+            return self._executor
+
+    def _send_chunk(self, rows, alerts):
+        """{delivery id: error} for the rows not sent; one connection for the whole chunk"""
+        errors = {}
+        connection = None
+        for n, row in enumerate(rows):
+            alert = alerts.get(row.alert_id)
+            if alert is None:
+                errors[row.id] = LookupError('alert was deleted')
+                continue
+            try:
+                message = render(alert, self.sender, row.email).as_bytes()
+            except ValueError as e:  # e.g. a line break in the title
+                errors[row.id] = e
+                continue
+            if connection is None:
+                try:
+                    connection = self.pool.acquire()
+                except (smtplib.SMTPException, OSError) as e:
+                    # including a refused login: the rest of the chunk is retried later
+                    unreachable = ConnectionError(_describe(e))
+                    errors.update((r.id, unreachable) for r in rows[n:] if r.id not in errors)
+                    break
+            try:
+                connection.sendmail(self.sender, [row.email], message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                # the server answered; the connection is still usable
+                errors[row.id] = e
+            except (smtplib.SMTPException, OSError) as e:
+                errors[row.id] = e
+                self.pool.discard(connection)
+                connection = None
+        if connection is not None:
+            self.pool.release(connection)
+        return errors
+
+    def _settle(self, claimed, errors):
+        table = AlertDelivery.__table__
+        now = _utcnow()
+        outcome = {'sent': 0, 'retry': 0, 'failed': 0}
+        params = []
+        for row in claimed:
+            error = errors.get(row.id)
+            if error is None:
+                status, due, outcome_key = DeliveryStatus.SENT, now, 'sent'
+            elif _is_permanent(error) or row.attempts >= self.max_attempts:
+                status, due, outcome_key = DeliveryStatus.FAILED, now, 'failed'
+            else:
+                delay = min(self.retry_seconds * 2 ** (row.attempts - 1), MAX_RETRY_SECONDS)
+                status, due, outcome_key = DeliveryStatus.PENDING, now + timedelta(seconds=delay), 'retry'
+            outcome[outcome_key] += 1
+            params.append({
+                'row_id': row.id, 'row_status': status, 'row_due': due,
+                'row_sent_at': now if error is None else None,
+                'row_error': None if error is None else _describe(error),
+            })
+            if error is not None:
+                logger.warning('Alert email %s to %s: %s', row.id, row.email, _describe(error))
+
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.id == bindparam('row_id')).values(
+                    status=bindparam('row_status'), next_attempt_at=bindparam('row_due'),
+                    sent_at=bindparam('row_sent_at'), last_error=bindparam('row_error')
+                ),
+                params
+            )
+        return outcome
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self.pool is not None:
+            self.pool.close()
+        self._stop.clear()
+
+
+alert_mailer = AlertMailer()
@@ -0,0 +1,438 @@
+"""
+Resource allocation: which open reports each resource's quantity should go to
+
+Open reports (pending, acknowledged or in progress, with a position) are
+the demand: each wants ALLOCATION_DEMAND units of a resource type by
+severity. Available resources with a quantity and a "lat,lon" location
+are the supply of their resource_type. Each type is solved on its own as a
+min-cost flow in which every unit of demand reaches the sink one of two
+ways:
+
+    report -> resource -> sink   cost: distance; only the report's
+                                 ALLOCATION_NEIGHBOURS nearest resources
+                                 within ALLOCATION_MAX_DISTANCE_KM, and no
+                                 more than each resource's quantity
+    report -> sink               shortage edge; its cost grows with severity
+                                 and outweighs any distance
+
+so the flow covers as much demand as the supply can reach, severe reports
+first, over the shortest distances.
+
+Solvers, in order of preference:
+- scipy:         the same flow as a linear program for HiGHS (linprog), used
+                 when scipy and numpy are installed
+- min_cost_flow: exact pure-Python successive shortest paths, for up to
+                 ALLOCATION_EXACT_LIMIT report-resource edges
+- greedy:        fills the edges that save the most first
+
+Finding each report's nearest resources is the other expensive part.
+DistanceMatrix keeps those lists between requests and updates them from
+committed resource and report changes; it is reloaded after
+ALLOCATION_MATRIX_TTL seconds so writes from other workers show up.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import namedtuple
+import changes
+import geo
+from assignment import SEVERITY_RANK, parse_location
+from geo import np
+from models import db, DisasterReport, DisasterSeverity, ReportStatus, Resource
+from replicas import replica_router
+
+try:
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+except ImportError:  # optional; the pure-Python solvers are used instead
+    linprog = None
+
+OPEN_REPORT_STATUSES = (ReportStatus.PENDING, ReportStatus.ACKNOWLEDGED, ReportStatus.IN_PROGRESS)
+COST_SCALE = 1000  # integer cost of moving a unit ALLOCATION_MAX_DISTANCE_KM
+SHORTAGE_PENALTY = {severity: COST_SCALE * (2 + rank) for severity, rank in SEVERITY_RANK.items()}
+_GRID_CELLS_PER_RADIUS = 8
+_REPORT_FIELDS = {'status', 'latitude', 'longitude', 'severity'}
+_RESOURCE_FIELDS = {'resource_type', 'quantity', 'location', 'availability'}
+
+Allocation = namedtuple('Allocation', ['resource_id', 'report_id', 'quantity', 'distance_km'])
+Shortage = namedtuple('Shortage', ['report_id', 'severity', 'demand', 'allocated'])
+TypePlan = namedtuple('TypePlan', ['resource_type', 'supply', 'demand', 'allocated', 'allocations', 'shortages', 'solver'])
+
+
+def parse_demand(value):
+    """{severity: units} from "low,medium,high,critical" units, e.g. "1,2,3,5" """
+    units = [int(part) for part in str(value).split(',')]
+    if len(units) != len(DisasterSeverity) or min(units) < 0:
+        raise ValueError('ALLOCATION_DEMAND needs one non-negative integer per severity, low to critical')
+    return dict(zip(DisasterSeverity, units))
+
+
+def min_cost_flow(supply, demand, penalty, edges):
+    """Units sent along each (supplier, consumer, cost) edge.
+
+    Supplier i has supply[i] units, consumer j needs demand[j] units and
+    every unit it goes without costs penalty[j]; edge costs are per unit.
+    All costs must be non-negative integers. The network has an edge from
+    each consumer to each of its suppliers and a shortage edge straight to
+    the sink, and every unit of demand is routed to the sink at least cost.
+
+    Successive shortest paths, one consumer at a time: Dijkstra on reduced
+    costs from that consumer, stopping as soon as the sink is reached (its
+    own shortage edge always gets there). Only the nodes settled before
+    the sink get their potentials changed; shifting every potential by the
+    same amount changes no reduced cost. Searches mostly stay local, around
+    the suppliers a consumer competes for; they spread out where supply runs
+    short.
+    """
+    consumers, suppliers = len(demand), len(supply)
+    sink = 0  # node 0, so it wins ties on the heap
+    size = 1 + consumers + suppliers
+    head = [[] for _ in range(size)]
+    to, capacity, cost = [], [], []
+
+    def add_edge(u, v, cap, c):
+        # edge e and its residual twin e ^ 1
+        head[u].append(len(to))
+        head[v].append(len(to) + 1)
+        to.extend((v, u))
+        capacity.extend((cap, 0))
+        cost.extend((c, -c))
+
+    for j, units in enumerate(demand):
+        add_edge(1 + j, sink, units, penalty[j])
+    edge_ids = []
+    for i, j, c in edges:
+        edge_ids.append(len(to))
+        add_edge(1 + j, 1 + consumers + i, min(supply[i], demand[j]), c)
+    for i, units in enumerate(supply):
+        add_edge(1 + consumers + i, sink, units, 0)
+
+    inf = float('inf')
+    potential = [0] * size
+    distance = [inf] * size
+    via = [-1] * size
+    # the most severe first, so the less severe rarely have to displace them
+    for j in sorted(range(consumers), key=penalty.__getitem__, reverse=True):
+        start, excess = 1 + j, demand[j]
+        while excess:
+            distance[start] = 0
+            heap, settled = [(0, start)], []
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > distance[u]:
+                    continue
+                if u == sink:
+                    break
+                settled.append(u)
+                pu = potential[u]
+                for e in head[u]:
+                    if capacity[e]:
+                        v = to[e]
+                        nd = d + cost[e] + pu - potential[v]
+                        if nd < distance[v]:
+                            distance[v] = nd
+                            via[v] = e
+                            heapq.heappush(heap, (nd, v))
+            reached = distance[sink]
+            for u in settled:
+                potential[u] += distance[u] - reached
+
+            path, v = [], sink
+            while v != start:
+                e = via[v]
+                path.append(e)
+                v = to[e ^ 1]
+            pushed = min(excess, min(capacity[e] for e in path))
+            for e in path:
+                capacity[e] -= pushed
+                capacity[e ^ 1] += pushed
+            excess -= pushed
+
+            for u in settled:
+                distance[u] = inf
+            for _, u in heap:
+                distance[u] = inf
+            distance[sink] = inf
+
+    return [capacity[e ^ 1] for e in edge_ids]
+
+
+def greedy_flow(supply, demand, penalty, edges):
+    """Units sent along each (supplier, consumer, cost) edge, the biggest savings first"""
+    left, need = list(supply), list(demand)
+    flows = [0] * len(edges)
+    for k in sorted(range(len(edges)), key=lambda k: edges[k][2] - penalty[edges[k][1]]):
+        i, j, c = edges[k]
+        if c >= penalty[j]:
+            break
+        units = min(left[i], need[j])
+        if units:
+            flows[k] = units
+            left[i] -= units
+            need[j] -= units
+    return flows
+
+
+def _linprog_flow(supply, demand, penalty, edges):
+    """min_cost_flow as a linear program; its constraint matrix is totally
+    unimodular, so the simplex vertex solution is integral"""
+    count = len(edges)
+    rows = [i for i, _, _ in edges] + [len(supply) + j for _, j, _ in edges]
+    columns = list(range(count)) * 2
+    limits = coo_matrix((np.ones(2 * count), (rows, columns)), shape=(len(supply) + len(demand), count))
+    savings = np.array([c - penalty[j] for _, j, c in edges], dtype=float)
+    result = linprog(savings, A_ub=limits.tocsr(), b_ub=np.array(list(supply) + list(demand), dtype=float),
+                     bounds=(0, None), method='highs-ds')
+    return [int(round(units)) for units in result.x]
+
+
+class _TypeIndex:
+    """Available resources of one type and, once built, each report's nearest ones"""
+
+    def __init__(self, cell_km):
+        self.grid = geo.PointGrid(cell_km)
+        self.rows = None   # report_id -> [(distance_km, resource_id)], nearest first
+        self.users = None  # resource_id -> {report_id} whose row lists it
+
+
+class DistanceMatrix:
+    """Per resource type: each open report's nearest available resources"""
+
+    def __init__(self, max_distance_km=100.0, neighbours=10, ttl=300):
+        self.max_distance_km = max_distance_km
+        self.neighbours = neighbours
+        self.ttl = ttl
+        self._reports = None    # report_id -> (latitude, longitude, severity), open reports with a position
+        self._report_grid = None
+        self._resources = {}    # resource_id -> (resource_type, latitude, longitude)
+        self._types = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_distance_km = app.config.get('ALLOCATION_MAX_DISTANCE_KM', self.max_distance_km)
+        self.neighbours = app.config.get('ALLOCATION_NEIGHBOURS', self.neighbours)
+        self.ttl = app.config.get('ALLOCATION_MATRIX_TTL', self.ttl)
+        self.invalidate()
+        changes.on_commit(self.apply_changes)
+
+    def invalidate(self):
+        with self._lock:
+            self._reports = None
+
+    @property
+    def _cell_km(self):
+        return self.max_distance_km / _GRID_CELLS_PER_RADIUS
+
+    def _ensure_loaded(self):
+        if self._reports is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        self._reports, self._report_grid = {}, geo.PointGrid(self._cell_km)
+        self._resources, self._types = {}, {}
+        with replica_router.primary():
+            reports = db.session.query(
+                DisasterReport.id, DisasterReport.latitude, DisasterReport.longitude, DisasterReport.severity
+            ).filter(DisasterReport.status.in_(OPEN_REPORT_STATUSES), DisasterReport.geohash.isnot(None)).all()
+            resources = db.session.query(
+                Resource.id, Resource.resource_type, Resource.location
+            ).filter(Resource.availability == 'available', Resource.quantity > 0).all()
+        for report_id, latitude, longitude, severity in reports:
+            self._add_report(report_id, latitude, longitude, severity)
+        for resource_id, resource_type, location in resources:
+            latitude, longitude = parse_location(location)
+            if latitude is not None:
+                self._add_resource(resource_id, resource_type, latitude, longitude)
+        self._loaded_at = time.monotonic()
+
+    # Keeping rows up to date
+
+    def _fill_row(self, index, report_id):
+        latitude, longitude, _ = self._reports[report_id]
+        self._drop_row(index, report_id)
+        row = index.grid.nearest(latitude, longitude, self.neighbours, self.max_distance_km)
+        index.rows[report_id] = row
+        for _, resource_id in row:
+            index.users.setdefault(resource_id, set()).add(report_id)
+
+    def _drop_row(self, index, report_id):
+        for _, resource_id in index.rows.pop(report_id, ()):
+            index.users[resource_id].discard(report_id)
+
+    def _build(self, index):
+        index.rows, index.users = {}, {}
+        for report_id in self._reports:
+            self._fill_row(index, report_id)
+
+    def _add_report(self, report_id, latitude, longitude, severity):
+        self._reports[report_id] = (latitude, longitude, severity or DisasterSeverity.MEDIUM)
+        self._report_grid.add(report_id, latitude, longitude)
+        for index in self._types.values():
+            if index.rows is not None:
+                self._fill_row(index, report_id)
+
+    def _remove_report(self, report_id):
+        if self._reports.pop(report_id, None) is None:
+            return
+        for index in self._types.values():
+            if index.rows is not None:
+                self._drop_row(index, report_id)
+        self._report_grid.remove(report_id)
+
+    def _add_resource(self, resource_id, resource_type, latitude, longitude):
+        self._resources[resource_id] = (resource_type, latitude, longitude)
+        index = self._types.get(resource_type)
+        if index is None:
+            index = self._types[resource_type] = _TypeIndex(self._cell_km)
+        index.grid.add(resource_id, latitude, longitude)
+        if index.rows is None:
+            return
+        # only reports within reach can gain it as one of their nearest
+        for distance, report_id in self._report_grid.within(latitude, longitude, self.max_distance_km):
+            row = index.rows[report_id]
+            if len(row) == self.neighbours and distance >= row[-1][0]:
+                continue
+            bisect.insort(row, (distance, resource_id))
+            index.users.setdefault(resource_id, set()).add(report_id)
+            if len(row) > self.neighbours:
+                _, evicted = row.pop()
+                index.users[evicted].discard(report_id)
+
+    def _remove_resource(self, resource_id):
+        known = self._resources.pop(resource_id, None)
+        if known is None:
+            return
+        index = self._types[known[0]]
+        index.grid.remove(resource_id)
+        if index.rows is not None:
+            for report_id in list(index.users.get(resource_id, ())):
+                self._fill_row(index, report_id)
+            index.users.pop(resource_id, None)
+
+    def apply_changes(self, committed):
+        with self._lock:
+            if self._reports is None:
+                return
+            for change in committed:
+                if change.model not in (DisasterReport, Resource):
+                    continue
+                if change.kind == 'bulk':
+                    self._reports = None
+                    return
+                fields = _REPORT_FIELDS if change.model is DisasterReport else _RESOURCE_FIELDS
+                if change.kind == 'update' and not fields & set(change.previous):
+                    continue
+                values = change.values
+                if 'id' not in values:
+                    continue
+                if change.kind != 'delete' and not fields <= set(values):
+                    self._reports = None  # state not fully known; reload on next use
+                    return
+
+                if change.model is DisasterReport:
+                    self._remove_report(values['id'])
+                    if change.kind != 'delete' and values['status'] in OPEN_REPORT_STATUSES \
+                            and geo.valid_coordinates(values['latitude'], values['longitude']):
+                        self._add_report(values['id'], values['latitude'], values['longitude'], values['severity'])
+                    continue
+
+                latitude, longitude = parse_location(values.get('location'))
+                wanted = None
+                if change.kind != 'delete' and values['availability'] == 'available' \
+                        and (values['quantity'] or 0) > 0 and latitude is not None:
+                    wanted = (values['resource_type'], latitude, longitude)
+                if self._resources.get(values['id']) != wanted:
+                    self._remove_resource(values['id'])
+                    if wanted is not None:
+                        self._add_resource(values['id'], *wanted)
+
+    def snapshot(self, resource_type):
+        """({report_id: severity}, {report_id: [(distance_km, resource_id)]}) for one type"""
+        with self._lock:
+            self._ensure_loaded()
+            severities = {report_id: severity for report_id, (_, _, severity) in self._reports.items()}
+            index = self._types.get(resource_type)
+            if index is None:
+                return severities, {}
+            if index.rows is None:
+                self._build(index)
+            return severities, {report_id: list(row) for report_id, row in index.rows.items() if row}
+
+
+distance_matrix = DistanceMatrix()
+
+
+class ResourceAllocator:
+    def __init__(self, matrix, demand=None, exact_limit=10000):
+        self.matrix = matrix
+        self.demand = demand or parse_demand('1,2,3,5')
+        self.exact_limit = exact_limit
+
+    def init_app(self, app):
+        self.demand = parse_demand(app.config.get('ALLOCATION_DEMAND', '1,2,3,5'))
+        self.exact_limit = app.config.get('ALLOCATION_EXACT_LIMIT', self.exact_limit)
+
+    def supply(self, resource_types=None):
+        """{resource_type: {resource_id: quantity}} of available resources"""
+        query = db.session.query(Resource.id, Resource.resource_type, Resource.quantity).filter(
+            Resource.availability == 'available', Resource.quantity > 0
+        )
+        if resource_types:
+            query = query.filter(Resource.resource_type.in_(resource_types))
+        supply = {}
+        for resource_id, resource_type, quantity in query:
+            supply.setdefault(resource_type, {})[resource_id] = quantity
+        return supply
+
+    def solve(self, resource_type, quantities, severities, rows):
+        """TypePlan for one type from resource quantities, report severities and nearest-resource rows"""
+        resource_ids = [resource_id for resource_id in quantities]
+        resource_index = {resource_id: i for i, resource_id in enumerate(resource_ids)}
+        report_ids = [report_id for report_id in severities if self.demand[severities[report_id]] > 0]
+        demand = [self.demand[severities[report_id]] for report_id in report_ids]
+        penalty = [SHORTAGE_PENALTY[severities[report_id]] for report_id in report_ids]
+
+        edges, distances = [], []
+        scale = COST_SCALE / self.matrix.max_distance_km
+        for j, report_id in enumerate(report_ids):
+            for distance, resource_id in rows.get(report_id, ()):
+                i = resource_index.get(resource_id)
+                if i is not None:
+                    edges.append((i, j, round(distance * scale)))
+                    distances.append(distance)
+
+        supply = [quantities[resource_id] for resource_id in resource_ids]
+        if not edges:
+            solver, flows = 'none', []
+        elif linprog is not None and np is not None:
+            solver, flows = 'scipy', _linprog_flow(supply, demand, penalty, edges)
+        elif len(edges) <= self.exact_limit:
+            solver, flows = 'min_cost_flow', min_cost_flow(supply, demand, penalty, edges)
+        else:
+            solver, flows = 'greedy', greedy_flow(supply, demand, penalty, edges)
+
+        allocations = []
+        allocated = [0] * len(report_ids)
+        for (i, j, _), distance, units in zip(edges, distances, flows):
+            if units:
+                allocations.append(Allocation(resource_ids[i], report_ids[j], units, round(distance, 3)))
+                allocated[j] += units
+        allocations.sort(key=lambda a: (a.resource_id, a.distance_km))
+        shortages = sorted(
+            (Shortage(report_id, severities[report_id].value, demand[j], allocated[j])
+             for j, report_id in enumerate(report_ids) if allocated[j] < demand[j]),
+            key=lambda s: (-SEVERITY_RANK[DisasterSeverity(s.severity)], s.report_id)
+        )
+        return TypePlan(resource_type, sum(supply), sum(demand), sum(allocated), allocations, shortages, solver)
+
+    def plan(self, resource_types=None):
+        """[TypePlan] for the given resource types, or every type with available supply"""
+        supply = self.supply(resource_types)
+        plans = []
+        for resource_type in sorted(resource_types or supply):
+            severities, rows = self.matrix.snapshot(resource_type)
+            plans.append(self.solve(resource_type, supply.get(resource_type, {}), severities, rows))
+        return plans
+
+
+resource_allocator = ResourceAllocator(distance_matrix)
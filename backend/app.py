@@ -3,23 +3,56 @@ Main Flask Application for Disaster Management System
 """
 import os
 import tempfile
+import threading
 from flask import Flask, request
 from flask_cors import CORS
 from flask_login import LoginManager
-from flask_socketio import SocketIO
 from dotenv import load_dotenv
-from models import db, User, UserRole, init_db
+from models import db
+from stats import stats_cache, volunteer_task_counts
+from response_cache import response_cache
+from realtime import broadcaster
+from spatial import active_grid
+from pagination import count_cache
+from passwords import hasher
+from identity import identity_cache
+from clustering import cluster_index
+from assignment import assignment_solver
+from allocation import distance_matrix, resource_allocator
+from search import search_index
+from rollups import rollup_maintainer
+from alert_email import alert_mailer
+import database
+from database import write_queue
+from replicas import replica_router
+from metrics import request_metrics
+from query_profiler import query_profiler
+import migrations
+from cli import register_cli
+from startup import PhaseTimer, env_flag, is_serverless
 
 # Load environment variables
 load_dotenv()
 
 # Initialize extensions
-socketio = SocketIO()
+# Created by the first app with ENABLE_SOCKETIO, so flask_socketio is only imported when used
+socketio = None
 login_manager = LoginManager()
 
 
+def _socketio():
+    global socketio
+    if socketio is None:
+        from flask_socketio import SocketIO
+        socketio = SocketIO()
+    return socketio
+
+
 def create_app(config_name='development'):
     """Application factory"""
+    timer = PhaseTimer()
+    serverless = is_serverless()
+    
     # Set up static file paths for frontend
     frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
     base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -29,14 +62,17 @@ def create_app(config_name='development'):
     os.makedirs(database_path, exist_ok=True)
     
     app = Flask(__name__, static_folder=frontend_path, static_url_path='')
+    # Serverless filesystems are read-only outside /tmp
+    app.config['LOG_TO_FILE'] = env_flag('LOG_TO_FILE', not serverless)
 
     # Register centralized error handlers early so they catch errors during initialization
-    try:
-        from error_handlers import register_error_handlers
-        register_error_handlers(app)
-    except Exception:
-        import traceback as _tb
-        print('Failed to register error handlers early:', _tb.format_exc())
+    with timer.phase('error handlers'):
+        try:
+            from error_handlers import register_error_handlers
+            register_error_handlers(app)
+        except Exception:
+            import traceback as _tb
+            print('Failed to register error handlers early:', _tb.format_exc())
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-this')
@@ -55,18 +91,126 @@ def create_app(config_name='development'):
     print(f'[DEBUG] Database URI: {db_uri}')
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DATABASE_POOL_SIZE'] = int(os.getenv('DATABASE_POOL_SIZE', 5))
+    app.config['DATABASE_MAX_OVERFLOW'] = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
+    app.config['DATABASE_POOL_TIMEOUT'] = float(os.getenv('DATABASE_POOL_TIMEOUT', 30))
+    app.config['DATABASE_POOL_RECYCLE'] = int(os.getenv('DATABASE_POOL_RECYCLE', 1800))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(db_uri, app.config)
+    app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS', '')
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', 10))
+    app.config['REPLICA_CHECK_SECONDS'] = float(os.getenv('REPLICA_CHECK_SECONDS', 10))
+    sqlite_file = database.is_sqlite_file(db_uri)
+    app.config['METRICS_ENABLED'] = env_flag('METRICS_ENABLED', True)
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['METRICS_TIMING_HEADERS'] = env_flag('METRICS_TIMING_HEADERS', False)
+    app.config['QUERY_PROFILER'] = env_flag('QUERY_PROFILER', False)
+    app.config['QUERY_PROFILER_MAX_REPEATS'] = int(os.getenv('QUERY_PROFILER_MAX_REPEATS', 3))
+    app.config['QUERY_PROFILER_SLOW_MS'] = float(os.getenv('QUERY_PROFILER_SLOW_MS', 100))
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    app.config['SQLITE_WRITE_QUEUE'] = sqlite_file and env_flag('SQLITE_WRITE_QUEUE', True)
+    app.config['WRITE_QUEUE_MAX_BATCH'] = int(os.getenv('WRITE_QUEUE_MAX_BATCH', 64))
+    app.config['WRITE_QUEUE_TIMEOUT'] = float(os.getenv('WRITE_QUEUE_TIMEOUT', 30))
     app.config['JSON_SORT_KEYS'] = False
+    app.config['EXPORT_CHUNK_SIZE'] = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+    app.config['EXPORT_WATERMARK_LAG'] = float(os.getenv('EXPORT_WATERMARK_LAG', 30))
+    app.config['BULK_INGEST_BATCH_SIZE'] = int(os.getenv('BULK_INGEST_BATCH_SIZE', 500))
+    app.config['BULK_INGEST_MAX_ROWS'] = int(os.getenv('BULK_INGEST_MAX_ROWS', 10000))
+    app.config['BULK_ADMIN_MAX_REPORTS'] = int(os.getenv('BULK_ADMIN_MAX_REPORTS', 1000))
+    app.config['CLUSTERING_ENABLED'] = env_flag('CLUSTERING_ENABLED', True)
+    app.config['CLUSTER_RADIUS_KM'] = float(os.getenv('CLUSTER_RADIUS_KM', 1.0))
+    app.config['CLUSTER_WINDOW_MINUTES'] = int(os.getenv('CLUSTER_WINDOW_MINUTES', 360))
+    app.config['CLUSTER_SIMILARITY'] = float(os.getenv('CLUSTER_SIMILARITY', 0.5))
+    app.config['ASSIGNMENT_MAX_DISTANCE_KM'] = float(os.getenv('ASSIGNMENT_MAX_DISTANCE_KM', 50))
+    app.config['ASSIGNMENT_MAX_OPEN_TASKS'] = int(os.getenv('ASSIGNMENT_MAX_OPEN_TASKS', 3))
+    app.config['ASSIGNMENT_LOAD_WEIGHT'] = float(os.getenv('ASSIGNMENT_LOAD_WEIGHT', 0.5))
+    app.config['ASSIGNMENT_SEVERITY_WEIGHT'] = float(os.getenv('ASSIGNMENT_SEVERITY_WEIGHT', 1.0))
+    app.config['ASSIGNMENT_CANDIDATES'] = int(os.getenv('ASSIGNMENT_CANDIDATES', 20))
+    app.config['ASSIGNMENT_EXACT_LIMIT'] = int(os.getenv('ASSIGNMENT_EXACT_LIMIT', 40000))
+    app.config['ALLOCATION_DEMAND'] = os.getenv('ALLOCATION_DEMAND', '1,2,3,5')
+    app.config['ALLOCATION_MAX_DISTANCE_KM'] = float(os.getenv('ALLOCATION_MAX_DISTANCE_KM', 100))
+    app.config['ALLOCATION_NEIGHBOURS'] = int(os.getenv('ALLOCATION_NEIGHBOURS', 10))
+    app.config['ALLOCATION_EXACT_LIMIT'] = int(os.getenv('ALLOCATION_EXACT_LIMIT', 10000))
+    app.config['ALLOCATION_MATRIX_TTL'] = float(os.getenv('ALLOCATION_MATRIX_TTL', 300))
+    app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'auto')
+    app.config['SEARCH_INDEX_TTL'] = float(os.getenv('SEARCH_INDEX_TTL', 300))
+    app.config['ROLLUPS_ENABLED'] = env_flag('ROLLUPS_ENABLED', True)
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 25))
+    app.config['MAIL_USE_TLS'] = env_flag('MAIL_USE_TLS', False)
+    app.config['MAIL_USE_SSL'] = env_flag('MAIL_USE_SSL', False)
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+    app.config['ALERT_EMAIL_ENABLED'] = env_flag('ALERT_EMAIL_ENABLED', bool(app.config['MAIL_SERVER']))
+    app.config['ALERT_EMAIL_WORKER'] = env_flag('ALERT_EMAIL_WORKER', not serverless)
+    app.config['ALERT_EMAIL_BATCH_SIZE'] = int(os.getenv('ALERT_EMAIL_BATCH_SIZE', 200))
+    app.config['ALERT_EMAIL_CONNECTIONS'] = int(os.getenv('ALERT_EMAIL_CONNECTIONS', 2))
+    app.config['ALERT_EMAIL_MAX_ATTEMPTS'] = int(os.getenv('ALERT_EMAIL_MAX_ATTEMPTS', 5))
+    app.config['ALERT_EMAIL_RETRY_SECONDS'] = float(os.getenv('ALERT_EMAIL_RETRY_SECONDS', 30))
+    app.config['ALERT_EMAIL_POLL_SECONDS'] = float(os.getenv('ALERT_EMAIL_POLL_SECONDS', 10))
+    app.config['STATS_CACHE_TTL'] = float(os.getenv('STATS_CACHE_TTL', 30))
+    app.config['RESPONSE_CACHE_URL'] = os.getenv('RESPONSE_CACHE_URL', 'memory://')
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    app.config['RESPONSE_CACHE_MAX_AGE'] = int(os.getenv('RESPONSE_CACHE_MAX_AGE', 5))
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    app.config['REALTIME_COALESCE_MS'] = int(os.getenv('REALTIME_COALESCE_MS', 100))
+    app.config['SPATIAL_GRID_TTL'] = float(os.getenv('SPATIAL_GRID_TTL', 60))
+    app.config['PAGINATION_COUNT_TTL'] = float(os.getenv('PAGINATION_COUNT_TTL', 30))
+    app.config['VOLUNTEER_SUMMARY_TTL'] = float(os.getenv('VOLUNTEER_SUMMARY_TTL', 300))
+    app.config['ENABLE_SOCKETIO'] = env_flag('ENABLE_SOCKETIO', not serverless)
+    app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE') or None
+    app.config['AUTO_INIT_DB'] = env_flag('AUTO_INIT_DB', not serverless)
+    app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', 60))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 10000))
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 0 if serverless else 2))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0)) or None
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
     
     # Initialize extensions
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
-    db.init_app(app)
-    login_manager.init_app(app)
-    socketio.init_app(app, cors_allowed_origins='*')
+    with timer.phase('extensions'):
+        CORS(app, resources={r"/api/*": {"origins": "*"}})
+        db.init_app(app)
+        database.init_app(app)
+        request_metrics.init_app(app)
+        query_profiler.init_app(app)
+        write_queue.init_app(app)
+        replica_router.init_app(app)
+        login_manager.init_app(app)
+        stats_cache.init_app(app)
+        volunteer_task_counts.init_app(app)
+        response_cache.init_app(app)
+        active_grid.init_app(app)
+        count_cache.init_app(app)
+        hasher.init_app(app)
+        identity_cache.init_app(app)
+        cluster_index.init_app(app)
+        assignment_solver.init_app(app)
+        distance_matrix.init_app(app)
+        resource_allocator.init_app(app)
+        search_index.init_app(app)
+        rollup_maintainer.init_app(app)
+        alert_mailer.init_app(app)
     
-    # User loader for Flask-Login
+    if app.config['ENABLE_SOCKETIO']:
+        with timer.phase('socketio'):
+            server = _socketio()
+            # Socket handlers are registered first so the server built by init_app picks them up
+            broadcaster.init_app(app, server)
+            server.init_app(
+                app, cors_allowed_origins='*',
+                message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+                async_mode=app.config['SOCKETIO_ASYNC_MODE']
+            )
+    
+    # User loader for Flask-Login: a cached read-only snapshot (identity.py)
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        return identity_cache.get(int(user_id))
     
     # Custom unauthorized handler - returns 401 for all requests (no redirects)
     @login_manager.unauthorized_handler
@@ -77,12 +221,15 @@ def create_app(config_name='development'):
         return redirect(url_for('serve_index'))
     
     # Register blueprints
-    from routes import auth_bp, admin_bp, citizen_bp, volunteer_bp, api_bp
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(admin_bp)
-    app.register_blueprint(citizen_bp)
-    app.register_blueprint(volunteer_bp)
-    app.register_blueprint(api_bp)
+    with timer.phase('blueprints'):
+        from routes import auth_bp, admin_bp, citizen_bp, volunteer_bp, api_bp
+        app.register_blueprint(auth_bp)
+        app.register_blueprint(admin_bp)
+        app.register_blueprint(citizen_bp)
+        app.register_blueprint(volunteer_bp)
+        app.register_blueprint(api_bp)
+    
+    register_cli(app)
     
     # (error handlers already registered early)
     # Error handlers
@@ -110,14 +257,20 @@ def create_app(config_name='development'):
         from flask import send_from_directory
         return send_from_directory(frontend_path, 'index.html')
     
-    # Initialize database on first request (but skip for health check)
-    @app.before_request
+    # Initialize database on first request (but skip for health check).
+    # Deployments that run `flask db init` set AUTO_INIT_DB=0 and skip this entirely.
+    # Concurrent first requests wait for one of them to finish it.
+    init_lock = threading.Lock()
+    initialized = False
+    
     def initialize_db():
-        # Skip DB initialization for health check endpoint
-        if request.path == '/api/health':
+        nonlocal initialized
+        if initialized or request.path == '/api/health':
             return
         
-        if not hasattr(app, 'db_initialized'):
+        with init_lock:
+            if initialized:
+                return
             try:
                 # Ensure the database directory exists (if using file-based SQLite)
                 db_uri = app.config['SQLALCHEMY_DATABASE_URI']
@@ -128,29 +281,21 @@ def create_app(config_name='development'):
                         os.makedirs(db_dir, exist_ok=True)
                 
                 print(f'Initializing database: {db_uri}')
-                db.create_all()
-                
-                # Create default admin user if it doesn't exist
-                admin = User.query.filter_by(email='admin@disaster.com').first()
-                if not admin:
-                    admin = User(
-                        name='Admin',
-                        email='admin@disaster.com',
-                        phone='9999999999',
-                        role=UserRole.ADMIN,
-                        is_active=True
-                    )
-                    admin.set_password('admin123')
-                    db.session.add(admin)
-                    db.session.commit()
-                
-                app.db_initialized = True
+                migrations.initialize_database()
                 print('Database initialized successfully')
             except Exception as e:
                 print(f'Error initializing database: {e}')
                 import traceback
                 traceback.print_exc()
                 raise
+            initialized = True
+    
+    if app.config['AUTO_INIT_DB']:
+        app.before_request(initialize_db)
+    
+    app.extensions['startup_timer'] = timer
+    if env_flag('STARTUP_TIMING', False):
+        print(f'create_app phases:\n{timer.report()}')
     
     return app
 
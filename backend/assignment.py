@@ -0,0 +1,347 @@
+"""
+Batch volunteer-to-report assignment
+
+Open reports (pending or acknowledged, with no assigned or in-progress
+task) are matched to available volunteers (active, fewer than
+ASSIGNMENT_MAX_OPEN_TASKS open tasks) in one global assignment instead of
+one hand-picked volunteer per report. Each volunteer gets at most one new
+task per run and each report at most one volunteer.
+
+The cost of a volunteer-report pair adds up, each scaled to about 0..1:
+- distance from the volunteer's location ("lat,lon" in User.location) to
+  the report, over ASSIGNMENT_MAX_DISTANCE_KM; pairs farther apart are not
+  allowed, pairs with an unknown position cost the maximum distance
+- the volunteer's open task load, weighted by ASSIGNMENT_LOAD_WEIGHT
+- minus the report's severity, weighted by ASSIGNMENT_SEVERITY_WEIGHT, so
+  when volunteers are scarce the severe reports are covered first
+
+Solvers, in order of preference:
+- scipy:     linear_sum_assignment (Hungarian) on the dense cost matrix
+             built with numpy; used when both are installed
+- hungarian: exact pure-Python Hungarian on the dense costs, for problems
+             up to ASSIGNMENT_EXACT_LIMIT pairs
+- greedy:    cheapest-first matching over each report's
+             ASSIGNMENT_CANDIDATES cheapest volunteers, found through a
+             grid search instead of all pairs
+"""
+import heapq
+from collections import namedtuple
+from sqlalchemy import and_, func, select
+import geo
+from database import write_queue
+from geo import np
+from models import db, User, UserRole, DisasterReport, DisasterSeverity, ReportStatus, VolunteerTask, TaskStatus
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional; the pure-Python solvers are used instead
+    linear_sum_assignment = None
+
+OPEN_TASK_STATUSES = (TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS)
+ASSIGNABLE_REPORT_STATUSES = (ReportStatus.PENDING, ReportStatus.ACKNOWLEDGED)
+SEVERITY_RANK = {
+    DisasterSeverity.LOW: 0,
+    DisasterSeverity.MEDIUM: 1,
+    DisasterSeverity.HIGH: 2,
+    DisasterSeverity.CRITICAL: 3,
+}
+_INFEASIBLE = 1e9
+_GRID_CELLS_PER_RADIUS = 8
+
+Volunteer = namedtuple('Volunteer', ['id', 'latitude', 'longitude', 'open_tasks'])
+Report = namedtuple('Report', ['id', 'latitude', 'longitude', 'severity'])
+Assignment = namedtuple('Assignment', ['report_id', 'volunteer_id', 'distance_km', 'cost'])
+Plan = namedtuple('Plan', ['assignments', 'unassigned_report_ids', 'solver'])
+
+
+def parse_location(location):
+    """(latitude, longitude) from a "lat,lon" location string, else (None, None)"""
+    try:
+        latitude, longitude = (float(part) for part in (location or '').split(','))
+    except ValueError:
+        return None, None
+    if not geo.valid_coordinates(latitude, longitude):
+        return None, None
+    return latitude, longitude
+
+
+def hungarian(costs):
+    """Minimum-cost assignment of rows to columns; needs len(rows) <= len(columns).
+
+    Shortest augmenting path form of the Hungarian method, O(rows^2 * columns).
+    Returns the column of each row.
+    """
+    rows, columns = len(costs), len(costs[0]) if costs else 0
+    inf = float('inf')
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (columns + 1)
+    owner = [0] * (columns + 1)  # 1-based row matched to each column, 0 = free
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_slack = [inf] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column] = True
+            current = owner[column]
+            delta, next_column = inf, 0
+            row_costs = costs[current - 1]
+            u_current = u[current]
+            for j in range(1, columns + 1):
+                if not used[j]:
+                    slack = row_costs[j - 1] - u_current - v[j]
+                    if slack < min_slack[j]:
+                        min_slack[j] = slack
+                        way[j] = column
+                    if min_slack[j] < delta:
+                        delta, next_column = min_slack[j], j
+            for j in range(columns + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    matched = [None] * rows
+    for column in range(1, columns + 1):
+        if owner[column]:
+            matched[owner[column] - 1] = column - 1
+    return matched
+
+
+class AssignmentSolver:
+    def __init__(self, max_distance_km=50.0, max_open_tasks=3, load_weight=0.5,
+                 severity_weight=1.0, candidates=20, exact_limit=40000):
+        self.max_distance_km = max_distance_km
+        self.max_open_tasks = max_open_tasks
+        self.load_weight = load_weight
+        self.severity_weight = severity_weight
+        self.candidates = candidates
+        self.exact_limit = exact_limit
+
+    def init_app(self, app):
+        self.max_distance_km = app.config.get('ASSIGNMENT_MAX_DISTANCE_KM', self.max_distance_km)
+        self.max_open_tasks = app.config.get('ASSIGNMENT_MAX_OPEN_TASKS', self.max_open_tasks)
+        self.load_weight = app.config.get('ASSIGNMENT_LOAD_WEIGHT', self.load_weight)
+        self.severity_weight = app.config.get('ASSIGNMENT_SEVERITY_WEIGHT', self.severity_weight)
+        self.candidates = app.config.get('ASSIGNMENT_CANDIDATES', self.candidates)
+        self.exact_limit = app.config.get('ASSIGNMENT_EXACT_LIMIT', self.exact_limit)
+
+    # Loading
+
+    def open_reports(self, report_ids=None):
+        """Assignable reports: pending or acknowledged without an open task"""
+        has_open_task = select(VolunteerTask.id).where(and_(
+            VolunteerTask.report_id == DisasterReport.id,
+            VolunteerTask.status.in_(OPEN_TASK_STATUSES),
+        )).exists()
+        query = (
+            select(DisasterReport.id, DisasterReport.latitude, DisasterReport.longitude, DisasterReport.severity)
+            .where(DisasterReport.status.in_(ASSIGNABLE_REPORT_STATUSES))
+            .where(~has_open_task)
+            .order_by(DisasterReport.id)
+        )
+        if report_ids is not None:
+            query = query.where(DisasterReport.id.in_(report_ids))
+        return [
+            Report(report_id, latitude, longitude, severity or DisasterSeverity.MEDIUM)
+            for report_id, latitude, longitude, severity in db.session.execute(query)
+        ]
+
+    def available_volunteers(self):
+        """Active volunteers below the open task limit, with their load"""
+        open_tasks = (
+            select(VolunteerTask.volunteer_id, func.count(VolunteerTask.id).label('open_tasks'))
+            .where(VolunteerTask.status.in_(OPEN_TASK_STATUSES))
+            .group_by(VolunteerTask.volunteer_id)
+            .subquery()
+        )
+        load = func.coalesce(open_tasks.c.open_tasks, 0)
+        query = (
+            select(User.id, User.location, load)
+            .outerjoin(open_tasks, open_tasks.c.volunteer_id == User.id)
+            .where(User.role == UserRole.VOLUNTEER, User.is_active.is_(True))
+            .where(load < self.max_open_tasks)
+            .order_by(User.id)
+        )
+        return [
+            Volunteer(user_id, *parse_location(location), count)
+            for user_id, location, count in db.session.execute(query)
+        ]
+
+    # Costs
+
+    def _cost(self, distance_km, open_tasks, severity):
+        return (
+            distance_km / self.max_distance_km
+            + self.load_weight * open_tasks / max(self.max_open_tasks, 1)
+            - self.severity_weight * SEVERITY_RANK[severity] / 3
+        )
+
+    def _distance(self, volunteer, report):
+        if volunteer.latitude is None or report.latitude is None:
+            return self.max_distance_km
+        return geo.distance_km(volunteer.latitude, volunteer.longitude, report.latitude, report.longitude)
+
+    def _dense_costs(self, volunteers, reports):
+        """(costs, distances) as volunteers x reports numpy arrays"""
+        def coordinates(items):
+            lat = np.array([i.latitude if i.latitude is not None else np.nan for i in items], dtype=float)
+            lon = np.array([i.longitude if i.longitude is not None else np.nan for i in items], dtype=float)
+            return np.radians(lat), np.radians(lon)
+
+        v_lat, v_lon = coordinates(volunteers)
+        r_lat, r_lon = coordinates(reports)
+        a = (np.sin((r_lat[None, :] - v_lat[:, None]) / 2) ** 2
+             + np.cos(v_lat)[:, None] * np.cos(r_lat)[None, :] * np.sin((r_lon[None, :] - v_lon[:, None]) / 2) ** 2)
+        distances = 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        distances = np.where(np.isnan(distances), self.max_distance_km, distances)
+
+        load = np.array([v.open_tasks for v in volunteers], dtype=float)
+        severity = np.array([SEVERITY_RANK[r.severity] for r in reports], dtype=float)
+        costs = (distances / self.max_distance_km
+                 + (self.load_weight * load / max(self.max_open_tasks, 1))[:, None]
+                 - (self.severity_weight * severity / 3)[None, :])
+        costs[distances > self.max_distance_km] = _INFEASIBLE
+        return costs, distances
+
+    def _candidate_edges(self, volunteers, reports):
+        """(cost, volunteer index, report index, distance) for each report's cheapest volunteers.
+
+        Volunteers are put on a lat/lon grid of cells a fraction of the
+        maximum distance wide; each report searches rings of cells outwards
+        and stops once no volunteer in a further ring could be cheaper than
+        the ones found, or the rings pass the maximum distance.
+        """
+        grid = geo.PointGrid(self.max_distance_km / _GRID_CELLS_PER_RADIUS)
+        unplaced = []
+        for index, volunteer in enumerate(volunteers):
+            if volunteer.latitude is None:
+                unplaced.append(index)
+            else:
+                grid.add(index, volunteer.latitude, volunteer.longitude)
+        # volunteers without a position are equally far from everything; the least loaded go first
+        by_load = lambda i: volunteers[i].open_tasks  # noqa: E731
+        unplaced = heapq.nsmallest(self.candidates, unplaced, key=by_load)
+        everyone = heapq.nsmallest(self.candidates, range(len(volunteers)), key=by_load)
+
+        edges = []
+        for r, report in enumerate(reports):
+            options = []
+            if report.latitude is None:
+                nearby = everyone
+            else:
+                nearby = list(unplaced)
+                for members, reach_km in grid.rings(report.latitude, report.longitude, self.max_distance_km):
+                    nearby.extend(v for v, _, _ in members)
+                    if len(nearby) >= self.candidates:
+                        bound = self._cost(reach_km, 0, report.severity)
+                        kth = heapq.nsmallest(self.candidates, (
+                            self._cost(self._distance(volunteers[v], report), volunteers[v].open_tasks, report.severity)
+                            for v in nearby
+                        ))[-1]
+                        if kth <= bound:
+                            break
+            for v in nearby:
+                distance = self._distance(volunteers[v], report)
+                if distance <= self.max_distance_km:
+                    options.append((self._cost(distance, volunteers[v].open_tasks, report.severity), v, r, distance))
+            edges.extend(heapq.nsmallest(self.candidates, options))
+        return edges
+
+    # Solving
+
+    def solve(self, volunteers, reports):
+        """Plan for the given volunteers and reports; touches no database"""
+        if not volunteers or not reports:
+            return Plan([], [r.id for r in reports], 'none')
+
+        pairs = []  # (volunteer index, report index, distance, cost)
+        if linear_sum_assignment is not None and np is not None:
+            solver = 'scipy'
+            costs, distances = self._dense_costs(volunteers, reports)
+            for v, r in zip(*linear_sum_assignment(costs)):
+                if costs[v, r] < _INFEASIBLE:
+                    pairs.append((v, r, float(distances[v, r]), float(costs[v, r])))
+        elif len(volunteers) * len(reports) <= self.exact_limit:
+            solver = 'hungarian'
+            transpose = len(volunteers) > len(reports)
+            distances = [[self._distance(v, r) for r in reports] for v in volunteers]
+            costs = [
+                [_INFEASIBLE if d > self.max_distance_km else self._cost(d, v.open_tasks, r.severity)
+                 for d, r in zip(row, reports)]
+                for row, v in zip(distances, volunteers)
+            ]
+            if transpose:
+                matched = hungarian([list(column) for column in zip(*costs)])
+                matches = [(v, r) for r, v in enumerate(matched)]
+            else:
+                matches = list(enumerate(hungarian(costs)))
+            for v, r in matches:
+                if costs[v][r] < _INFEASIBLE:
+                    pairs.append((v, r, distances[v][r], costs[v][r]))
+        else:
+            solver = 'greedy'
+            used_volunteers, used_reports = set(), set()
+            for cost, v, r, distance in sorted(self._candidate_edges(volunteers, reports)):
+                if v not in used_volunteers and r not in used_reports:
+                    used_volunteers.add(v)
+                    used_reports.add(r)
+                    pairs.append((v, r, distance, cost))
+
+        assigned = {r for _, r, _, _ in pairs}
+        assignments = sorted(
+            (Assignment(reports[r].id, volunteers[v].id, round(distance, 3), round(cost, 4))
+             for v, r, distance, cost in pairs),
+            key=lambda a: a.report_id
+        )
+        return Plan(assignments, [r.id for i, r in enumerate(reports) if i not in assigned], solver)
+
+    def plan(self, report_ids=None):
+        return self.solve(self.available_volunteers(), self.open_reports(report_ids))
+
+    def apply(self, plan, task_description):
+        """Create the plan's tasks in one transaction; returns ({report id: task id}, skipped report ids).
+
+        Other assignments may have committed since the plan was made, so the
+        targeted reports and volunteers are locked (FOR UPDATE, or the write
+        queue's BEGIN IMMEDIATE on SQLite) and re-checked first: a report that
+        is no longer open, or whose volunteer is gone or at max_open_tasks, is
+        skipped rather than double-assigned.
+        """
+        report_ids = sorted(a.report_id for a in plan.assignments)
+        volunteer_ids = sorted({a.volunteer_id for a in plan.assignments})
+
+        def assign(session):
+            for model, ids in ((DisasterReport, report_ids), (User, volunteer_ids)):
+                session.execute(select(model.id).where(model.id.in_(ids)).order_by(model.id).with_for_update()).all()
+            still_open = {r.id for r in self.open_reports(report_ids)}
+            load = {v.id: v.open_tasks for v in self.available_volunteers() if v.id in volunteer_ids}
+
+            tasks, skipped = [], []
+            for a in plan.assignments:
+                full = load.get(a.volunteer_id, self.max_open_tasks) >= self.max_open_tasks
+                if a.report_id not in still_open or full:
+                    skipped.append(a.report_id)
+                    continue
+                load[a.volunteer_id] += 1
+                tasks.append(VolunteerTask(
+                    volunteer_id=a.volunteer_id, report_id=a.report_id, task_description=task_description
+                ))
+            session.add_all(tasks)
+            session.flush()
+            return {t.report_id: t.id for t in tasks}, skipped
+
+        # On SQLite the writer thread serializes this with /assign and other batch runs (database.py)
+        return write_queue.run(assign)
+
+
+assignment_solver = AssignmentSolver()
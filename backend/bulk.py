@@ -0,0 +1,184 @@
+"""
+Set-based admin operations over many disaster reports
+
+Reports are picked by an explicit list of ids or by a filter (status,
+severity, cluster, reporter). Each operation reads the targeted rows once,
+then writes them with a single UPDATE or a multi-row INSERT and commits
+once, however many reports it covers. The writes go through Core rather
+than the unit of work, so the affected rows are recorded as ordinary
+insert/update changes (changes.record) and the caches and realtime events
+that follow report and task changes update in place.
+
+Results are per id, in the order the reports were asked for:
+- updated / unchanged / not_found for status changes
+- assigned (with task_id) / already_assigned / not_found for assignment
+"""
+from datetime import datetime, timezone
+from sqlalchemy import case, func, select, update
+import changes
+from models import db, DisasterReport, DisasterSeverity, ReportStatus, TaskStatus, User, UserRole, VolunteerTask
+
+OPEN_TASK_STATUSES = (TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS)
+
+
+class BulkError(ValueError):
+    pass
+
+
+def _enum_list(enum_class, value, field):
+    values = value if isinstance(value, list) else [value]
+    try:
+        return [enum_class[str(v).upper()] for v in values]
+    except KeyError as e:
+        raise BulkError(f'Invalid {field}: {e.args[0].lower()}') from None
+
+
+def report_filter(data):
+    """WHERE clauses for a filter object: status, severity (a value or a list), cluster_id, reporter_id"""
+    if not isinstance(data, dict) or not data:
+        raise BulkError('filter must be a non-empty object')
+    unknown = set(data) - {'status', 'severity', 'cluster_id', 'reporter_id'}
+    if unknown:
+        raise BulkError(f"Unknown filter field: {', '.join(sorted(unknown))}")
+
+    table = DisasterReport.__table__
+    clauses = []
+    if 'status' in data:
+        clauses.append(table.c.status.in_(_enum_list(ReportStatus, data['status'], 'status')))
+    if 'severity' in data:
+        clauses.append(table.c.severity.in_(_enum_list(DisasterSeverity, data['severity'], 'severity')))
+    for field in ('cluster_id', 'reporter_id'):
+        if field in data:
+            if not isinstance(data[field], int):
+                raise BulkError(f'{field} must be an id')
+            clauses.append(table.c[field] == data[field])
+    return clauses
+
+
+def target_reports(data, max_reports):
+    """(requested ids in order, {id: row}) for a body holding report_ids or filter.
+
+    The rows are read FOR UPDATE where the database supports it, so the
+    values recorded as previous are the ones the write replaces.
+    """
+    report_ids, criteria = data.get('report_ids'), data.get('filter')
+    if (report_ids is None) == (criteria is None):
+        raise BulkError('Give either report_ids or filter')
+
+    table = DisasterReport.__table__
+    query = select(table).with_for_update()
+    if report_ids is not None:
+        if not isinstance(report_ids, list) or not all(isinstance(i, int) for i in report_ids):
+            raise BulkError('report_ids must be a list of report ids')
+        report_ids = list(dict.fromkeys(report_ids))
+        if len(report_ids) > max_reports:
+            raise BulkError(f'At most {max_reports} reports per request')
+        query = query.where(table.c.id.in_(report_ids))
+    else:
+        query = query.where(*report_filter(criteria)).order_by(table.c.id).limit(max_reports + 1)
+
+    rows = {row.id: row._asdict() for row in db.session.connection().execute(query)}
+    if report_ids is None:
+        if len(rows) > max_reports:
+            raise BulkError(f'Filter matches more than {max_reports} reports; narrow it down')
+        report_ids = list(rows)
+    return report_ids, rows
+
+
+def status_values(status, current, now):
+    """Columns written when a report with `current` status and acknowledged_at moves to `status`.
+
+    acknowledged_at is stamped the first time a report leaves pending;
+    resolved_at is stamped on resolution and cleared when a report is reopened.
+    """
+    values = {'status': status, 'updated_at': now}
+    if status != ReportStatus.PENDING and current['acknowledged_at'] is None:
+        values['acknowledged_at'] = now
+    if status == ReportStatus.RESOLVED:
+        values['resolved_at'] = now
+    elif current['status'] == ReportStatus.RESOLVED:
+        values['resolved_at'] = None
+    return values
+
+
+def set_report_status(data, status, max_reports):
+    """Move the targeted reports to `status` with one UPDATE; per-id results"""
+    report_ids, rows = target_reports(data, max_reports)
+    now = datetime.now(timezone.utc)
+    changed = [rows[i] for i in report_ids if i in rows and rows[i]['status'] != status]
+
+    table = DisasterReport.__table__
+    if changed:
+        if status == ReportStatus.RESOLVED:
+            resolved_at = now
+        else:
+            # only reports being reopened lose their resolution time
+            resolved_at = case((table.c.status == ReportStatus.RESOLVED, None), else_=table.c.resolved_at)
+        acknowledged_at = table.c.acknowledged_at
+        if status != ReportStatus.PENDING:
+            acknowledged_at = func.coalesce(table.c.acknowledged_at, now)
+        db.session.connection().execute(
+            update(table).where(table.c.id.in_([row['id'] for row in changed]))
+            .values(status=status, updated_at=now, acknowledged_at=acknowledged_at, resolved_at=resolved_at)
+        )
+    for row in changed:
+        values = status_values(status, row, now)
+        previous = {column: row[column] for column in values}
+        changes.record(db.session, changes.Change('update', DisasterReport, dict(row, **values), previous))
+    db.session.commit()
+
+    changed_ids = {row['id'] for row in changed}
+    results = [
+        {'id': i, 'result': 'not_found' if i not in rows else 'updated' if i in changed_ids else 'unchanged'}
+        for i in report_ids
+    ]
+    return results, len(changed)
+
+
+def assign_reports(data, max_reports):
+    """Give one volunteer a task on each targeted report in one INSERT; per-id results.
+
+    Reports where the volunteer already has an open task are skipped.
+    """
+    volunteer_id = data.get('volunteer_id')
+    task_description = data.get('task_description')
+    if not isinstance(volunteer_id, int) or not task_description:
+        raise BulkError('Missing volunteer_id or task_description')
+    volunteer = db.session.get(User, volunteer_id)
+    if volunteer is None or volunteer.role != UserRole.VOLUNTEER or not volunteer.is_active:
+        raise BulkError('Selected user is not an active volunteer')
+
+    report_ids, rows = target_reports(data, max_reports)
+    tasks = VolunteerTask.__table__
+    connection = db.session.connection()
+    open_tasks = set(connection.execute(
+        select(tasks.c.report_id).where(
+            tasks.c.volunteer_id == volunteer_id,
+            tasks.c.report_id.in_(list(rows)),
+            tasks.c.status.in_(OPEN_TASK_STATUSES),
+        )
+    ).scalars())
+
+    now = datetime.now(timezone.utc)
+    batch = [
+        {'volunteer_id': volunteer_id, 'report_id': i, 'task_description': task_description,
+         'status': TaskStatus.ASSIGNED, 'assigned_at': now, 'started_at': None, 'completed_at': None, 'notes': None}
+        for i in report_ids if i in rows and i not in open_tasks
+    ]
+    task_ids = {}
+    if batch:
+        stmt = tasks.insert().returning(tasks.c.id, sort_by_parameter_order=True)
+        for task_id, values in zip(connection.execute(stmt, batch).scalars(), batch):
+            task_ids[values['report_id']] = task_id
+            changes.record(db.session, changes.Change('insert', VolunteerTask, dict(values, id=task_id), {}))
+    db.session.commit()
+
+    results = []
+    for i in report_ids:
+        if i not in rows:
+            results.append({'id': i, 'result': 'not_found'})
+        elif i in task_ids:
+            results.append({'id': i, 'result': 'assigned', 'task_id': task_ids[i]})
+        else:
+            results.append({'id': i, 'result': 'already_assigned'})
+    return results, len(task_ids)
@@ -0,0 +1,146 @@
+"""
+Commit-time change notifications for model writes
+
+Caches and other derived state register a listener with `on_commit`. Rows
+written through the ORM are snapshotted at flush time (while their values
+and attribute history are still available) and handed to the listeners
+once the transaction commits; a rollback discards them.
+
+Each change is a `Change(kind, model, values, previous)`:
+- kind:     'insert', 'update', 'delete', or 'bulk' for set-based
+            INSERT/UPDATE/DELETE statements that bypass the unit of work
+- model:    the mapped class
+- values:   column values loaded on the instance after the flush
+- previous: old values of the columns an update changed; UNKNOWN when the
+            old value was never loaded
+
+Derived data kept in the database itself registers with `before_commit`
+instead, and is written in the same transaction as the changes it follows.
+"""
+import logging
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+Change = namedtuple('Change', ['kind', 'model', 'values', 'previous'])
+
+UNKNOWN = object()
+
+_PENDING_KEY = 'pending_changes'
+_listeners = []
+_precommit_listeners = []
+
+
+def on_commit(listener):
+    """Register `listener(changes)` to run after every commit with changes.
+
+    Can be used as a decorator. Listeners run after the transaction is
+    closed, so they must not use the session that committed.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+
+def before_commit(listener):
+    """Register `listener(session, changes)` to run inside every transaction with changes, just before it commits.
+
+    The session is flushed first, so `changes` holds every write of the
+    transaction. Listeners may write through session.connection(); those
+    writes are not reported as changes. An exception aborts the commit.
+    """
+    if listener not in _precommit_listeners:
+        _precommit_listeners.append(listener)
+    return listener
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+    if listener in _precommit_listeners:
+        _precommit_listeners.remove(listener)
+
+
+def record(session, change):
+    """Queue a change produced outside the ORM flush (e.g. Core inserts)"""
+    session.info.setdefault(_PENDING_KEY, []).append(change)
+
+
+def _snapshot(state):
+    return {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+def _previous_values(state):
+    previous = {}
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if history.added:
+            previous[attr.key] = history.deleted[0] if history.deleted else UNKNOWN
+    return previous
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flush(session, flush_context):
+    if not _listeners and not _precommit_listeners:
+        return
+
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        state = inspect(obj)
+        pending.append(Change('insert', state.mapper.class_, _snapshot(state), {}))
+    for obj in session.dirty:
+        state = inspect(obj)
+        previous = _previous_values(state)
+        if previous:
+            pending.append(Change('update', state.mapper.class_, _snapshot(state), previous))
+    for obj in session.deleted:
+        state = inspect(obj)
+        pending.append(Change('delete', state.mapper.class_, _snapshot(state), {}))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    if not _listeners and not _precommit_listeners:
+        return
+
+    is_write = orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert
+    mapper = orm_execute_state.bind_mapper
+    if is_write and mapper is not None:
+        record(orm_execute_state.session, Change('bulk', mapper.class_, {}, {}))
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    if not _precommit_listeners:
+        return
+
+    session.flush()
+    changes = session.info.get(_PENDING_KEY)
+    if not changes:
+        return
+    for listener in list(_precommit_listeners):
+        listener(session, changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+
+    for listener in list(_listeners):
+        try:
+            listener(changes)
+        except Exception:
+            logger.exception('Change listener %r failed', listener)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
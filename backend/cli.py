@@ -0,0 +1,102 @@
+"""
+Flask CLI commands
+
+    flask db init                apply migrations and create the default admin
+    flask db upgrade             apply pending schema migrations
+    flask db status              list applied and pending migrations
+    flask db explain             query plans of the endpoint queries
+    flask db backfill-rollups    rebuild the analytics rollups from the raw tables
+    flask alerts deliver         send the queued alert emails that are due
+"""
+import click
+from flask.cli import AppGroup
+
+db_cli = AppGroup('db', help='Database schema and query plan commands.')
+alerts_cli = AppGroup('alerts', help='Alert email commands.')
+
+
+@db_cli.command('init')
+def init_command():
+    """Apply pending migrations and create the default admin (deploy step)."""
+    import migrations
+    applied = migrations.upgrade()
+    for migration in applied:
+        click.echo(f'Applied {migration.version:04d} {migration.name}')
+    if migrations.ensure_default_admin():
+        click.echo('Created default admin admin@disaster.com')
+    click.echo('Database initialized')
+
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending schema migrations."""
+    import migrations
+    applied = migrations.upgrade()
+    for migration in applied:
+        click.echo(f'Applied {migration.version:04d} {migration.name}')
+    if not applied:
+        click.echo('Database schema is up to date')
+
+
+@db_cli.command('status')
+def status_command():
+    """List applied and pending schema migrations."""
+    import migrations
+    applied = migrations.applied_versions()
+    for migration in migrations.MIGRATIONS:
+        state = 'applied' if migration.version in applied else 'pending'
+        click.echo(f'{migration.version:04d} {migration.name:<28} {state}')
+
+
+@db_cli.command('explain')
+@click.option('--verbose', is_flag=True, help='Print every statement and its full plan.')
+@click.option('--fail-on-scan', is_flag=True, help='Exit with status 1 when any query scans a table in full.')
+def explain_command(verbose, fail_on_scan):
+    """Report the indexes used by each endpoint's queries."""
+    from flask import current_app
+    from query_plans import explain_endpoints
+
+    scanned = False
+    for path, plans in explain_endpoints(current_app):
+        if plans is None:
+            click.echo(f'{path}\n  skipped: no user with the required role')
+            continue
+        click.echo(path)
+        for plan in plans:
+            scanned = scanned or bool(plan.full_scans)
+            indexes = ', '.join(plan.indexes) or '-'
+            scans = ', '.join(plan.full_scans)
+            line = f'  indexes: {indexes}' + (f'  FULL SCAN: {scans}' if scans else '')
+            click.echo(line)
+            if verbose:
+                click.echo('    ' + ' '.join(plan.statement.split()))
+                for step in plan.plan:
+                    click.echo(f'      {step}')
+
+    if fail_on_scan and scanned:
+        raise SystemExit(1)
+
+
+@db_cli.command('backfill-rollups')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Only rebuild buckets from this day (UTC) on; default everything.')
+def backfill_rollups_command(since):
+    """Rebuild the analytics rollups from the report and task tables."""
+    import rollups
+    from models import db
+    with db.engine.begin() as conn:
+        report_rows, latency_rows = rollups.backfill(conn, since)
+    click.echo(f'Wrote {report_rows} report rollup rows and {latency_rows} latency rollup rows')
+
+
+@alerts_cli.command('deliver')
+def deliver_command():
+    """Send the queued alert emails that are due (when no worker thread runs)."""
+    from alert_email import alert_mailer
+    totals = alert_mailer.deliver_pending()
+    click.echo(f"Sent {totals['sent']}, retrying {totals['retry']}, failed {totals['failed']}")
+
+
+def register_cli(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(alerts_cli)
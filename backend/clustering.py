@@ -0,0 +1,345 @@
+"""
+Incremental near-duplicate clustering of disaster reports
+
+During one incident many citizens file nearly the same report. Each new
+report is placed into an incident cluster when it is inserted, without
+rescanning history:
+
+- Reports are bucketed by area (a geohash cell sized from
+  CLUSTER_RADIUS_KM, or the lower-cased location text when there are no
+  coordinates) and by time window (CLUSTER_WINDOW_MINUTES).
+- Title and description are reduced to a MinHash signature over word
+  unigrams and bigrams. Signatures are split into bands (LSH), and each
+  bucket maps every band to the latest report that had it.
+- A new report looks up its bands in the 3x3 cells around it, for its own
+  and the previous window: a fixed number of dictionary lookups. Candidates
+  must be within the radius and the window and have an estimated Jaccard
+  similarity of at least CLUSTER_SIMILARITY; the first one found, nearest
+  buckets first, gives the cluster. Otherwise the report starts a new
+  cluster.
+
+The index lives in process memory. A bucket is loaded from the database
+the first time it is needed, only for its own cell and window, and buckets
+older than the previous window are dropped. Assignments made inside a
+transaction become visible to other sessions when it commits; a rollback
+discards them. Another worker's reports are seen as of when this worker
+first loaded the bucket, so concurrent workers can occasionally split an
+incident in two.
+"""
+import random
+import re
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import and_, bindparam, event, func, or_, select
+from sqlalchemy.orm import Session, object_session
+import geo
+from geo import np
+from models import db, DisasterReport, ReportCluster
+from spatial import geohash_ranges
+
+NUM_PERMUTATIONS = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+# Multiply-shift hashes: ((a * x + b) mod 2**64) >> 32 with odd a
+_MASK = (1 << 64) - 1
+_rng = random.Random(20240917)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERMUTATIONS)]
+if np is not None:
+    _A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    _B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_TOKEN = re.compile(r'[a-z0-9]+')
+_PENDING_KEY = 'pending_cluster_members'
+
+_Member = namedtuple('_Member', ['cluster', 'signature', 'timestamp', 'latitude', 'longitude'])
+
+
+def signature(title, description):
+    """MinHash signature of a report's text; None when it has no words"""
+    tokens = _TOKEN.findall(f'{title} {description}'.lower())
+    grams = set(tokens)
+    grams.update(f'{a} {b}' for a, b in zip(tokens, tokens[1:]))
+    if not grams:
+        return None
+    hashed = [zlib.crc32(gram.encode('utf-8')) for gram in grams]
+    if np is not None:
+        # uint64 arithmetic wraps, which is the mod 2**64
+        values = (_A * np.array(hashed, dtype=np.uint64) + _B) >> np.uint64(32)
+        return tuple(values.min(axis=1).tolist())
+    return tuple(min(((a * h + b) & _MASK) >> 32 for h in hashed) for a, b in _PERMUTATIONS)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+
+def _bands(sig):
+    return [(band, sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]) for band in range(BANDS)]
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _naive_utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _location_area(location):
+    return 'loc:' + (location or '').strip().lower()
+
+
+class _NewCluster:
+    """A cluster created in the current flush, before it has an id"""
+    __slots__ = ('id', 'report_count', 'first_report_at', 'last_report_at')
+
+    def __init__(self, created_at):
+        self.id = None
+        self.report_count = 0
+        self.first_report_at = self.last_report_at = created_at
+
+
+def _cluster_id(cluster):
+    return cluster.id if isinstance(cluster, _NewCluster) else cluster
+
+
+class ClusterIndex:
+    def __init__(self, radius_km=1.0, window_minutes=360, threshold=0.5):
+        self.enabled = True
+        self.radius_km = radius_km
+        self.window_seconds = window_minutes * 60
+        self.threshold = threshold
+        self.precision = geo.precision_for_radius(radius_km)
+        self._buckets = {}  # (area, window) -> {band key: _Member}
+        self._newest_window = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CLUSTERING_ENABLED', self.enabled)
+        self.radius_km = app.config.get('CLUSTER_RADIUS_KM', self.radius_km)
+        self.window_seconds = app.config.get('CLUSTER_WINDOW_MINUTES', self.window_seconds / 60) * 60
+        self.threshold = app.config.get('CLUSTER_SIMILARITY', self.threshold)
+        self.precision = geo.precision_for_radius(self.radius_km)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._newest_window = None
+
+    def _place(self, latitude, longitude, location):
+        """(home area, areas to search) of a report"""
+        if geo.valid_coordinates(latitude, longitude):
+            home = geo.encode(latitude, longitude, self.precision)
+            return home, geo.cell_neighbourhood(home)
+        area = _location_area(location)
+        return area, {area}
+
+    def _matches(self, member, timestamp, latitude, longitude, sig):
+        if abs(timestamp - member.timestamp) > self.window_seconds:
+            return False
+        if similarity(sig, member.signature) < self.threshold:
+            return False
+        return member.latitude is None or latitude is None or \
+            geo.distance_km(latitude, longitude, member.latitude, member.longitude) <= self.radius_km
+
+    def _match(self, pending, home, areas, window, timestamp, latitude, longitude, sig):
+        """Cluster of the first matching member, searching the report's own cell and window first"""
+        keys = [(home, window), (home, window - 1)]
+        keys += [(area, w) for w in (window, window - 1) for area in areas if area != home]
+        with self._lock:
+            shared = [self._buckets.get(key) for key in keys]
+        bands = _bands(sig)
+        seen = set()
+        for bucket in [b for pair in zip([pending.get(key) for key in keys], shared) for b in pair]:
+            if not bucket:
+                continue
+            for key in bands:
+                member = bucket.get(key)
+                if member is None or id(member) in seen:
+                    continue
+                seen.add(id(member))
+                if self._matches(member, timestamp, latitude, longitude, sig):
+                    return member.cluster
+        return None
+
+    def _load(self, connection, keys):
+        """Fill the buckets for (area, window) keys not loaded yet from the database"""
+        with self._lock:
+            keys = {key for key in keys if key not in self._buckets}
+        if not keys:
+            return
+
+        cells = {area for area, _ in keys if not area.startswith('loc:')}
+        locations = {area for area, _ in keys if area.startswith('loc:')}
+        windows = [window for _, window in keys]
+        table = DisasterReport.__table__
+        conditions = []
+        if cells:
+            conditions.append(geohash_ranges(sorted(cells)))
+        if locations:
+            conditions.append(and_(table.c.geohash.is_(None), func.lower(func.trim(table.c.location)).in_(
+                sorted(area[4:] for area in locations)
+            )))
+        query = (
+            select(table.c.cluster_id, table.c.title, table.c.description, table.c.location,
+                   table.c.latitude, table.c.longitude, table.c.created_at)
+            .where(table.c.cluster_id.is_not(None))
+            .where(table.c.created_at >= _naive_utc(min(windows) * self.window_seconds))
+            .where(table.c.created_at < _naive_utc((max(windows) + 1) * self.window_seconds))
+            .where(or_(*conditions))
+            .order_by(table.c.id)
+        )
+
+        loaded = {key: {} for key in keys}
+        for cluster_id, title, description, location, latitude, longitude, created_at in connection.execute(query):
+            sig = signature(title, description)
+            if sig is None:
+                continue
+            timestamp = _timestamp(created_at)
+            home, _ = self._place(latitude, longitude, location)
+            bucket = loaded.get((home, int(timestamp // self.window_seconds)))
+            if bucket is not None:
+                member = _Member(cluster_id, sig, timestamp, latitude, longitude)
+                bucket.update((key, member) for key in _bands(sig))
+
+        with self._lock:
+            for key, bucket in loaded.items():
+                self._buckets.setdefault(key, bucket)
+
+    def assign(self, session, connection, rows):
+        """Set 'cluster_id' on each row dict and write the cluster rows.
+
+        Rows need title, description, location, latitude, longitude and
+        created_at. Runs on `connection` inside the session's transaction.
+        """
+        placed = []
+        for row in rows:
+            timestamp = _timestamp(row['created_at'])
+            window = int(timestamp // self.window_seconds)
+            latitude, longitude = row.get('latitude'), row.get('longitude')
+            if not geo.valid_coordinates(latitude, longitude):
+                latitude = longitude = None
+            home, areas = self._place(latitude, longitude, row['location'])
+            placed.append((row, timestamp, window, latitude, longitude, home, areas))
+
+        self._load(connection, {(area, w) for _, _, window, _, _, _, areas in placed
+                                for area in areas for w in (window, window - 1)})
+
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        new_clusters, grown = [], {}
+        for row, timestamp, window, latitude, longitude, home, areas in placed:
+            sig = signature(row['title'], row['description'])
+            cluster = None
+            if sig is not None:
+                cluster = self._match(pending, home, areas, window, timestamp, latitude, longitude, sig)
+            if cluster is None or (isinstance(cluster, _NewCluster) and cluster.id is None):
+                if cluster is None:
+                    cluster = _NewCluster(row['created_at'])
+                    new_clusters.append(cluster)
+                cluster.report_count += 1
+                cluster.last_report_at = row['created_at']
+            else:
+                cluster_id = _cluster_id(cluster)
+                count, _ = grown.get(cluster_id, (0, None))
+                grown[cluster_id] = (count + 1, row['created_at'])
+            row['_cluster'] = cluster
+            if sig is not None:
+                member = _Member(cluster, sig, timestamp, latitude, longitude)
+                pending.setdefault((home, window), {}).update((key, member) for key in _bands(sig))
+
+        table = ReportCluster.__table__
+        if new_clusters:
+            ids = connection.execute(
+                table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                [{'report_count': c.report_count, 'first_report_at': c.first_report_at,
+                  'last_report_at': c.last_report_at} for c in new_clusters]
+            ).scalars().all()
+            for cluster, cluster_id in zip(new_clusters, ids):
+                cluster.id = cluster_id
+        if grown:
+            connection.execute(
+                table.update().where(table.c.id == bindparam('cluster'))
+                .values(report_count=table.c.report_count + bindparam('added'), last_report_at=bindparam('seen')),
+                [{'cluster': cluster_id, 'added': count, 'seen': seen} for cluster_id, (count, seen) in grown.items()]
+            )
+        for row in rows:
+            row['cluster_id'] = _cluster_id(row.pop('_cluster'))
+
+    def commit(self, pending):
+        """Publish a committed transaction's members to the shared index"""
+        with self._lock:
+            for (area, window), bucket in pending.items():
+                if self._newest_window is None or window > self._newest_window:
+                    self._newest_window = window
+                    for stale in [key for key in self._buckets if key[1] < window - 1]:
+                        del self._buckets[stale]
+                if window < self._newest_window - 1:
+                    continue
+                shared = self._buckets.setdefault((area, window), {})
+                shared.update((key, member._replace(cluster=_cluster_id(member.cluster)))
+                              for key, member in bucket.items())
+
+
+cluster_index = ClusterIndex()
+
+
+def cluster_sizes(cluster_ids):
+    """{cluster id: report count} for the given clusters, in one query"""
+    cluster_ids = {cluster_id for cluster_id in cluster_ids if cluster_id is not None}
+    if not cluster_ids:
+        return {}
+    rows = db.session.execute(
+        select(ReportCluster.id, ReportCluster.report_count).where(ReportCluster.id.in_(cluster_ids))
+    )
+    return dict(rows.all())
+
+
+def latest_reports(query, cluster_ids, status=None):
+    """{cluster id: newest report of the cluster (with `status`)}, loaded through `query`"""
+    if not cluster_ids:
+        return {}
+    newest = (
+        select(func.max(DisasterReport.id))
+        .where(DisasterReport.cluster_id.in_(cluster_ids))
+        .group_by(DisasterReport.cluster_id)
+    )
+    if status is not None:
+        newest = newest.where(DisasterReport.status == status)
+    return {report.cluster_id: report for report in query.filter(DisasterReport.id.in_(newest)).all()}
+
+
+@event.listens_for(DisasterReport, 'before_insert')
+def _cluster_report(mapper, connection, target):
+    """Assign reports inserted through the ORM to a cluster"""
+    if not cluster_index.enabled or target.cluster_id is not None:
+        return
+    if target.created_at is None:
+        target.created_at = datetime.now(timezone.utc)
+    row = {
+        'title': target.title,
+        'description': target.description,
+        'location': target.location,
+        'latitude': target.latitude,
+        'longitude': target.longitude,
+        'created_at': target.created_at,
+    }
+    cluster_index.assign(object_session(target), connection, [row])
+    target.cluster_id = row['cluster_id']
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        cluster_index.commit(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
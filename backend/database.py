@@ -0,0 +1,221 @@
+"""
+Database engine tuning and the single-writer queue
+
+SQLite allows one writer at a time. With the default rollback journal a
+writer also blocks every reader, and writers that collide fail with
+"database is locked" as soon as the driver's wait runs out. Every new
+SQLite connection is therefore set up with:
+- journal_mode (SQLITE_JOURNAL_MODE, default WAL): readers keep reading
+  the last committed state while a write is in progress
+- synchronous (SQLITE_SYNCHRONOUS, default NORMAL): with WAL, commits no
+  longer wait for an fsync; a power loss can drop the last commits but
+  never corrupts the database
+- busy_timeout (SQLITE_BUSY_TIMEOUT_MS): how long a writer waits for the lock
+- mmap_size and cache_size (SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB): reads
+  served from memory instead of read() calls
+
+Report and task inserts go through `write_queue`. A single writer thread
+per process takes the submitted jobs, runs as many as are waiting (up to
+WRITE_QUEUE_MAX_BATCH) in one transaction started with BEGIN IMMEDIATE,
+and commits them together, so concurrent submissions share one commit
+instead of queueing on the database lock. If any job fails, the batch is
+rolled back and its jobs are retried one transaction each, so a bad job
+only fails itself. The request thread waits for its own job's result; a
+job still queued after WRITE_QUEUE_TIMEOUT is cancelled and `run` raises
+WriteQueueBusy (answered with 503), while one already running is waited
+for, so a client never retries a write that later commits anyway.
+
+The queue is on for file-backed SQLite databases (SQLITE_WRITE_QUEUE); on
+other databases `run` executes the job in the request's own session.
+
+Server databases (PostgreSQL) get explicit pool settings:
+DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT,
+DATABASE_POOL_RECYCLE, and a pre-ping on checkout.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from sqlalchemy import event
+from models import db
+from replicas import replica_router
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueBusy(Exception):
+    """A write job waited WRITE_QUEUE_TIMEOUT without starting and was cancelled; retry later"""
+
+
+def is_sqlite_file(uri):
+    return uri.startswith('sqlite:') and uri not in ('sqlite://', 'sqlite:///:memory:') and 'mode=memory' not in uri
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new connection to a file-backed SQLite database"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        # negative: size in KiB rather than in pages
+        f"PRAGMA cache_size = -{int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+    ]
+    journal_mode = config.get('SQLITE_JOURNAL_MODE')
+    if journal_mode:
+        pragmas.append(f'PRAGMA journal_mode = {journal_mode}')
+    synchronous = config.get('SQLITE_SYNCHRONOUS')
+    if synchronous:
+        pragmas.append(f'PRAGMA synchronous = {synchronous}')
+    return pragmas
+
+
+def engine_options(uri, config):
+    """create_engine() pool settings for a server database; SQLite keeps SQLAlchemy's defaults"""
+    if uri.startswith('sqlite:'):
+        return {}
+    return {
+        'pool_size': config.get('DATABASE_POOL_SIZE', 5),
+        'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DATABASE_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DATABASE_POOL_RECYCLE', 1800),
+        # a connection the server or a proxy closed is replaced instead of failing a request
+        'pool_pre_ping': True,
+    }
+
+
+def tune_engine(engine, uri, config):
+    """Run the SQLite pragmas on each new connection of a file-backed SQLite engine"""
+    if not is_sqlite_file(uri):
+        return
+    pragmas = sqlite_pragmas(config)
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def init_app(app):
+    """Tune the app's primary engine; the write queue is set up separately"""
+    with app.app_context():
+        tune_engine(db.engine, app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+
+
+class WriteQueue:
+    """Runs write jobs on one thread, committing the jobs waiting together"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.max_batch = 64
+        self.timeout = 30.0
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.app = app
+        self.enabled = app.config.get('SQLITE_WRITE_QUEUE', False)
+        self.max_batch = app.config.get('WRITE_QUEUE_MAX_BATCH', 64)
+        self.timeout = app.config.get('WRITE_QUEUE_TIMEOUT', 30.0)
+
+    def run(self, job):
+        """Run `job(session)` in a write transaction and return its result once committed.
+
+        The job adds and flushes its writes but never commits; it may run
+        more than once (after a failed batch), so it builds its objects itself.
+        """
+        if not self.enabled:
+            result = job(db.session)
+            db.session.commit()
+            return result
+
+        future = Future()
+        self._jobs.put((job, future))
+        self._ensure_writer()
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise WriteQueueBusy() from None
+            # already running: it commits or fails shortly, and the client must learn which
+            result = future.result()
+        # committed on the writer's session, so the request's own session cannot tell
+        replica_router.stick()
+        return result
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(self.app,), name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                item = self._jobs.get()
+                if item is None:
+                    return
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._jobs.put(None)  # stop after this batch
+                        break
+                    batch.append(item)
+                try:
+                    self._commit(batch)
+                except Exception:
+                    logger.exception('Write batch failed')
+                finally:
+                    db.session.remove()
+
+    def _commit(self, batch):
+        jobs = [(job, future) for job, future in batch if future.set_running_or_notify_cancel()]
+        if len(jobs) > 1:
+            try:
+                results = self._transaction([job for job, _ in jobs])
+            except Exception:
+                logger.warning('Write batch of %d failed; retrying its jobs one by one', len(jobs), exc_info=True)
+            else:
+                for (_, future), result in zip(jobs, results):
+                    future.set_result(result)
+                return
+
+        for job, future in jobs:
+            try:
+                future.set_result(self._transaction([job])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    @staticmethod
+    def _transaction(jobs):
+        session = db.session
+        try:
+            # take the write lock now rather than at the first write, so a
+            # read in a job cannot leave the transaction unable to write
+            session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+            results = [job(session) for job in jobs]
+            session.commit()
+            return results
+        except Exception:
+            session.rollback()
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._jobs.put(None)
+            thread.join(timeout=5)
+
+
+write_queue = WriteQueue()
@@ -3,8 +3,10 @@ Centralized error handlers and logging for the Flask app.
 
 This module exposes `register_error_handlers(app)` which configures
 file logging and a global exception handler that logs request info
-and stack traces to `../logs/error.log`. In debug mode the traceback
-is also returned in the JSON response to aid development.
+and stack traces to `../logs/error.log`. With LOG_TO_FILE off (the
+serverless default) they go to the Flask logger's stream instead. In
+debug mode the traceback is also returned in the JSON response to aid
+development.
 """
 import os
 import logging
@@ -15,8 +17,7 @@ from werkzeug.exceptions import HTTPException
 from flask_login import current_user
 
 
-def register_error_handlers(app):
-    """Configure logging and register a global exception handler."""
+def _add_file_handler(app):
     # Ensure logs directory exists next to project root
     logs_dir = os.path.abspath(os.path.join(app.root_path, '..', 'logs'))
     os.makedirs(logs_dir, exist_ok=True)
@@ -32,6 +33,11 @@ def register_error_handlers(app):
         app.logger.addHandler(handler)
 
 
+def register_error_handlers(app):
+    """Configure logging and register a global exception handler."""
+    if app.config.get('LOG_TO_FILE', True):
+        _add_file_handler(app)
+
     @app.errorhandler(401)
     def handle_unauthorized(e):
         return jsonify({'error': 'Unauthorized - please login'}), 401
@@ -0,0 +1,223 @@
+"""
+Streaming disaster report export
+
+Reports are read in fixed-size chunks through a server-side cursor
+(yield_per) and encoded chunk by chunk, so the export never holds the whole
+table in memory and the first bytes leave the worker right away. Task
+counts come from an aggregate subquery instead of loading each report's
+volunteer_tasks; cluster sizes from a join on report_clusters.
+
+Formats:
+- csv:      the legacy disaster log layout
+- ndjson:   one JSON object per report
+- columnar: a header line naming the columns, then one JSON line per chunk
+            holding a list of column arrays
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from sqlalchemy import select, func
+from models import db, User, DisasterReport, ReportCluster, VolunteerTask
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/x-ndjson', 'columnar.ndjson'),
+}
+
+# (CSV header, field name) in output order
+EXPORT_COLUMNS = [
+    ('ID', 'id'),
+    ('Title', 'title'),
+    ('Description', 'description'),
+    ('Location', 'location'),
+    ('Latitude', 'latitude'),
+    ('Longitude', 'longitude'),
+    ('Severity', 'severity'),
+    ('Status', 'status'),
+    ('Reporter', 'reporter_name'),
+    ('Reporter Email', 'reporter_email'),
+    ('Reporter Phone', 'reporter_phone'),
+    ('Volunteer Tasks', 'volunteer_tasks'),
+    ('Created At', 'created_at'),
+    ('Updated At', 'updated_at'),
+    ('Resolved At', 'resolved_at'),
+    ('Cluster ID', 'cluster_id'),
+    ('Cluster Size', 'cluster_size'),
+]
+FIELD_NAMES = [name for _, name in EXPORT_COLUMNS]
+
+
+def build_export_query(start=None, end=None, statuses=None, severities=None, since=None, until=None):
+    """Column-only select for the export, with the task count aggregated in SQL.
+
+    `since`/`until` select reports updated in (since, until] for incremental
+    exports and order them by update time; otherwise reports come newest first.
+    """
+    task_counts = (
+        select(VolunteerTask.report_id, func.count(VolunteerTask.id).label('task_count'))
+        .group_by(VolunteerTask.report_id)
+        .subquery()
+    )
+
+    query = (
+        select(
+            DisasterReport.id,
+            DisasterReport.title,
+            DisasterReport.description,
+            DisasterReport.location,
+            DisasterReport.latitude,
+            DisasterReport.longitude,
+            DisasterReport.severity,
+            DisasterReport.status,
+            User.name,
+            User.email,
+            User.phone,
+            func.coalesce(task_counts.c.task_count, 0),
+            DisasterReport.created_at,
+            DisasterReport.updated_at,
+            DisasterReport.resolved_at,
+            DisasterReport.cluster_id,
+            ReportCluster.report_count,
+        )
+        .outerjoin(User, User.id == DisasterReport.reporter_id)
+        .outerjoin(task_counts, task_counts.c.report_id == DisasterReport.id)
+        .outerjoin(ReportCluster, ReportCluster.id == DisasterReport.cluster_id)
+    )
+
+    if start:
+        query = query.where(DisasterReport.created_at >= start)
+    if end:
+        query = query.where(DisasterReport.created_at < end)
+    if statuses:
+        query = query.where(DisasterReport.status.in_(statuses))
+    if severities:
+        query = query.where(DisasterReport.severity.in_(severities))
+
+    if since or until:
+        if since:
+            query = query.where(DisasterReport.updated_at > since)
+        if until:
+            query = query.where(DisasterReport.updated_at <= until)
+        return query.order_by(DisasterReport.updated_at.asc(), DisasterReport.id.asc())
+
+    return query.order_by(DisasterReport.created_at.desc(), DisasterReport.id.desc())
+
+
+def latest_update(since=None):
+    """Newest updated_at after `since`, to pin an incremental export to.
+
+    With nothing updated after `since` it is `since` itself, so the export
+    stays bounded (and empty) rather than open-ended.
+    """
+    query = select(func.max(DisasterReport.updated_at))
+    if since:
+        query = query.where(DisasterReport.updated_at > since)
+    return db.session.execute(query).scalar() or since
+
+
+def export_watermark(until, since=None, lag=0):
+    """The `since=` for the export after one pinned to `until`.
+
+    updated_at is stamped at flush, not at commit, so a transaction still
+    open while this export ran can later commit rows older than `until`.
+    The watermark is held `lag` seconds behind the clock and the next export
+    repeats the rows updated after it; rows whose transaction takes longer
+    than `lag` to commit are still missed. It never moves back past `since`.
+    """
+    if until is None:
+        return since
+    horizon = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=lag)
+    watermark = min(until, horizon)
+    return max(watermark, since) if since else watermark
+
+
+def iter_chunks(query, chunk_size=1000):
+    """Yield lists of plain-value row tuples, chunk_size rows at a time"""
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield [_plain_row(row) for row in partition]
+
+
+def _plain_row(row):
+    (report_id, title, description, location, latitude, longitude, severity, status,
+     reporter_name, reporter_email, reporter_phone, task_count,
+     created_at, updated_at, resolved_at, cluster_id, cluster_size) = row
+    return (
+        report_id, title, description, location, latitude, longitude,
+        severity.value if severity else None,
+        status.value if status else None,
+        reporter_name, reporter_email, reporter_phone, task_count,
+        created_at.isoformat() if created_at else None,
+        updated_at.isoformat() if updated_at else None,
+        resolved_at.isoformat() if resolved_at else None,
+        cluster_id, cluster_size,
+    )
+
+
+def csv_stream(chunks):
+    """Legacy disaster log CSV, one encoded block per chunk"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    yield output.getvalue()
+
+    for rows in chunks:
+        output.seek(0)
+        output.truncate()
+        for row in rows:
+            row = list(row)
+            if row[8] is None:
+                row[8] = row[9] = row[10] = 'Unknown'
+            if row[14] is None:
+                row[14] = 'Not resolved'
+            writer.writerow(row)
+        yield output.getvalue()
+
+
+def ndjson_stream(chunks):
+    """One JSON object per report"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(FIELD_NAMES, row))) + '\n' for row in rows)
+
+
+def columnar_stream(chunks):
+    """Header line with the column names, then one line of column arrays per chunk"""
+    yield json.dumps({'columns': FIELD_NAMES}) + '\n'
+    for rows in chunks:
+        if rows:
+            yield json.dumps([list(column) for column in zip(*rows)]) + '\n'
+
+
+STREAM_WRITERS = {
+    'csv': csv_stream,
+    'ndjson': ndjson_stream,
+    'columnar': columnar_stream,
+}
+
+
+def encode_stream(pieces, use_gzip=False):
+    """Encode text pieces to bytes, optionally as one incremental gzip member"""
+    if not use_gzip:
+        for piece in pieces:
+            yield piece.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def parse_datetime_arg(value):
+    """Parse an ISO date/datetime query argument as naive UTC; None when absent"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,298 @@
+"""
+Geohash encoding, cell coverings and haversine distances
+
+Geohashes share prefixes between nearby points, so a B-tree index on the
+geohash string doubles as a spatial index: every point inside a cell has
+the cell's hash as prefix, and a prefix is a contiguous key range.
+"""
+import heapq
+import math
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # optional; distances fall back to pure Python
+    np = None
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(BASE32)}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+STORED_PRECISION = 9
+MAX_COVER_CELLS = 64
+
+
+def encode(latitude, longitude, precision=STORED_PRECISION):
+    """Geohash of a point"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def cell_center(cell):
+    """(latitude, longitude) of the center of a geohash cell"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+
+
+@lru_cache(maxsize=4096)
+def cell_neighbourhood(cell):
+    """A cell and the (up to) eight cells around it"""
+    latitude, longitude = cell_center(cell)
+    return frozenset(neighbourhood(latitude, longitude, len(cell)))
+
+
+def neighbourhood(latitude, longitude, precision):
+    """The cell containing a point and the (up to) eight cells around it"""
+    height, width = cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0.0, height):
+        lat = latitude + dlat
+        if not -90.0 <= lat <= 90.0:
+            continue
+        for dlon in (-width, 0.0, width):
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return cells
+
+
+def precision_for_radius(radius_km):
+    """Finest geohash precision whose cells are at least radius_km on each side.
+
+    Widths are taken at 60 degrees latitude, so the 3x3 neighbourhood covers
+    the radius everywhere but near the poles.
+    """
+    for precision in range(STORED_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE_LAT >= radius_km and width * KM_PER_DEGREE_LAT * 0.5 >= radius_km:
+            return precision
+    return 1
+
+
+class PointGrid:
+    """Keyed points on a plain lat/lon grid of cells about cell_km high.
+
+    For nearest-neighbour searches whose reach is not known up front: cells
+    are visited in rings outwards from a point, nearest first. Longitudes
+    are not wrapped at the antimeridian.
+    """
+
+    def __init__(self, cell_km):
+        self.step = cell_km / KM_PER_DEGREE_LAT
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, latitude, longitude):
+        return int(latitude // self.step), int(longitude // self.step)
+
+    def add(self, key, latitude, longitude):
+        self.remove(key)
+        cell = self._cell(latitude, longitude)
+        self._cells.setdefault(cell, {})[key] = (latitude, longitude)
+        self._points[key] = cell
+
+    def remove(self, key):
+        cell = self._points.pop(key, None)
+        if cell is not None:
+            members = self._cells[cell]
+            del members[key]
+            if not members:
+                del self._cells[cell]
+
+    def rings(self, latitude, longitude, max_km):
+        """Yield ([(key, latitude, longitude)], reach_km) for each ring of cells outwards.
+
+        reach_km is a lower bound on the distance to any point in the rings
+        not yet yielded; iteration stops once it passes max_km.
+        """
+        row, column = self._cell(latitude, longitude)
+        step_km = math.radians(self.step) * EARTH_RADIUS_KM
+        radius = 0
+        while True:
+            if radius == 0:
+                cells = [(row, column)]
+            else:
+                cells = [(r, c) for r in (row - radius, row + radius)
+                         for c in range(column - radius, column + radius + 1)]
+                cells += [(r, c) for r in range(row - radius + 1, row + radius)
+                          for c in (column - radius, column + radius)]
+            members = [(key, lat, lon) for cell in cells for key, (lat, lon) in self._cells.get(cell, {}).items()]
+            # longitude degrees are narrowest at the far edge of the next ring
+            far_latitude = min(abs(latitude) + (radius + 2) * self.step, 90.0)
+            reach_km = radius * step_km * math.cos(math.radians(far_latitude))
+            yield members, reach_km
+            if reach_km > max_km:
+                return
+            radius += 1
+
+    def nearest(self, latitude, longitude, count, max_km):
+        """[(distance_km, key)] of the `count` nearest points within max_km, nearest first"""
+        found = []
+        for members, reach_km in self.rings(latitude, longitude, max_km):
+            for key, lat, lon in members:
+                distance = distance_km(latitude, longitude, lat, lon)
+                if distance <= max_km:
+                    found.append((distance, key))
+            if len(found) >= count:
+                found = heapq.nsmallest(count, found)
+                if found[-1][0] <= reach_km:
+                    break
+        return sorted(found)[:count]
+
+    def within(self, latitude, longitude, radius_km):
+        """[(distance_km, key)] of the points within radius_km, in no particular order"""
+        found = []
+        for members, _ in self.rings(latitude, longitude, radius_km):
+            for key, lat, lon in members:
+                distance = distance_km(latitude, longitude, lat, lon)
+                if distance <= radius_km:
+                    found.append((distance, key))
+        return found
+
+
+def valid_coordinates(latitude, longitude):
+    return (
+        latitude is not None and longitude is not None
+        and -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+    )
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) around a circle"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (
+        max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+        min(latitude + dlat, 90.0), min(longitude + dlon, 180.0),
+    )
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_precision=STORED_PRECISION):
+    """Smallest set of equal-precision geohash cells covering a bounding box.
+
+    Picks the finest precision (up to max_precision) that needs at most
+    MAX_COVER_CELLS cells.
+    """
+    precision = max_precision
+    while precision > 1:
+        height, width = cell_size(precision)
+        rows = int((max_lat - min_lat) / height) + 2
+        cols = int((max_lon - min_lon) / width) + 2
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+        precision -= 1
+
+    height, width = cell_size(precision)
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + width, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + height, max_lat)
+    return sorted(cells)
+
+
+def prefix_upper_bound(prefix):
+    """Smallest geohash string greater than every hash starting with prefix.
+
+    Returns None when no such bound exists (prefix of all 'z').
+    """
+    chars = list(prefix)
+    while chars:
+        index = _DECODE[chars[-1]]
+        if index + 1 < len(BASE32):
+            chars[-1] = BASE32[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Haversine distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances in km from one point to many, vectorized when numpy is available"""
+    if np is not None:
+        lat1 = np.radians(latitude)
+        lat2 = np.radians(np.asarray(latitudes, dtype=float))
+        dlat = lat2 - lat1
+        dlon = np.radians(np.asarray(longitudes, dtype=float) - longitude)
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    lat1 = math.radians(latitude)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for lat, lon in zip(latitudes, longitudes):
+        lat2 = math.radians(lat)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + cos_lat1 * math.cos(lat2) * math.sin(math.radians(lon - longitude) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
@@ -0,0 +1,106 @@
+"""
+Cached identities for Flask-Login sessions
+
+The user loader runs on every authenticated request. Instead of loading
+the User row each time, it hands out a SessionUser: a read-only snapshot
+of the user's columns, shared between requests and cached per process for
+USER_CACHE_TTL seconds (LRU bounded by USER_CACHE_SIZE). Committed writes
+to a user (role, is_active, password or anything else) drop its snapshot,
+so changes made through this process apply from the next request; the
+TTL bounds how long writes from other workers take to show up.
+
+Views that need to modify the user must load the User row themselves.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+import changes
+from models import db, User
+from replicas import replica_router
+
+
+class SessionUser(UserMixin):
+    """Read-only snapshot of a User, detached from any session"""
+
+    FIELDS = ('id', 'name', 'email', 'phone', 'location', 'role', 'is_active', 'created_at')
+
+    def __init__(self, user):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'SessionUser is read-only; load the User to change {name!r}')
+
+    # UserMixin.is_active is a property; the stored column value shadows it here
+    is_active = None
+
+    to_dict = User.to_dict
+
+    def __repr__(self):
+        return f'<SessionUser {self.id} {self.role.value}>'
+
+
+class IdentityCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users = OrderedDict()
+        self._generation = 0  # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('USER_CACHE_SIZE', self.max_entries)
+        self.clear()
+        changes.on_commit(self.apply_changes)
+
+    def get(self, user_id):
+        """SessionUser for user_id, or None when there is no such user"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and cached[1] > now:
+                self._users.move_to_end(user_id)
+                return cached[0]
+            generation = self._generation
+
+        with replica_router.primary():
+            user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        identity = SessionUser(user)
+        if self.ttl > 0:
+            with self._lock:
+                if generation != self._generation:
+                    # a write committed while loading; don't cache what may predate it
+                    return identity
+                self._users[user_id] = (identity, now + self.ttl)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_entries:
+                    self._users.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+    def apply_changes(self, committed):
+        with self._lock:
+            for change in committed:
+                if change.model is not User or change.kind == 'insert':
+                    continue
+                self._generation += 1
+                if change.kind == 'bulk' or 'id' not in change.values:
+                    self._users.clear()
+                    continue
+                self._users.pop(change.values['id'], None)
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,165 @@
+"""
+Bulk disaster report ingestion
+
+Reports arrive as a JSON array or as NDJSON (one JSON object per line,
+read from the request stream as it arrives). Each row is validated on its
+own; invalid rows are reported with their index and skipped. Valid rows
+are written in batches: one multi-row INSERT ... RETURNING per batch, one
+transaction per batch, so a large upload never holds a long transaction
+and ids come back in input order.
+
+The INSERT bypasses the ORM unit of work, so what the ORM would otherwise
+do per row is done here: the geohash and incident cluster are assigned
+explicitly and an 'insert' change is recorded per row for the commit-time
+listeners (caches, real-time events).
+"""
+import json
+from datetime import datetime, timezone
+import changes
+import geo
+from clustering import cluster_index
+from models import db, DisasterReport, DisasterSeverity, ReportStatus
+
+MAX_LENGTHS = {'title': 255, 'location': 255, 'image_url': 500}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(data, field, required):
+    value = data.get(field)
+    if value is None or value == '':
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    if not isinstance(value, str):
+        raise RowError(f'{field} must be a string')
+    if field in MAX_LENGTHS and len(value) > MAX_LENGTHS[field]:
+        raise RowError(f'{field} must be at most {MAX_LENGTHS[field]} characters')
+    return value
+
+
+def _coordinate(data, field):
+    value = data.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RowError(f'{field} must be a number')
+    return float(value)
+
+
+def validate_row(data):
+    """Column values for one report row; raises RowError"""
+    if not isinstance(data, dict):
+        raise RowError('row must be a JSON object')
+
+    values = {
+        'title': _text(data, 'title', True),
+        'description': _text(data, 'description', True),
+        'location': _text(data, 'location', True),
+        'image_url': _text(data, 'image_url', False),
+        'latitude': _coordinate(data, 'latitude'),
+        'longitude': _coordinate(data, 'longitude'),
+    }
+    if (values['latitude'] is None) != (values['longitude'] is None):
+        raise RowError('latitude and longitude must be given together')
+    if values['latitude'] is not None and not geo.valid_coordinates(values['latitude'], values['longitude']):
+        raise RowError('latitude/longitude out of range')
+
+    try:
+        values['severity'] = DisasterSeverity[str(data.get('severity', 'MEDIUM')).upper()]
+    except KeyError:
+        raise RowError('invalid severity') from None
+    return values
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """Decoded lines of a binary stream, read in chunks rather than per line"""
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', 'replace')
+    if pending:
+        yield pending.decode('utf-8', 'replace')
+
+
+def iter_ndjson(stream):
+    """(index, row or RowError) for each non-blank line of an NDJSON stream"""
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError:
+            yield index, RowError('invalid JSON')
+        index += 1
+
+
+def _insert_batch(batch):
+    """Insert validated rows in one statement; ids in batch order"""
+    table = DisasterReport.__table__
+    connection = db.session.connection()
+    if cluster_index.enabled:
+        cluster_index.assign(db.session, connection, batch)
+    stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+    ids = connection.execute(stmt, batch).scalars().all()
+    for report_id, values in zip(ids, batch):
+        changes.record(db.session, changes.Change('insert', DisasterReport, dict(values, id=report_id), {}))
+    db.session.commit()
+    return ids
+
+
+def ingest_reports(rows, reporter_id, batch_size=500, max_rows=None):
+    """Validate and insert (index, row) pairs.
+
+    Returns (ids, errors): ids has one entry per row read (None for
+    rejected rows), errors is [{'row': index, 'error': message}]. Reading
+    stops at max_rows, reported as an error on the first unread row.
+    """
+    ids, errors = [], []
+    batch, batch_positions = [], []
+
+    def flush():
+        for position, report_id in zip(batch_positions, _insert_batch(batch)):
+            ids[position] = report_id
+        batch.clear()
+        batch_positions.clear()
+
+    for index, row in rows:
+        if max_rows is not None and index >= max_rows:
+            errors.append({'row': index, 'error': f'row limit of {max_rows} reached; remaining rows were not read'})
+            break
+        ids.append(None)
+        try:
+            if isinstance(row, RowError):
+                raise row
+            values = validate_row(row)
+        except RowError as e:
+            errors.append({'row': index, 'error': str(e)})
+            continue
+
+        now = datetime.now(timezone.utc)
+        values.update(
+            reporter_id=reporter_id,
+            status=ReportStatus.PENDING,
+            geohash=geo.encode(values['latitude'], values['longitude']) if values['latitude'] is not None else None,
+            created_at=now,
+            updated_at=now,
+            acknowledged_at=None,
+            resolved_at=None,
+        )
+        batch.append(values)
+        batch_positions.append(index)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return ids, errors
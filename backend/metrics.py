@@ -0,0 +1,248 @@
+"""
+Request and SQL metrics in the Prometheus text format
+
+Every request is timed from Flask's request_started signal (before any
+before_request hook) to the last after_request hook and recorded per
+endpoint (the Flask endpoint name, not the path, so report ids don't
+create new series), method and status:
+- http_request_duration_seconds: latency histogram
+- http_response_size_bytes: body size, for responses with a known length
+- http_request_db_queries / http_request_db_seconds: SQL statements run
+  and time spent in the driver while handling the request
+
+SQL is timed with before/after_cursor_execute on the primary and replica
+engines, and db_queries_total / db_query_seconds_total also count work
+outside requests (the write queue, workers, the CLI). Time spent waiting
+for a pooled connection goes to db_pool_checkout_wait_seconds.
+
+The numbers are per process and kept in memory: a few dict updates under
+a lock per request and per statement, cheap enough to leave on
+(METRICS_ENABLED). They are served at GET /api/admin/metrics. With
+METRICS_TIMING_HEADERS each response also carries X-DB-Queries and a
+Server-Timing header that browser devtools show next to the request.
+"""
+import bisect
+import hmac
+import threading
+import time
+from flask import current_app, g, has_app_context, request, request_started
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for label_values, (counts, total) in items:
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=_number(float(bound))), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+def render(metrics):
+    """The exposition text for a list of Counters and Histograms"""
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{_label_text(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """What one request has spent so far; kept on flask.g"""
+    __slots__ = ('started', 'queries', 'db_seconds', 'pool_wait')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+
+
+def _current():
+    return g.get('_request_stats') if has_app_context() else None
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.enabled = False
+        self._create_metrics()
+
+    def _create_metrics(self):
+        labels = ('endpoint', 'method', 'status')
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Time spent handling requests.', LATENCY_BUCKETS, labels)
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Response body sizes.', SIZE_BUCKETS, labels)
+        self.request_queries = Histogram(
+            'http_request_db_queries', 'SQL statements run per request.', QUERY_BUCKETS, labels)
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Time spent running SQL per request.', LATENCY_BUCKETS, labels)
+        self.queries = Counter('db_queries_total', 'SQL statements run.', ('database',))
+        self.query_time = Counter('db_query_seconds_total', 'Time spent running SQL.', ('database',))
+        self.pool_wait = Histogram(
+            'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.', WAIT_BUCKETS,
+            ('database',))
+
+    def init_app(self, app):
+        from models import db
+
+        self._create_metrics()
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        request_started.connect(self._start_request, app)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            self.instrument(db.engine, 'primary')
+
+    def instrument(self, engine, database):
+        """Time the statements and pool checkouts of `engine`, labelled database=`database`"""
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._metrics_started = time.perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_metrics_started', None)
+            if not self.enabled or started is None:
+                return
+            elapsed = time.perf_counter() - started
+            self.queries.inc(database)
+            self.query_time.inc(database, amount=elapsed)
+            stats = _current()
+            if stats is not None:
+                stats.queries += 1
+                stats.db_seconds += elapsed
+
+        def time_checkouts(pool):
+            # the pool has no event for the start of a checkout, so wrap it
+            connect = pool.connect
+
+            def timed_connect():
+                started = time.perf_counter()
+                try:
+                    return connect()
+                finally:
+                    if self.enabled:
+                        waited = time.perf_counter() - started
+                        self.pool_wait.observe(waited, database)
+                        stats = _current()
+                        if stats is not None:
+                            stats.pool_wait += waited
+
+            pool.connect = timed_connect
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        # dispose() replaces the pool
+        event.listen(engine, 'engine_disposed', lambda engine: time_checkouts(engine.pool))
+        time_checkouts(engine.pool)
+
+    def _start_request(self, sender, **extra):
+        g._request_stats = RequestStats()
+
+    def _finish_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+        self.request_duration.observe(elapsed, *labels)
+        self.request_queries.observe(stats.queries, *labels)
+        self.request_db_time.observe(stats.db_seconds, *labels)
+        if response.content_length is not None:
+            self.response_size.observe(response.content_length, *labels)
+
+        if current_app.config.get('METRICS_TIMING_HEADERS'):
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                f'pool;dur={stats.pool_wait * 1000:.1f}, '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    def token_matches(self, authorization):
+        """True for an `Authorization: Bearer <METRICS_TOKEN>` header, when a token is configured"""
+        token = current_app.config.get('METRICS_TOKEN')
+        scheme, _, given = (authorization or '').partition(' ')
+        return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(given.strip().encode(), token.encode())
+
+    def render(self):
+        return render([
+            self.request_duration, self.response_size, self.request_queries, self.request_db_time,
+            self.queries, self.query_time, self.pool_wait,
+        ])
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,278 @@
+"""
+Versioned schema migrations
+
+Each migration has a version number and is applied at most once; applied
+versions are recorded in the schema_migrations table. Migrations must be
+safe to run against a database that already has their changes (a fresh
+database gets the current models from the baseline), so they check before
+altering.
+
+Migrations are transactional by default. Index builds are not: on
+PostgreSQL they run as CREATE INDEX CONCURRENTLY outside a transaction so
+writes to the table continue while the index is built.
+
+Concurrent upgraders (threads, gunicorn workers) take turns: the first
+applies what is pending and the others then find nothing left to do.
+
+Run with `flask db upgrade` (or `flask db init`, which also creates the
+default admin); `flask db status` lists what is pending.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+import database
+import geo
+import rollups
+import search
+from models import db, User, UserRole, AlertDelivery, ReportCluster, ReportRollup, LatencyRollup
+
+# Arbitrary key for the PostgreSQL advisory lock serializing upgrades
+_LOCK_KEY = 7242017
+# One upgrader per process; the database-level locks below cover other processes
+_upgrade_lock = threading.Lock()
+
+
+class Migration:
+    def __init__(self, version, name, upgrade, transactional=True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+def create_index(conn, name, table, columns, using=None):
+    """CREATE INDEX IF NOT EXISTS, online on PostgreSQL.
+
+    `conn` must be in autocommit mode on PostgreSQL. An invalid index left
+    behind by an interrupted concurrent build is dropped and rebuilt.
+    `columns` may hold parenthesized expressions; `using` names the index
+    method (e.g. GIN).
+    """
+    column_list = ', '.join(columns)
+    method = f' USING {using}' if using else ''
+    if conn.dialect.name == 'postgresql':
+        invalid = conn.execute(text(
+            'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE c.relname = :name AND NOT i.indisvalid'
+        ), {'name': name}).first()
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}{method} ({column_list})'))
+    else:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table}{method} ({column_list})'))
+
+
+def _baseline(conn):
+    """Tables that do not exist yet, as the models define them today"""
+    db.metadata.create_all(conn)
+
+
+def _report_geohash_column(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('disaster_reports')}
+    if 'geohash' in columns:
+        return
+    conn.execute(text('ALTER TABLE disaster_reports ADD COLUMN geohash VARCHAR(12)'))
+    rows = conn.execute(text(
+        'SELECT id, latitude, longitude FROM disaster_reports '
+        'WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+    )).all()
+    updates = [
+        {'id': report_id, 'geohash': geo.encode(lat, lon)}
+        for report_id, lat, lon in rows if geo.valid_coordinates(lat, lon)
+    ]
+    if updates:
+        conn.execute(text('UPDATE disaster_reports SET geohash = :geohash WHERE id = :id'), updates)
+
+
+def _report_geohash_index(conn):
+    create_index(conn, 'ix_disaster_reports_geohash', 'disaster_reports', ['geohash'])
+
+
+COMPOSITE_INDEXES = [
+    ('ix_disaster_reports_status_created_at', 'disaster_reports', ['status', 'created_at']),
+    ('ix_disaster_reports_reporter_id_created_at', 'disaster_reports', ['reporter_id', 'created_at']),
+    ('ix_volunteer_tasks_volunteer_id_status_assigned_at', 'volunteer_tasks', ['volunteer_id', 'status', 'assigned_at']),
+    ('ix_alerts_is_broadcast_created_at', 'alerts', ['is_broadcast', 'created_at']),
+    ('ix_resources_availability_resource_type', 'resources', ['availability', 'resource_type']),
+]
+
+
+def _composite_indexes(conn):
+    for name, table, columns in COMPOSITE_INDEXES:
+        create_index(conn, name, table, columns)
+
+
+def _report_clusters(conn):
+    ReportCluster.__table__.create(conn, checkfirst=True)
+    columns = {c['name'] for c in inspect(conn).get_columns('disaster_reports')}
+    if 'cluster_id' not in columns:
+        # existing reports stay unclustered; clustering only looks forward
+        conn.execute(text('ALTER TABLE disaster_reports ADD COLUMN cluster_id INTEGER REFERENCES report_clusters (id)'))
+
+
+def _report_cluster_indexes(conn):
+    create_index(conn, 'ix_disaster_reports_cluster_id', 'disaster_reports', ['cluster_id'])
+    create_index(conn, 'ix_report_clusters_last_report_at', 'report_clusters', ['last_report_at'])
+
+
+def _search_index(conn):
+    # FTS5 tables and triggers on SQLite, GIN indexes on PostgreSQL; existing rows are indexed
+    search.create_schema(conn, rebuild=True)
+
+
+def _rollups(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('disaster_reports')}
+    if 'acknowledged_at' not in columns:
+        # unknown for existing reports, which therefore have no time-to-acknowledge
+        conn.execute(text('ALTER TABLE disaster_reports ADD COLUMN acknowledged_at TIMESTAMP'))
+    ReportRollup.__table__.create(conn, checkfirst=True)
+    LatencyRollup.__table__.create(conn, checkfirst=True)
+    rollups.backfill(conn)
+
+
+def _alert_deliveries(conn):
+    AlertDelivery.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline', _baseline),
+    Migration(2, 'report_geohash_column', _report_geohash_column),
+    Migration(3, 'report_geohash_index', _report_geohash_index, transactional=False),
+    Migration(4, 'composite_indexes', _composite_indexes, transactional=False),
+    Migration(5, 'report_clusters', _report_clusters),
+    Migration(6, 'report_cluster_indexes', _report_cluster_indexes, transactional=False),
+    Migration(7, 'search_index', _search_index, transactional=False),
+    Migration(8, 'rollups', _rollups),
+    Migration(9, 'alert_deliveries', _alert_deliveries),
+]
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def applied_versions(engine=None):
+    engine = engine or db.engine
+    if not inspect(engine).has_table('schema_migrations'):
+        return set()
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def pending_migrations(engine=None):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def _record(conn, migration):
+    conn.execute(
+        text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+        {'version': migration.version, 'name': migration.name, 'applied_at': datetime.now(timezone.utc)}
+    )
+
+
+def _apply(engine, migration):
+    if migration.transactional:
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+    else:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on `path`, held until the block exits"""
+    with open(path, 'a+b') as handle:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _exclusive(engine):
+    """Hold the upgrade lock of this process and of the database.
+
+    PostgreSQL uses an advisory lock. A file-backed SQLite database uses a
+    lock file next to it: its own write lock can't be held across the
+    separate connections and DDL an upgrade runs.
+    """
+    with _upgrade_lock:
+        if engine.dialect.name == 'postgresql':
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as lock:
+                lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': _LOCK_KEY})
+                try:
+                    yield
+                finally:
+                    lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _LOCK_KEY})
+        elif database.is_sqlite_file(engine.url.render_as_string(hide_password=False)):
+            with _file_lock(f'{engine.url.database}.migrate-lock'):
+                yield
+        else:
+            yield
+
+
+def upgrade(engine=None):
+    """Apply pending migrations in version order; returns the ones applied"""
+    engine = engine or db.engine
+    if not pending_migrations(engine):
+        return []
+
+    # one upgrader at a time across threads and workers; the others wait, then find nothing to do
+    with _exclusive(engine):
+        _ensure_version_table(engine)
+        applied = []
+        # read again under the lock: another upgrader may have finished while this one waited
+        for migration in pending_migrations(engine):
+            _apply(engine, migration)
+            applied.append(migration)
+        return applied
+
+
+def ensure_default_admin():
+    """Create the default admin account if it doesn't exist; True when created"""
+    if User.query.filter_by(email='admin@disaster.com').first():
+        return False
+    admin = User(
+        name='Admin',
+        email='admin@disaster.com',
+        phone='9999999999',
+        role=UserRole.ADMIN,
+        is_active=True
+    )
+    admin.set_password('admin123')
+    db.session.add(admin)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another worker created it first
+        db.session.rollback()
+        return False
+    return True
+
+
+def initialize_database():
+    """Bring the schema up to date and seed the default admin"""
+    upgrade()
+    ensure_default_admin()
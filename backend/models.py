@@ -2,12 +2,16 @@
 Database models for Disaster Management System
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 import enum
+import geo
+from passwords import hasher
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# GET requests read from a replica when DATABASE_REPLICA_URLS is set (replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class UserRole(enum.Enum):
@@ -42,6 +46,13 @@ class TaskStatus(enum.Enum):
     FAILED = "failed"
 
 
+class DeliveryStatus(enum.Enum):
+    """Alert email delivery status"""
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
 class User(UserMixin, db.Model):
     """User model for all roles"""
     __tablename__ = 'users'
@@ -62,12 +73,16 @@ class User(UserMixin, db.Model):
     volunteer_tasks = db.relationship('VolunteerTask', backref='volunteer', lazy=True, foreign_keys='VolunteerTask.volunteer_id')
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password (in the hashing pool; may raise HasherBusy)"""
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
-        """Check if password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check if password matches hash (in the hashing pool; may raise HasherBusy)"""
+        return hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True when the stored hash predates the configured hash parameters"""
+        return hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -83,9 +98,32 @@ class User(UserMixin, db.Model):
         }
 
 
+class ReportCluster(db.Model):
+    """Incident cluster of near-duplicate reports (see clustering.py)"""
+    __tablename__ = 'report_clusters'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_count = db.Column(db.Integer, default=0, nullable=False)
+    first_report_at = db.Column(db.DateTime, nullable=False)
+    last_report_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'report_count': self.report_count,
+            'first_report_at': self.first_report_at.isoformat(),
+            'last_report_at': self.last_report_at.isoformat()
+        }
+
+
 class DisasterReport(db.Model):
     """Disaster report model"""
     __tablename__ = 'disaster_reports'
+    __table_args__ = (
+        db.Index('ix_disaster_reports_status_created_at', 'status', 'created_at'),
+        db.Index('ix_disaster_reports_reporter_id_created_at', 'reporter_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -93,12 +131,15 @@ class DisasterReport(db.Model):
     location = db.Column(db.String(255), nullable=False)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)  # kept in sync with latitude/longitude
     severity = db.Column(db.Enum(DisasterSeverity), default=DisasterSeverity.MEDIUM)
     status = db.Column(db.Enum(ReportStatus), default=ReportStatus.PENDING)
     reporter_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     image_url = db.Column(db.String(500))
+    cluster_id = db.Column(db.Integer, db.ForeignKey('report_clusters.id'), index=True)  # set at insert
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    acknowledged_at = db.Column(db.DateTime)  # first time the report left pending
     resolved_at = db.Column(db.DateTime)
     
     # Relationships
@@ -118,6 +159,7 @@ class DisasterReport(db.Model):
             'status': self.status.value,
             'reporter': self.reporter.to_dict() if self.reporter else None,
             'image_url': self.image_url,
+            'cluster_id': self.cluster_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
@@ -127,9 +169,27 @@ class DisasterReport(db.Model):
         return data
 
 
+@event.listens_for(DisasterReport, 'before_insert')
+@event.listens_for(DisasterReport, 'before_update')
+def _sync_report_geohash(mapper, connection, target):
+    """Keep the indexed geohash in step with the report coordinates"""
+    state = inspect(target)
+    if state.has_identity and not (
+        state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()
+    ):
+        return
+    if geo.valid_coordinates(target.latitude, target.longitude):
+        target.geohash = geo.encode(target.latitude, target.longitude)
+    else:
+        target.geohash = None
+
+
 class VolunteerTask(db.Model):
     """Volunteer task assignment model"""
     __tablename__ = 'volunteer_tasks'
+    __table_args__ = (
+        db.Index('ix_volunteer_tasks_volunteer_id_status_assigned_at', 'volunteer_id', 'status', 'assigned_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     volunteer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -159,6 +219,9 @@ class VolunteerTask(db.Model):
 class Resource(db.Model):
     """Emergency resources model"""
     __tablename__ = 'resources'
+    __table_args__ = (
+        db.Index('ix_resources_availability_resource_type', 'availability', 'resource_type'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -192,6 +255,9 @@ class Resource(db.Model):
 class Alert(db.Model):
     """Alert/notification model"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        db.Index('ix_alerts_is_broadcast_created_at', 'is_broadcast', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -216,6 +282,49 @@ class Alert(db.Model):
         }
 
 
+class ReportRollup(db.Model):
+    """Report counts per hour/day of creation (see rollups.py)"""
+    __tablename__ = 'report_rollups'
+    
+    granularity = db.Column(db.String(8), primary_key=True)  # hour, day
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the hour/day, UTC
+    severity = db.Column(db.String(16), primary_key=True)
+    status = db.Column(db.String(16), primary_key=True)
+    cell = db.Column(db.String(12), primary_key=True)  # coarse geohash, '' without coordinates
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LatencyRollup(db.Model):
+    """Latency sketch bins per hour/day of the ending event (see rollups.py)"""
+    __tablename__ = 'latency_rollups'
+    
+    granularity = db.Column(db.String(8), primary_key=True)  # hour, day
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the hour/day, UTC
+    metric = db.Column(db.String(16), primary_key=True)  # acknowledge, resolve, task_start, task_complete
+    severity = db.Column(db.String(16), primary_key=True)  # '' for task metrics
+    bin = db.Column(db.Integer, primary_key=True)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AlertDelivery(db.Model):
+    """One alert email to one user, sent by the outbox worker (see alert_email.py)"""
+    __tablename__ = 'alert_deliveries'
+    __table_args__ = (
+        db.Index('ix_alert_deliveries_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    alert_id = db.Column(db.Integer, db.ForeignKey('alerts.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    status = db.Column(db.Enum(DeliveryStatus), default=DeliveryStatus.PENDING, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)  # due time; a claimed row's lease expiry
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 def init_db(app):
     """Initialize database with app context"""
     db.init_app(app)
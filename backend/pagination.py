@@ -0,0 +1,159 @@
+"""
+Keyset (cursor) pagination for newest-first listings
+
+Pages are selected with a seek predicate on (timestamp, id) instead of
+OFFSET, so page N costs the same as page 1 on an indexed column pair.
+Cursors are opaque URL-safe tokens carrying the boundary row's key and the
+direction to read in. Listing totals come from a short-lived count cache
+instead of a COUNT(*) per page.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import and_, or_
+import changes
+from replicas import replica_router
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id, direction):
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(timestamp, row_id, direction) from a cursor token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, row_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev') or not isinstance(row_id, int):
+            raise ValueError(direction)
+        return datetime.fromisoformat(timestamp), row_id, direction
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_paginate(query, timestamp_column, id_column, per_page, cursor=None):
+    """One newest-first page of `query` ordered by (timestamp_column, id_column).
+
+    `query` must not be ordered yet. Raises InvalidCursor for bad tokens.
+    """
+    direction = 'next'
+    if cursor:
+        timestamp, row_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(or_(
+                timestamp_column < timestamp,
+                and_(timestamp_column == timestamp, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                timestamp_column > timestamp,
+                and_(timestamp_column == timestamp, id_column > row_id)
+            ))
+
+    if direction == 'next':
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(timestamp_column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    def key(row, to):
+        return encode_cursor(getattr(row, timestamp_column.key), getattr(row, id_column.key), to)
+
+    more_after = has_more if direction == 'next' else bool(cursor)
+    more_before = bool(cursor) if direction == 'next' else has_more
+    return KeysetPage(
+        rows,
+        key(rows[-1], 'next') if rows and more_after else None,
+        key(rows[0], 'prev') if rows and more_before else None,
+    )
+
+
+class CountCache:
+    """COUNT(*) per listing scope, reused for `ttl` seconds.
+
+    Scopes are (model, {column: value}) filters. Committed inserts, deletes
+    and updates of a filter column drop the scopes they fall into, so a
+    user's own listing total is exact right after they write. `listing`
+    tells apart totals that count something else over the same scope.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PAGINATION_COUNT_TTL', self.ttl)
+        self.clear()
+        changes.on_commit(self.apply_changes)
+
+    def get(self, model, filters, query, listing=None):
+        key = (model, tuple(sorted(filters.items())), listing)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        with replica_router.primary():
+            count = query.order_by(None).count()
+        with self._lock:
+            for stale in [k for k, (_, expires_at) in self._counts.items() if expires_at <= now]:
+                del self._counts[stale]
+            self._counts[key] = (count, now + self.ttl)
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    @staticmethod
+    def _in_scope(filters, values):
+        return all(values.get(column, value) == value for column, value in filters)
+
+    def _affected(self, filters, change):
+        if change.kind == 'bulk':
+            return True
+        if change.kind == 'update':
+            changed = [column for column, _ in filters if column in change.previous]
+            if not changed:
+                return False
+            old_values = dict(change.values)
+            old_values.update((c, v) for c, v in change.previous.items() if v is not changes.UNKNOWN)
+            return self._in_scope(filters, change.values) or self._in_scope(filters, old_values) \
+                or any(change.previous[c] is changes.UNKNOWN for c in changed)
+        return self._in_scope(filters, change.values)
+
+    def apply_changes(self, committed):
+        with self._lock:
+            for change in committed:
+                for key in [k for k in self._counts if k[0] is change.model]:
+                    if self._affected(key[1], change):
+                        del self._counts[key]
+
+
+count_cache = CountCache()
+
+
+def page_args(request, default_per_page=10, max_per_page=100):
+    """(per_page, cursor) from the request query string"""
+    per_page = request.args.get('per_page', default_per_page, type=int)
+    return max(1, min(per_page, max_per_page)), request.args.get('cursor')
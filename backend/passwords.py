@@ -0,0 +1,100 @@
+"""
+Password hashing off the request thread
+
+Hashes are computed in a small process pool so a burst of signups and
+logins cannot starve the request workers of CPU. The number of hashes
+waiting on or running in the pool is bounded; past that, `hash` and
+`verify` raise HasherBusy immediately and the caller answers 503 instead
+of queueing more work behind a backlog it cannot clear.
+
+PASSWORD_HASH_METHOD is any Werkzeug method string ('scrypt',
+'scrypt:16384:8:1', 'pbkdf2:sha256:600000', ...). Stored hashes made with
+other parameters are reported by `needs_rehash` so login can upgrade them.
+With PASSWORD_HASH_WORKERS=0 hashing runs inline (serverless default).
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """The hashing pool is at capacity; retry later"""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=0, max_pending=None, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending or max(1, workers) * 4
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._canonical_method = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING') or max(1, self.workers) * 4
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._canonical_method = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: the request workers may run threads, which fork would copy mid-state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy() from None
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when pwhash was made with different parameters than configured"""
+        if self._canonical_method is None:
+            # Werkzeug fills in default parameters ('scrypt' -> 'scrypt:32768:8:1');
+            # hash once to learn the full method string it writes
+            self._canonical_method = _hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._canonical_method
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher()
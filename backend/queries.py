@@ -0,0 +1,49 @@
+"""
+Shared query-loading profiles for list and detail endpoints
+
+Every relationship in models.py is declared lazy, so serializing a page of
+reports with to_dict() would otherwise issue one query per reporter and per
+task. Routes pick one of the named profiles below instead of hand-writing
+loader options, which keeps the number of SQL statements per listing fixed
+regardless of page size.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from models import DisasterReport, VolunteerTask
+
+
+def report_options(profile='list'):
+    """Loader options for a DisasterReport query.
+
+    - list:   reporter only (to_dict())
+    - detail: reporter, tasks and each task's volunteer (to_dict(include_tasks=True))
+    """
+    reporter = joinedload(DisasterReport.reporter)
+
+    if profile == 'list':
+        return (reporter,)
+    if profile == 'detail':
+        return (
+            reporter,
+            selectinload(DisasterReport.volunteer_tasks).joinedload(VolunteerTask.volunteer),
+        )
+    raise ValueError(f'Unknown report loading profile: {profile}')
+
+
+def task_options(profile='list'):
+    """Loader options for a VolunteerTask query.
+
+    - list:   volunteer only (to_dict())
+    """
+    if profile == 'list':
+        return (joinedload(VolunteerTask.volunteer),)
+    raise ValueError(f'Unknown task loading profile: {profile}')
+
+
+def report_query(profile='list'):
+    """DisasterReport query with the given loading profile applied"""
+    return DisasterReport.query.options(*report_options(profile))
+
+
+def task_query(profile='list'):
+    """VolunteerTask query with the given loading profile applied"""
+    return VolunteerTask.query.options(*task_options(profile))
@@ -0,0 +1,153 @@
+"""
+EXPLAIN the queries behind the API endpoints
+
+Each endpoint in ENDPOINTS is requested through the test client as a user
+of the given role; the SQL it runs is captured and the database's plan for
+every statement is reported with the indexes it uses and the tables it
+scans in full. Used by `flask db explain`.
+"""
+from sqlalchemy import event
+from models import db, User, UserRole
+
+# (role or None for anonymous, path)
+ENDPOINTS = [
+    (UserRole.ADMIN, '/api/admin/dashboard'),
+    (UserRole.ADMIN, '/api/admin/reports'),
+    (UserRole.ADMIN, '/api/admin/reports?status=pending'),
+    (UserRole.ADMIN, '/api/admin/reports?collapse=cluster'),
+    (UserRole.ADMIN, '/api/admin/alerts'),
+    (UserRole.ADMIN, '/api/admin/search?q=flood'),
+    (UserRole.CITIZEN, '/api/citizen/dashboard'),
+    (UserRole.CITIZEN, '/api/citizen/reports'),
+    (UserRole.CITIZEN, '/api/citizen/alerts'),
+    (UserRole.VOLUNTEER, '/api/volunteer/dashboard'),
+    (UserRole.VOLUNTEER, '/api/volunteer/tasks'),
+    (UserRole.VOLUNTEER, '/api/volunteer/tasks?status=assigned'),
+    (None, '/api/public/disasters'),
+    (None, '/api/public/alerts'),
+    (None, '/api/public/resources'),
+    (None, '/api/public/resources?type=medical'),
+    (None, '/api/public/statistics'),
+    (None, '/api/public/search?q=flood'),
+]
+
+
+class StatementPlan:
+    def __init__(self, statement, plan, indexes, full_scans):
+        self.statement = statement
+        self.plan = plan
+        self.indexes = indexes
+        self.full_scans = full_scans
+
+
+def _sqlite_plan(cursor, statement, parameters):
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    details = [row[3] for row in cursor.fetchall()]
+    indexes, scans = [], []
+    for detail in details:
+        words = detail.split()
+        if 'INDEX' in words:
+            indexes.append(words[words.index('INDEX') + 1])
+        elif 'PRIMARY' in words:
+            indexes.append(f'{words[1]} primary key')
+        elif words[:1] == ['SCAN'] and len(words) == 2:
+            scans.append(words[1])
+    return details, indexes, scans
+
+
+def _postgresql_plan(cursor, statement, parameters):
+    cursor.execute('EXPLAIN ' + statement, parameters)
+    lines = [row[0] for row in cursor.fetchall()]
+    indexes, scans = [], []
+    for line in lines:
+        words = line.replace('->', '').split()
+        if 'using' in words:
+            indexes.append(words[words.index('using') + 1])
+        elif 'Bitmap' in words and 'Index' in words and 'on' in words:
+            indexes.append(words[words.index('on') + 1])
+        elif words[:2] == ['Seq', 'Scan']:
+            scans.append(words[3])
+    return lines, indexes, scans
+
+
+PLANNERS = {
+    'sqlite': _sqlite_plan,
+    'postgresql': _postgresql_plan,
+}
+
+
+def explain_statement(statement, parameters=()):
+    """StatementPlan for one DBAPI-level statement"""
+    planner = PLANNERS.get(db.engine.dialect.name)
+    if planner is None:
+        raise ValueError(f'EXPLAIN is not supported for {db.engine.dialect.name}')
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        plan, indexes, scans = planner(cursor, statement, parameters)
+        cursor.close()
+    finally:
+        connection.close()
+    return StatementPlan(statement, plan, indexes, scans)
+
+
+def capture_statements(client, path):
+    """(statement, parameters) pairs executed while serving one GET request"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and (statement, parameters) not in statements:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def _client_for(app, role):
+    client = app.test_client()
+    if role is None:
+        return client
+    user = User.query.filter_by(role=role, is_active=True).first()
+    if user is None:
+        return None
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+def _clear_caches():
+    from pagination import count_cache
+    from stats import stats_cache
+    count_cache.clear()
+    stats_cache.invalidate()
+
+
+def explain_endpoints(app, endpoints=ENDPOINTS):
+    """[(path, [StatementPlan] or None when no user has the role)]"""
+    from response_cache import response_cache
+    results = []
+    clients = {}
+    # the first request runs the one-time database initialization; keep it out of the plans
+    app.test_client().get('/api/public/statistics')
+    enabled, response_cache.enabled = response_cache.enabled, False
+    try:
+        for role, path in endpoints:
+            # a fresh app context per endpoint, so no session or logged-in user carries over
+            with app.app_context():
+                if role not in clients:
+                    clients[role] = _client_for(app, role)
+                client = clients[role]
+                if client is None:
+                    results.append((path, None))
+                    continue
+                _clear_caches()
+                statements = capture_statements(client, path)
+                results.append((path, [explain_statement(s, p) for s, p in statements]))
+    finally:
+        response_cache.enabled = enabled
+    return results
@@ -0,0 +1,201 @@
+"""
+N+1 and slow query detection for development and CI
+
+With QUERY_PROFILER on, the SQL each request runs is grouped by shape: the
+statement with whitespace collapsed, literals and bound values replaced by
+?, and IN lists folded, so `WHERE users.id = 3` and `WHERE users.id = 7`
+are the same shape. When the request finishes:
+- a shape run more than QUERY_PROFILER_MAX_REPEATS times is logged as a
+  repeated query, the usual sign of a lazy load inside a loop (N+1)
+- a statement slower than QUERY_PROFILER_SLOW_MS is logged with its plan
+  (query_plans.explain_statement)
+Both name the route and the first line of project code that ran the
+statement, e.g. `backend/models.py:160 in to_dict`.
+
+Finding that line walks the Python stack, once per shape per request, so
+the profiler is off by default and meant for development and CI rather
+than production; metrics.py covers production.
+
+Tests use `QueryProfile.capture(engine)` through the `query_budget` fixture
+(tests/conftest.py) to fail when an endpoint exceeds its query budget.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, request, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_THIS_FILE = os.path.abspath(__file__)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r'%\(\w+\)s|%s')
+_IN_LIST = re.compile(r'\bIN \(\?(?:, \?)+\)', re.IGNORECASE)
+
+
+def normalize(statement):
+    """The shape of a statement: values replaced by ?, IN lists folded to IN (?, ...)"""
+    shape = ' '.join(statement.split())
+    shape = _PARAMETER.sub('?', _LITERAL.sub('?', shape))
+    return _IN_LIST.sub('IN (?, ...)', shape)
+
+
+def caller():
+    """'file:line in function' of the innermost project code on the stack, outside this module"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class Shape:
+    def __init__(self, sql, source):
+        self.sql = sql
+        self.source = source
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = None  # (seconds, statement, parameters)
+
+
+class QueryProfile:
+    """The statements run during one request (or one `capture` block), grouped by shape"""
+
+    def __init__(self):
+        self.shapes = {}
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, statement, parameters, seconds, executemany=False):
+        sql = normalize(statement)
+        shape = self.shapes.get(sql)
+        if shape is None:
+            shape = self.shapes[sql] = Shape(sql, caller())
+        shape.count += 1
+        shape.seconds += seconds
+        if not executemany and (shape.slowest is None or seconds > shape.slowest[0]):
+            shape.slowest = (seconds, statement, parameters)
+        self.count += 1
+        self.seconds += seconds
+
+    def repeated(self, max_repeats):
+        """Shapes run more than `max_repeats` times, most frequent first"""
+        return sorted((s for s in self.shapes.values() if s.count > max_repeats), key=lambda s: -s.count)
+
+    def slow(self, seconds):
+        """Shapes whose slowest statement took longer than `seconds`, slowest first"""
+        return sorted(
+            (s for s in self.shapes.values() if s.slowest and s.slowest[0] > seconds),
+            key=lambda s: -s.slowest[0]
+        )
+
+    def summary(self):
+        lines = [f'{self.count} statements in {self.seconds * 1000:.1f} ms']
+        for shape in sorted(self.shapes.values(), key=lambda s: -s.count):
+            lines.append(f'  {shape.count:>3}x {shape.seconds * 1000:7.1f} ms  {shape.source}')
+            lines.append(f'        {shape.sql}')
+        return '\n'.join(lines)
+
+    @classmethod
+    @contextmanager
+    def capture(cls, engine):
+        """Profile every statement `engine` runs inside the block"""
+        profile = cls()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._query_capture_started = time.perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = context._query_capture_started
+            profile.record(statement, parameters, time.perf_counter() - started, executemany)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        try:
+            yield profile
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def _explain(statement, parameters):
+    from query_plans import explain_statement
+
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        return explain_statement(statement, parameters).plan
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.max_repeats = 3
+        self.slow_seconds = 0.1
+        self._listening = False
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_PROFILER', False)
+        self.max_repeats = app.config.get('QUERY_PROFILER_MAX_REPEATS', 3)
+        self.slow_seconds = app.config.get('QUERY_PROFILER_SLOW_MS', 100) / 1000.0
+        if not self.enabled:
+            return
+        request_started.connect(self._start_request, app)
+        app.after_request(self._finish_request)
+        if not self._listening:
+            # every engine, so replica reads are profiled too
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+    @staticmethod
+    def _current():
+        return g.get('_query_profile') if has_app_context() else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and self._current() is not None:
+            context._query_profile_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_profile_started', None)
+        profile = self._current()
+        if started is not None and profile is not None:
+            profile.record(statement, parameters, time.perf_counter() - started, executemany)
+
+    def _start_request(self, sender, **extra):
+        g._query_profile = QueryProfile()
+
+    def _finish_request(self, response):
+        profile = g.pop('_query_profile', None)
+        if profile is not None:
+            self.report(profile, f'{request.method} {request.full_path.rstrip("?")} ({request.endpoint})')
+        return response
+
+    def report(self, profile, route):
+        """Log the repeated and slow statements of `profile`"""
+        for shape in profile.repeated(self.max_repeats):
+            logger.warning(
+                'Repeated query at %s: %dx in %.1f ms from %s\n  %s',
+                route, shape.count, shape.seconds * 1000, shape.source, shape.sql
+            )
+        for shape in profile.slow(self.slow_seconds):
+            seconds, statement, parameters = shape.slowest
+            plan = _explain(statement, parameters)
+            logger.warning(
+                'Slow query at %s: %.1f ms from %s\n  %s%s',
+                route, seconds * 1000, shape.source, shape.sql,
+                ''.join(f'\n    {step}' for step in plan or ())
+            )
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,222 @@
+"""
+Real-time Socket.IO events for alerts, reports and volunteer tasks
+
+Every connection joins the 'public' room; authenticated users also join
+'user:<id>' and 'role:<role>', and may subscribe to 'report:<id>' for
+reports they can see. Committed model changes (see changes.py) become
+compact delta events:
+
+- alert:created    full alert, to 'public' when broadcast, else to the
+                   target role and admins
+- report:created   summary fields, to 'public'
+- report:updated   id plus the changed fields, to 'public', the report room,
+                   the reporter and admins
+- task:assigned    task fields, to the volunteer, the report room and admins
+- task:updated     id plus the changed fields, to the same rooms
+
+Events are buffered for REALTIME_COALESCE_MS and merged per entity, so a
+burst of updates to one report goes out as a single delta.
+"""
+import logging
+import threading
+from datetime import datetime
+from flask_login import current_user
+import changes
+from models import db, UserRole, DisasterReport, VolunteerTask, Alert
+
+logger = logging.getLogger(__name__)
+
+REPORT_SUMMARY_FIELDS = (
+    'id', 'title', 'location', 'latitude', 'longitude', 'severity', 'status', 'created_at'
+)
+REPORT_DELTA_FIELDS = (
+    'title', 'description', 'location', 'latitude', 'longitude', 'severity', 'status',
+    'updated_at', 'resolved_at'
+)
+TASK_FIELDS = (
+    'id', 'report_id', 'volunteer_id', 'task_description', 'status', 'assigned_at'
+)
+TASK_DELTA_FIELDS = ('status', 'started_at', 'completed_at', 'notes')
+ALERT_FIELDS = (
+    'id', 'title', 'message', 'alert_level', 'report_id', 'target_role', 'is_broadcast', 'created_at'
+)
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, 'value', value)
+
+
+def _pick(values, fields):
+    return {field: _plain(values.get(field)) for field in fields if field in values}
+
+
+def user_room(user_id):
+    return f'user:{user_id}'
+
+
+def role_room(role):
+    return f'role:{_plain(role)}'
+
+
+def report_room(report_id):
+    return f'report:{report_id}'
+
+
+class RealtimeBroadcaster:
+    """Turns committed changes into coalesced Socket.IO events"""
+
+    def __init__(self):
+        self.socketio = None
+        self.coalesce_seconds = 0.1
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.coalesce_seconds = app.config.get('REALTIME_COALESCE_MS', 100) / 1000.0
+        register_socket_handlers(socketio)
+        changes.on_commit(self.publish_changes)
+
+    def publish(self, event, key, payload, rooms):
+        """Queue an event; payloads with the same (event, key) are merged"""
+        with self._lock:
+            pending = self._buffer.get((event, key))
+            if pending:
+                pending[0].update(payload)
+                pending[1].update(rooms)
+            else:
+                self._buffer[(event, key)] = (dict(payload), set(rooms))
+        self._ensure_flusher()
+
+    def flush(self):
+        """Emit everything buffered so far"""
+        with self._lock:
+            buffered, self._buffer = self._buffer, {}
+        for (event, _), (payload, rooms) in buffered.items():
+            self.socketio.emit(event, payload, to=sorted(rooms))
+
+    def _ensure_flusher(self):
+        if self.coalesce_seconds <= 0:
+            self.flush()
+            return
+        with self._lock:
+            if self._flusher_started:
+                return
+            self._flusher_started = True
+        self.socketio.start_background_task(self._flush_loop)
+
+    def _flush_loop(self):
+        while True:
+            self.socketio.sleep(self.coalesce_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Realtime flush failed')
+
+    def publish_changes(self, committed):
+        if self.socketio is None or self.socketio.server is None:
+            return
+
+        for change in committed:
+            handler = self._handlers.get((change.model, change.kind))
+            if handler:
+                handler(self, change)
+
+    def _alert_created(self, change):
+        values = change.values
+        if values.get('is_broadcast'):
+            rooms = {'public'}
+        else:
+            rooms = {role_room(values.get('target_role') or UserRole.CITIZEN), role_room(UserRole.ADMIN)}
+        self.publish('alert:created', values['id'], _pick(values, ALERT_FIELDS), rooms)
+
+    def _report_created(self, change):
+        values = change.values
+        self.publish('report:created', values['id'], _pick(values, REPORT_SUMMARY_FIELDS), {'public'})
+
+    def _report_updated(self, change):
+        values = change.values
+        delta = _pick(values, [f for f in REPORT_DELTA_FIELDS if f in change.previous])
+        if not delta:
+            return
+        delta['id'] = values['id']
+        if 'updated_at' in values:
+            delta['updated_at'] = _plain(values['updated_at'])
+        rooms = {'public', report_room(values['id']), role_room(UserRole.ADMIN)}
+        if values.get('reporter_id'):
+            rooms.add(user_room(values['reporter_id']))
+        self.publish('report:updated', values['id'], delta, rooms)
+
+    def _task_rooms(self, values):
+        return {user_room(values['volunteer_id']), report_room(values['report_id']), role_room(UserRole.ADMIN)}
+
+    def _task_assigned(self, change):
+        values = change.values
+        self.publish('task:assigned', values['id'], _pick(values, TASK_FIELDS), self._task_rooms(values))
+
+    def _task_updated(self, change):
+        values = change.values
+        delta = _pick(values, [f for f in TASK_DELTA_FIELDS if f in change.previous])
+        if not delta or 'volunteer_id' not in values or 'report_id' not in values:
+            return
+        delta.update(id=values['id'], report_id=values['report_id'])
+        self.publish('task:updated', values['id'], delta, self._task_rooms(values))
+
+    _handlers = {
+        (Alert, 'insert'): _alert_created,
+        (DisasterReport, 'insert'): _report_created,
+        (DisasterReport, 'update'): _report_updated,
+        (VolunteerTask, 'insert'): _task_assigned,
+        (VolunteerTask, 'update'): _task_updated,
+    }
+
+
+broadcaster = RealtimeBroadcaster()
+
+
+def can_view_report(user, report_id):
+    """Admins see every report, citizens their own, volunteers the ones they work on"""
+    if user.role == UserRole.ADMIN:
+        return db.session.get(DisasterReport, report_id) is not None
+    if user.role == UserRole.VOLUNTEER:
+        return db.session.query(
+            VolunteerTask.query.filter_by(report_id=report_id, volunteer_id=user.id).exists()
+        ).scalar()
+    return db.session.query(
+        DisasterReport.query.filter_by(id=report_id, reporter_id=user.id).exists()
+    ).scalar()
+
+
+def register_socket_handlers(socketio):
+    """Room membership handlers; safe to call once per SocketIO instance"""
+    from flask_socketio import join_room, leave_room
+
+    if getattr(socketio, '_realtime_handlers_registered', False):
+        return
+    socketio._realtime_handlers_registered = True
+
+    @socketio.on('connect')
+    def on_connect(auth=None):
+        join_room('public')
+        if current_user.is_authenticated:
+            join_room(user_room(current_user.id))
+            join_room(role_room(current_user.role))
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        report_id = (data or {}).get('report_id')
+        if not current_user.is_authenticated or not isinstance(report_id, int):
+            return {'error': 'Unauthorized'}
+        if not can_view_report(current_user, report_id):
+            return {'error': 'Unauthorized'}
+        join_room(report_room(report_id))
+        return {'subscribed': report_room(report_id)}
+
+    @socketio.on('unsubscribe')
+    def on_unsubscribe(data):
+        report_id = (data or {}).get('report_id')
+        leave_room(report_room(report_id))
+        return {'unsubscribed': report_room(report_id)}
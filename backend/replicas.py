@@ -0,0 +1,174 @@
+"""
+Read replica routing
+
+With DATABASE_REPLICA_URLS set (comma separated), SELECTs made by GET and
+HEAD requests go to a replica, chosen round-robin. Everything else uses
+the primary (DATABASE_URL):
+- writes, flushes and SELECT ... FOR UPDATE
+- reads in a session that has already written
+- all work outside a request (CLI, worker threads)
+- raw session.connection() use
+- reads inside `replica_router.primary()`, which the shared in-process
+  caches (response cache misses, counters, identities, search and
+  allocation indexes) use, so a lagging replica is never cached where a
+  client that has just written would be served from it
+
+Replication lags a little, so a client that has just committed a write
+reads from the primary for REPLICA_STICKY_SECONDS afterwards. The deadline
+is kept in the Flask session cookie, so it follows the client to every
+worker process.
+
+Each replica is checked with SELECT 1 at most every REPLICA_CHECK_SECONDS
+before it is picked. A replica that fails the check, or drops connections,
+is skipped for that long; with no healthy replica, reads go to the primary.
+
+Replica engines use the same pool settings as the primary
+(database.engine_options) and report to the same metrics (metrics.py),
+labelled database="replica".
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import has_request_context, request, session as client_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from metrics import request_metrics
+
+logger = logging.getLogger(__name__)
+
+STICKY_KEY = '_db_primary_until'
+_WROTE_KEY = 'replicas_wrote'
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.engines = []
+        self.sticky_seconds = 10.0
+        self.check_seconds = 10.0
+        self._turn = itertools.count()
+        self._checked = {}  # engine -> when it was last checked or found healthy
+        self._down_until = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        import database
+
+        self.shutdown()
+        config = app.config
+        self.sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 10.0)
+        self.check_seconds = config.get('REPLICA_CHECK_SECONDS', 10.0)
+        urls = [url.strip() for url in (config.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+        engines = []
+        for url in urls:
+            engine = create_engine(url, **database.engine_options(url, config))
+            database.tune_engine(engine, url, config)
+            event.listen(engine, 'handle_error', self._on_error)
+            request_metrics.instrument(engine, 'replica')
+            engines.append(engine)
+        self.engines = engines
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    def read_engine(self):
+        """A healthy replica, or None to read from the primary"""
+        count = len(self.engines)
+        start = next(self._turn)
+        for n in range(count):
+            engine = self.engines[(start + n) % count]
+            if self._healthy(engine):
+                return engine
+        return None
+
+    def _healthy(self, engine):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(engine, 0) > now:
+                return False
+            if now - self._checked.get(engine, float('-inf')) < self.check_seconds:
+                return True
+            # one request checks; the others keep using the replica meanwhile
+            self._checked[engine] = now
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+            return True
+        except Exception as e:
+            logger.warning('Replica %s is unavailable: %s', engine.url.render_as_string(), e)
+            self._mark_down(engine)
+            return False
+
+    def _mark_down(self, engine):
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.check_seconds
+
+    def _on_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self._mark_down(context.engine)
+
+    def stick(self):
+        """Send this client's reads to the primary for the next sticky_seconds"""
+        if self.enabled and has_request_context():
+            client_session[STICKY_KEY] = time.time() + self.sticky_seconds
+
+    @contextmanager
+    def primary(self):
+        """Read from the primary inside the block, e.g. to fill a cache shared between clients"""
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+    def reads_from_replica(self):
+        return (
+            self.enabled and has_request_context() and request.method in ('GET', 'HEAD')
+            and not getattr(self._local, 'depth', 0)
+            and client_session.get(STICKY_KEY, 0) <= time.time()
+        )
+
+    def shutdown(self):
+        engines, self.engines = self.engines, []
+        for engine in engines:
+            engine.dispose()
+        with self._lock:
+            self._checked.clear()
+            self._down_until.clear()
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session sending the SELECTs of read requests to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not replica_router.enabled or engine is not self._db.engines.get(None):
+            return engine
+
+        is_read = (
+            clause is not None and getattr(clause, 'is_select', False)
+            and getattr(clause, '_for_update_arg', None) is None
+        )
+        if not is_read or self._flushing:
+            self.info[_WROTE_KEY] = True
+            return engine
+        if self.info.get(_WROTE_KEY) or not replica_router.reads_from_replica():
+            return engine
+        return replica_router.read_engine() or engine
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_after_write(session):
+    if session.info.pop(_WROTE_KEY, False):
+        replica_router.stick()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_writes(session):
+    session.info.pop(_WROTE_KEY, None)
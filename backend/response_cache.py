@@ -0,0 +1,205 @@
+"""
+HTTP response cache for public, per-visitor-identical endpoints
+
+Views decorated with `cached_response(*tags)` have their serialized bodies
+stored under a key built from the endpoint, the query arguments and the
+current generation of each tag. Responses carry a strong ETag and
+Cache-Control, and a matching If-None-Match is answered with 304 straight
+from the cache without running the view.
+
+Committing a DisasterReport, Alert or Resource (see changes.py) bumps the
+generation of its tag, so every entry built from that data stops matching
+at once. The memory backend is per process; with several gunicorn workers
+set RESPONSE_CACHE_URL to a shared backend (redis://...) so generations
+and entries are shared between them.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from flask import Response, current_app, request
+import changes
+from models import User, DisasterReport, Resource, Alert
+from replicas import replica_router
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'mimetype'])
+
+MODEL_TAGS = {
+    DisasterReport: 'reports',
+    Alert: 'alerts',
+    Resource: 'resources',
+    User: 'users',
+}
+
+
+class MemoryBackend:
+    """Process-local LRU of cached responses plus tag generations"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class RedisBackend:
+    """Shared backend so all workers see the same entries and generations"""
+
+    def __init__(self, url, prefix='dms:response-cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('RESPONSE_CACHE_URL points at Redis but the redis package is not installed') from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        item = self.client.hmget(self.prefix + key, 'body', 'etag', 'mimetype')
+        if item[0] is None:
+            return None
+        return CachedResponse(item[0], item[1].decode(), item[2].decode())
+
+    def set(self, key, entry, ttl):
+        name = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.hset(name, mapping={'body': entry.body, 'etag': entry.etag, 'mimetype': entry.mimetype})
+        pipe.expire(name, max(1, int(ttl)))
+        pipe.execute()
+
+    def generations(self, tags):
+        values = self.client.mget([f'{self.prefix}gen:{tag}' for tag in tags])
+        return [int(v) if v else 0 for v in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f'{self.prefix}gen:{tag}')
+        pipe.execute()
+
+    def clear(self):
+        for name in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(name)
+
+
+def backend_from_url(url, max_entries=512):
+    if not url or url.startswith('memory://'):
+        return MemoryBackend(max_entries=max_entries)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported RESPONSE_CACHE_URL: {url}')
+
+
+class ResponseCache:
+    """Caches GET responses of decorated views"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.enabled = True
+        self.ttl = 300
+        self.max_age = 5
+
+    def init_app(self, app, backend=None):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.max_age = app.config.get('RESPONSE_CACHE_MAX_AGE', self.max_age)
+        self.backend = backend or backend_from_url(
+            app.config.get('RESPONSE_CACHE_URL'),
+            max_entries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 512)
+        )
+        changes.on_commit(self.invalidate_changes)
+
+    def invalidate(self, *tags):
+        self.backend.bump(tags)
+
+    def invalidate_changes(self, committed):
+        tags = set()
+        for change in committed:
+            tag = MODEL_TAGS.get(change.model)
+            # A new user can't appear in any cached body until a report
+            # referencing it is committed, which invalidates 'reports'.
+            if tag == 'users' and change.kind == 'insert':
+                continue
+            if tag:
+                tags.add(tag)
+        if tags:
+            self.invalidate(*sorted(tags))
+
+    def _key(self, tags):
+        args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        generations = ','.join(str(g) for g in self.backend.generations(tags))
+        return f'{request.endpoint}?{args}#{generations}'
+
+    def _respond(self, entry):
+        if entry.etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def serve(self, view, tags, args, kwargs):
+        if not self.enabled or request.method != 'GET':
+            return view(*args, **kwargs)
+
+        key = self._key(tags)
+        entry = self.backend.get(key)
+        if entry is None:
+            # filled from the primary: the entry is shared with clients that read their own writes
+            with replica_router.primary():
+                response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = CachedResponse(body, hashlib.sha256(body).hexdigest(), response.mimetype)
+            self.backend.set(key, entry, self.ttl)
+
+        return self._respond(entry)
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*tags):
+    """Cache a public GET view; `tags` name the data its body is built from"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return response_cache.serve(view, tags, args, kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,330 @@
+"""
+Incremental time-series rollups of reports and response latencies
+
+Two tables hold everything the analytics endpoints read, in hour and day
+buckets (UTC):
+- report_rollups:  report counts by creation bucket, severity, status and
+                   coarse location (a LOCATION_PRECISION geohash cell)
+- latency_rollups: latency sketches by the bucket the measured interval
+                   ended in, per metric and report severity
+
+Latencies are kept as LatencySketch bins, one row per (bucket, metric,
+severity, bin) with a sample count. Sketches merge by adding counts, so
+percentiles over any range of buckets come from summing bins in SQL; no
+raw rows are read or sorted, and the error is at most SKETCH_ACCURACY
+relative to the true value.
+
+The rollups are updated in the same transaction as the writes they follow
+(changes.before_commit). Each committed report or task change becomes +1/-1
+deltas on its old and new facts, applied as increments (upserts), so
+concurrent workers never overwrite each other. Set-based ORM writes carry
+no row values and cannot be followed; they are logged, and
+`flask db backfill-rollups` rebuilds the rollups from the raw tables.
+"""
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, event, func, or_, select, update
+import changes
+import geo
+from models import db, DisasterReport, VolunteerTask, ReportRollup, LatencyRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day')
+LOCATION_PRECISION = 3  # ~156 km x 156 km cells
+SKETCH_ACCURACY = 0.01
+
+# metric -> (model, start column, end column)
+METRICS = {
+    'acknowledge': (DisasterReport, 'created_at', 'acknowledged_at'),
+    'resolve': (DisasterReport, 'created_at', 'resolved_at'),
+    'task_start': (VolunteerTask, 'assigned_at', 'started_at'),
+    'task_complete': (VolunteerTask, 'started_at', 'completed_at'),
+}
+
+REPORT_FIELDS = ('severity', 'status', 'latitude', 'longitude', 'created_at', 'acknowledged_at', 'resolved_at')
+TASK_FIELDS = ('assigned_at', 'started_at', 'completed_at')
+
+_REPORT_KEY = ('granularity', 'bucket', 'severity', 'status', 'cell')
+_LATENCY_KEY = ('granularity', 'bucket', 'metric', 'severity', 'bin')
+
+
+class LatencySketch:
+    """Mergeable quantile sketch over logarithmically spaced bins.
+
+    A value x > 1 second falls in bin ceil(log_gamma(x)); every value in a
+    bin is within SKETCH_ACCURACY of the bin's representative value.
+    Values of a second or less share bin 0.
+    """
+
+    GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+    _LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, bins=None):
+        self.bins = Counter(bins or {})
+
+    @classmethod
+    def bin(cls, seconds):
+        return max(0, math.ceil(math.log(max(seconds, 1.0)) / cls._LOG_GAMMA))
+
+    @classmethod
+    def value(cls, bin):
+        return 2 * cls.GAMMA ** bin / (cls.GAMMA + 1)
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def add(self, seconds, count=1):
+        self.bins[self.bin(seconds)] += count
+
+    def merge(self, other):
+        self.bins.update(other.bins)
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile in seconds; None when empty"""
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for bin in sorted(self.bins):
+            seen += self.bins[bin]
+            if seen > rank:
+                return self.value(bin)
+        return self.value(max(self.bins))
+
+
+def floor_bucket(moment, granularity):
+    """Start of the hour/day holding `moment`, as naive UTC"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _naive(moment):
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _plain(value):
+    return getattr(value, 'value', value) or ''
+
+
+def _latency(latencies, metric, severity, start, end, sign):
+    start, end = _naive(start), _naive(end)
+    if start is None or end is None:
+        return
+    sketch_bin = LatencySketch.bin((end - start).total_seconds())
+    for granularity in GRANULARITIES:
+        latencies[(granularity, floor_bucket(end, granularity), metric, severity, sketch_bin)] += sign
+
+
+def report_facts(values, sign, reports, latencies):
+    """Add one report's counts and latencies to the delta counters, with sign +1 or -1"""
+    created_at = _naive(values.get('created_at'))
+    if created_at is None:
+        return
+    severity = _plain(values.get('severity'))
+    latitude, longitude = values.get('latitude'), values.get('longitude')
+    cell = geo.encode(latitude, longitude, LOCATION_PRECISION) if geo.valid_coordinates(latitude, longitude) else ''
+    for granularity in GRANULARITIES:
+        reports[(granularity, floor_bucket(created_at, granularity), severity, _plain(values.get('status')), cell)] += sign
+    for metric in ('acknowledge', 'resolve'):
+        _, start, end = METRICS[metric]
+        _latency(latencies, metric, severity, values.get(start), values.get(end), sign)
+
+
+def task_facts(values, sign, reports, latencies):
+    """Add one task's latencies to the delta counters, with sign +1 or -1"""
+    for metric in ('task_start', 'task_complete'):
+        _, start, end = METRICS[metric]
+        _latency(latencies, metric, '', values.get(start), values.get(end), sign)
+
+
+_FOLLOWED = {
+    DisasterReport: (REPORT_FIELDS, report_facts),
+    VolunteerTask: (TASK_FIELDS, task_facts),
+}
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    pass
+
+
+# Setting a followed column on an expired instance loads the old value first
+# (active_history), so the update's change carries it instead of UNKNOWN.
+for _model, (_fields, _) in _FOLLOWED.items():
+    for _field in _fields:
+        event.listen(getattr(_model, _field), 'set', _load_previous, active_history=True)
+
+
+def change_deltas(committed):
+    """(report deltas, latency deltas) for a list of changes; changes it can't follow are logged"""
+    reports, latencies = Counter(), Counter()
+    for change in committed:
+        followed = _FOLLOWED.get(change.model)
+        if followed is None:
+            continue
+        fields, facts = followed
+        if change.kind == 'bulk':
+            logger.warning('Set-based write to %s is not reflected in the rollups; '
+                           'run `flask db backfill-rollups`', change.model.__tablename__)
+            continue
+        if change.kind == 'insert':
+            facts(change.values, 1, reports, latencies)
+        elif change.kind == 'delete':
+            facts(change.values, -1, reports, latencies)
+        elif set(fields) & set(change.previous):
+            old = dict(change.values, **change.previous)
+            if any(old.get(f) is changes.UNKNOWN for f in fields) or not set(fields) <= set(change.values):
+                logger.warning('Update to %s %s without its previous values is not reflected in the rollups',
+                               change.model.__tablename__, change.values.get('id'))
+                continue
+            facts(old, -1, reports, latencies)
+            facts(change.values, 1, reports, latencies)
+    return _nonzero(reports), _nonzero(latencies)
+
+
+def _nonzero(counter):
+    return {key: delta for key, delta in counter.items() if delta}
+
+
+def _increment(connection, model, key_columns, count_column, deltas):
+    """Add each delta to its row's counter, creating missing rows"""
+    if not deltas:
+        return
+    table = model.__table__
+    rows = [dict(zip(key_columns, key), **{count_column: delta}) for key, delta in deltas.items()]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={count_column: table.c[count_column] + statement.excluded[count_column]},
+        )
+        connection.execute(statement, rows)
+        return
+    for row in rows:
+        matches = [table.c[column] == row[column] for column in key_columns]
+        result = connection.execute(
+            update(table).where(*matches).values({count_column: table.c[count_column] + row[count_column]})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+
+def apply_deltas(connection, reports, latencies):
+    _increment(connection, ReportRollup, _REPORT_KEY, 'report_count', reports)
+    _increment(connection, LatencyRollup, _LATENCY_KEY, 'sample_count', latencies)
+
+
+class RollupMaintainer:
+    """Keeps the rollup tables in step with committed report and task writes"""
+
+    def __init__(self):
+        self.enabled = True
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ROLLUPS_ENABLED', self.enabled)
+        changes.before_commit(self.apply_changes)
+
+    def apply_changes(self, session, committed):
+        if not self.enabled:
+            return
+        reports, latencies = change_deltas(committed)
+        if reports or latencies:
+            apply_deltas(session.connection(), reports, latencies)
+
+
+rollup_maintainer = RollupMaintainer()
+
+
+def backfill(connection, since=None, chunk_size=1000):
+    """Rebuild the rollups from the raw tables; (report rows, latency rows) written.
+
+    With `since` only buckets from the start of that day on are rebuilt.
+    """
+    since = floor_bucket(since, 'day') if since else None
+    for model in (ReportRollup, LatencyRollup):
+        table = model.__table__
+        connection.execute(delete(table).where(table.c.bucket >= since) if since else delete(table))
+
+    reports, latencies = Counter(), Counter()
+    for model, (fields, facts) in _FOLLOWED.items():
+        table = model.__table__
+        query = select(*(table.c[f] for f in fields))
+        if since:
+            query = query.where(or_(*(table.c[f] >= since for f in fields if f.endswith('_at'))))
+        for row in connection.execute(query.execution_options(yield_per=chunk_size)):
+            facts(row._asdict(), 1, reports, latencies)
+
+    if since:
+        reports = Counter({key: n for key, n in reports.items() if key[1] >= since})
+        latencies = Counter({key: n for key, n in latencies.items() if key[1] >= since})
+    reports, latencies = _nonzero(reports), _nonzero(latencies)
+    apply_deltas(connection, reports, latencies)
+    return len(reports), len(latencies)
+
+
+# --- reading -------------------------------------------------------------
+
+def parse_range(args, granularity):
+    """(since, until) naive UTC datetimes from ISO `since`/`until` args.
+
+    Defaults to the last 7 days for hourly and 30 days for daily buckets.
+    Raises ValueError for unparseable values.
+    """
+    until = args.get('until')
+    until = _naive(datetime.fromisoformat(until)) if until else _naive(datetime.now(timezone.utc))
+    since = args.get('since')
+    if since:
+        since = _naive(datetime.fromisoformat(since))
+    else:
+        since = until - timedelta(days=7 if granularity == 'hour' else 30)
+    if since > until:
+        raise ValueError('since must not be after until')
+    return floor_bucket(since, granularity), until
+
+
+def report_series(granularity, since, until, group_by=()):
+    """[{'bucket', <group_by dims>, 'count'}] ordered by bucket"""
+    dims = [getattr(ReportRollup, d) for d in group_by]
+    rows = db.session.query(ReportRollup.bucket, *dims, func.sum(ReportRollup.report_count)).filter(
+        ReportRollup.granularity == granularity,
+        ReportRollup.bucket >= since,
+        ReportRollup.bucket <= until,
+    ).group_by(ReportRollup.bucket, *dims).order_by(ReportRollup.bucket, *dims).all()
+    return [
+        dict(zip(('bucket',) + tuple(group_by) + ('count',), (row[0].isoformat(),) + tuple(row[1:])))
+        for row in rows if row[-1]
+    ]
+
+
+def latency_sketches(metric, granularity, since, until, severities=()):
+    """{bucket: LatencySketch} for one metric, summing bins across severities"""
+    query = db.session.query(
+        LatencyRollup.bucket, LatencyRollup.bin, func.sum(LatencyRollup.sample_count)
+    ).filter(
+        LatencyRollup.granularity == granularity,
+        LatencyRollup.metric == metric,
+        LatencyRollup.bucket >= since,
+        LatencyRollup.bucket <= until,
+    )
+    if severities:
+        query = query.filter(LatencyRollup.severity.in_(severities))
+    sketches = {}
+    for bucket, bin, count in query.group_by(LatencyRollup.bucket, LatencyRollup.bin):
+        if count:
+            sketches.setdefault(bucket, LatencySketch()).bins[bin] += count
+    return dict(sorted(sketches.items()))
@@ -1,17 +1,36 @@
 """
 Admin routes - manage reports, volunteers, resources, and alerts
 """
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
 from models import (
-    db, User, UserRole, DisasterReport, VolunteerTask, Resource, Alert,
+    db, User, UserRole, DisasterReport, ReportCluster, VolunteerTask, Resource, Alert,
     TaskStatus, ReportStatus, DisasterSeverity
 )
+from queries import report_query
+from stats import stats_cache, dashboard_statistics
+from pagination import InvalidCursor, count_cache, keyset_paginate, page_args
+from clustering import cluster_sizes, latest_reports
+from assignment import assignment_solver
+from allocation import resource_allocator
+from bulk import BulkError, set_report_status, status_values, assign_reports
+from serializers import ALERT_PLAN, RESOURCE_PLAN, json_response
+from database import WriteQueueBusy, write_queue
+import rollups
+from search import search_index, parse_kinds, search_args, search_response
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, request_metrics
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
 
+@admin_bp.errorhandler(WriteQueueBusy)
+def write_queue_busy(error):
+    """The write queue is backed up; the write was cancelled, so the client can safely retry"""
+    return {'error': 'Server busy, please retry shortly'}, 503, {'Retry-After': '1'}
+
+
 def admin_required(f):
     """Decorator to require admin role"""
     @wraps(f)
@@ -27,49 +46,174 @@ def admin_required(f):
 @admin_required
 def dashboard():
     """Admin dashboard statistics"""
-    total_reports = DisasterReport.query.count()
-    pending_reports = DisasterReport.query.filter_by(status=ReportStatus.PENDING).count()
-    active_volunteers = User.query.filter_by(role=UserRole.VOLUNTEER).count()
-    total_resources = Resource.query.count()
-    
-    return {
-        'total_reports': total_reports,
-        'pending_reports': pending_reports,
-        'active_volunteers': active_volunteers,
-        'total_resources': total_resources
-    }, 200
+    return dashboard_statistics(), 200
 
 
 @admin_bp.route('/reports', methods=['GET'])
 @login_required
 @admin_required
 def get_all_reports():
-    """Get all disaster reports"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    """Get all disaster reports, newest first.
+
+    Pages by `cursor` (keyset); the legacy `page` parameter still selects
+    offset pagination. `collapse=cluster` lists incident clusters instead,
+    each with its newest report.
+    """
     status = request.args.get('status')
     
-    query = DisasterReport.query.order_by(DisasterReport.created_at.desc())
+    query = report_query('detail')
     
     if status:
-        query = query.filter_by(status=ReportStatus[status.upper()])
+        try:
+            status = ReportStatus[status.upper()]
+        except KeyError:
+            return {'error': 'Invalid status'}, 400
+        query = query.filter_by(status=status)
     
-    paginated = query.paginate(page=page, per_page=per_page)
+    if request.args.get('collapse') == 'cluster':
+        return _get_report_clusters(status)
+    
+    if 'page' in request.args:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+        paginated = query.order_by(DisasterReport.created_at.desc()).paginate(page=page, per_page=per_page)
+        
+        return {
+            'reports': _with_cluster_sizes(paginated.items),
+            'total': paginated.total,
+            'pages': paginated.pages,
+            'current_page': page
+        }, 200
+    
+    per_page, cursor = page_args(request)
+    try:
+        page = keyset_paginate(query, DisasterReport.created_at, DisasterReport.id, per_page, cursor)
+    except InvalidCursor as e:
+        return {'error': str(e)}, 400
+    
+    counts = stats_cache.counts('reports')
+    total = counts.get(status.value, 0) if status else sum(counts.values())
     
     return {
-        'reports': [r.to_dict(include_tasks=True) for r in paginated.items],
-        'total': paginated.total,
-        'pages': paginated.pages,
-        'current_page': page
+        'reports': _with_cluster_sizes(page.items),
+        'total': total,
+        'per_page': per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
     }, 200
 
 
+def _with_cluster_sizes(reports):
+    """Serialized reports with the size of each one's incident cluster"""
+    sizes = cluster_sizes(r.cluster_id for r in reports)
+    return [
+        dict(r.to_dict(include_tasks=True), cluster_size=sizes.get(r.cluster_id, 1))
+        for r in reports
+    ]
+
+
+def _get_report_clusters(status):
+    """Incident clusters, most recently reported first, each with its newest report.
+
+    Reports without a cluster (filed before clustering was deployed, or with
+    it turned off) are listed as clusters of one. Entries are paged by
+    `entry_id`: the cluster id, or minus the id of an unclustered report.
+    """
+    clustered = db.select(ReportCluster.id.label('entry_id'), ReportCluster.last_report_at.label('entry_at'))
+    unclustered = db.select(
+        (-DisasterReport.id).label('entry_id'), DisasterReport.created_at.label('entry_at')
+    ).where(DisasterReport.cluster_id.is_(None))
+    if status:
+        clustered = clustered.where(ReportCluster.id.in_(
+            db.select(DisasterReport.cluster_id).where(DisasterReport.status == status)
+        ))
+        unclustered = unclustered.where(DisasterReport.status == status)
+    entries = db.union_all(clustered, unclustered).subquery()
+    query = db.session.query(entries)
+    
+    per_page, cursor = page_args(request)
+    try:
+        page = keyset_paginate(query, entries.c.entry_at, entries.c.entry_id, per_page, cursor)
+    except InvalidCursor as e:
+        return {'error': str(e)}, 400
+    
+    cluster_ids = [e.entry_id for e in page.items if e.entry_id > 0]
+    report_ids = [-e.entry_id for e in page.items if e.entry_id < 0]
+    clusters = {c.id: c for c in ReportCluster.query.filter(ReportCluster.id.in_(cluster_ids))} if cluster_ids else {}
+    latest = latest_reports(report_query('detail'), cluster_ids, status)
+    lone = {r.id: r for r in report_query('detail').filter(DisasterReport.id.in_(report_ids))} if report_ids else {}
+    
+    def entry(row):
+        if row.entry_id > 0:
+            cluster = clusters[row.entry_id]
+            report = latest.get(cluster.id)
+            return dict(cluster.to_dict(), latest_report=report.to_dict(include_tasks=True) if report else None)
+        report = lone[-row.entry_id]
+        return {
+            'id': None,
+            'report_count': 1,
+            'first_report_at': report.created_at.isoformat(),
+            'last_report_at': report.created_at.isoformat(),
+            'latest_report': report.to_dict(include_tasks=True)
+        }
+    
+    return {
+        'clusters': [entry(row) for row in page.items],
+        'total': count_cache.get(DisasterReport, {'status': status} if status else {}, query, listing='clusters'),
+        'per_page': per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    }, 200
+
+
+@admin_bp.route('/reports/near', methods=['GET'])
+@login_required
+@admin_required
+def get_reports_near():
+    """Reports of any status near a point or inside a bounding box"""
+    import spatial
+    
+    try:
+        area = spatial.parse_area_args(request.args)
+        statuses = [ReportStatus[s.strip().upper()] for s in request.args.get('status', '').split(',') if s.strip()]
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except KeyError:
+        return {'error': 'Invalid status'}, 400
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    
+    hits = spatial.search_area(area, active_only=False, statuses=statuses, limit=limit)
+    reports = spatial.serialize_hits(hits, report_query('list'))
+    
+    return {
+        'reports': reports,
+        'total': len(reports)
+    }, 200
+
+
+@admin_bp.route('/search', methods=['GET'])
+@login_required
+@admin_required
+def search():
+    """Ranked full-text search over reports, alerts and resources; `type` narrows the kinds"""
+    q, page, per_page = search_args(request)
+    if not q:
+        return {'error': 'q is required'}, 400
+    try:
+        kinds = parse_kinds(request.args.get('type'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    results = search_index.search(q, kinds, page=page, per_page=per_page)
+    return search_response(results, page, per_page, report_query('list')), 200
+
+
 @admin_bp.route('/reports/<int:report_id>', methods=['GET'])
 @login_required
 @admin_required
 def get_report(report_id):
     """Get specific report details"""
-    report = DisasterReport.query.get_or_404(report_id)
+    report = report_query('detail').filter_by(id=report_id).first_or_404()
     return report.to_dict(include_tasks=True), 200
 
 
@@ -86,11 +230,41 @@ def update_report_status(report_id):
     
     try:
         new_status = ReportStatus[data['status'].upper()]
-        report.status = new_status
-        db.session.commit()
-        return report.to_dict(), 200
     except KeyError:
         return {'error': 'Invalid status'}, 400
+    
+    if new_status != report.status:
+        current = {'status': report.status, 'acknowledged_at': report.acknowledged_at}
+        for column, value in status_values(new_status, current, datetime.now(timezone.utc)).items():
+            setattr(report, column, value)
+        db.session.commit()
+    return report.to_dict(), 200
+
+
+@admin_bp.route('/reports/bulk/status', methods=['POST'])
+@admin_bp.route('/reports/bulk/resolve', methods=['POST'])
+@login_required
+@admin_required
+def bulk_update_report_status():
+    """Set the status of many reports in one statement.
+
+    Body: report_ids (list) or filter (object), and status (not for /resolve).
+    """
+    data = request.get_json(silent=True) or {}
+    if request.path.endswith('/resolve'):
+        new_status = ReportStatus.RESOLVED
+    else:
+        try:
+            new_status = ReportStatus[str(data.get('status', '')).upper()]
+        except KeyError:
+            return {'error': 'Invalid status'}, 400
+    
+    try:
+        results, updated = set_report_status(data, new_status, current_app.config['BULK_ADMIN_MAX_REPORTS'])
+    except BulkError as e:
+        return {'error': str(e)}, 400
+    
+    return {'status': new_status.value, 'updated': updated, 'results': results}, 200
 
 
 @admin_bp.route('/reports/<int:report_id>/assign', methods=['POST'])
@@ -109,26 +283,95 @@ def assign_volunteer(report_id):
     if volunteer.role != UserRole.VOLUNTEER:
         return {'error': 'Selected user is not a volunteer'}, 400
     
-    task = VolunteerTask(
-        volunteer_id=volunteer.id,
-        report_id=report.id,
-        task_description=data['task_description']
-    )
+    volunteer_id, report_id = volunteer.id, report.id
     
-    db.session.add(task)
-    db.session.commit()
+    def assign(session):
+        # serializes with batch assignment, which re-checks locked reports (assignment.py)
+        session.execute(
+            db.select(DisasterReport.id).where(DisasterReport.id == report_id).with_for_update()
+        ).all()
+        task = VolunteerTask(
+            volunteer_id=volunteer_id,
+            report_id=report_id,
+            task_description=data['task_description']
+        )
+        session.add(task)
+        session.flush()
+        return task.to_dict()
     
+    # Committed by the writer thread together with other waiting inserts (database.py)
     return {
         'message': 'Volunteer assigned successfully',
-        'task': task.to_dict()
+        'task': write_queue.run(assign)
     }, 201
 
 
+@admin_bp.route('/reports/bulk/assign', methods=['POST'])
+@login_required
+@admin_required
+def bulk_assign_volunteer():
+    """Give one volunteer a task on many reports in one statement.
+
+    Body: volunteer_id, task_description, and report_ids (list) or filter (object).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        results, assigned = assign_reports(data, current_app.config['BULK_ADMIN_MAX_REPORTS'])
+    except BulkError as e:
+        return {'error': str(e)}, 400
+    
+    return {'assigned': assigned, 'results': results}, 201 if assigned else 200
+
+
+@admin_bp.route('/assignments/batch', methods=['POST'])
+@login_required
+@admin_required
+def batch_assign_volunteers():
+    """Assign available volunteers to open reports in one global matching.
+
+    Body (all optional): report_ids to restrict the reports considered,
+    task_description, dry_run to return the plan without creating tasks.
+    """
+    data = request.get_json(silent=True) or {}
+    report_ids = data.get('report_ids')
+    if report_ids is not None and (
+        not isinstance(report_ids, list) or not all(isinstance(i, int) for i in report_ids)
+    ):
+        return {'error': 'report_ids must be a list of report ids'}, 400
+    dry_run = bool(data.get('dry_run', False))
+    
+    plan = assignment_solver.plan(report_ids)
+    assignments = [a._asdict() for a in plan.assignments]
+    
+    skipped = []
+    if not dry_run and plan.assignments:
+        task_ids, skipped = assignment_solver.apply(
+            plan, data.get('task_description') or 'Respond to the reported incident'
+        )
+        assignments = [dict(a, task_id=task_ids[a['report_id']]) for a in assignments if a['report_id'] in task_ids]
+    
+    return {
+        'assignments': assignments,
+        'unassigned_report_ids': plan.unassigned_report_ids,
+        'skipped_report_ids': skipped,
+        'solver': plan.solver,
+        'dry_run': dry_run
+    }, 200 if dry_run else 201
+
+
 @admin_bp.route('/volunteers', methods=['GET'])
 @login_required
 @admin_required
 def get_volunteers():
-    """Get all volunteers"""
+    """Get all volunteers; `available=1` keeps those who can take a task, with their load"""
+    if request.args.get('available') in ('1', 'true'):
+        load = {v.id: v.open_tasks for v in assignment_solver.available_volunteers()}
+        volunteers = User.query.filter(User.id.in_(load)).order_by(User.id).all() if load else []
+        return {
+            'volunteers': [dict(v.to_dict(), open_tasks=load[v.id]) for v in volunteers],
+            'total': len(volunteers)
+        }, 200
+    
     volunteers = User.query.filter_by(role=UserRole.VOLUNTEER).all()
     return {
         'volunteers': [v.to_dict() for v in volunteers],
@@ -142,11 +385,11 @@ def get_volunteers():
 def resources():
     """Get all resources or create new resource"""
     if request.method == 'GET':
-        resources = Resource.query.all()
-        return {
-            'resources': [r.to_dict() for r in resources],
+        resources = RESOURCE_PLAN.all(RESOURCE_PLAN.select())
+        return json_response({
+            'resources': resources,
             'total': len(resources)
-        }, 200
+        })
     
     else:  # POST
         data = request.get_json()
@@ -173,6 +416,23 @@ def resources():
         }, 201
 
 
+@admin_bp.route('/resources/allocation', methods=['GET'])
+@login_required
+@admin_required
+def resource_allocation():
+    """Plan where available resources should go; `type` takes comma separated resource types"""
+    types = [t.strip() for t in request.args.get('type', '').split(',') if t.strip()]
+    plans = resource_allocator.plan(types or None)
+    return {
+        'plans': [
+            dict(plan._asdict(),
+                 allocations=[a._asdict() for a in plan.allocations],
+                 shortages=[s._asdict() for s in plan.shortages])
+            for plan in plans
+        ]
+    }, 200
+
+
 @admin_bp.route('/resources/<int:resource_id>', methods=['GET', 'PATCH', 'DELETE'])
 @login_required
 @admin_required
@@ -210,11 +470,11 @@ def manage_resource(resource_id):
 def alerts():
     """Get alerts or create new alert"""
     if request.method == 'GET':
-        alerts = Alert.query.order_by(Alert.created_at.desc()).limit(50).all()
-        return {
-            'alerts': [a.to_dict() for a in alerts],
+        alerts = ALERT_PLAN.all(ALERT_PLAN.select().order_by(Alert.created_at.desc()).limit(50))
+        return json_response({
+            'alerts': alerts,
             'total': len(alerts)
-        }, 200
+        })
     
     else:  # POST - Create new alert
         data = request.get_json()
@@ -222,67 +482,166 @@ def alerts():
         if not data or not data.get('title') or not data.get('message'):
             return {'error': 'Missing title or message'}, 400
         
+        try:
+            target_role = UserRole(data.get('target_role', 'citizen'))
+        except ValueError:
+            return {'error': 'Invalid target_role'}, 400
+        
         alert = Alert(
             title=data['title'],
             message=data['message'],
             alert_level=data.get('alert_level', 'info'),
             report_id=data.get('report_id'),
+            target_role=target_role,
             is_broadcast=data.get('is_broadcast', True)
         )
         
+        # Connected clients receive 'alert:created' once this commits (realtime.py);
+        # the emails to its recipients are queued in the same transaction (alert_email.py)
         db.session.add(alert)
         db.session.commit()
         
-        # TODO: Emit socket.io event to broadcast alert
-        
         return {
             'message': 'Alert created successfully',
             'alert': alert.to_dict()
         }, 201
 
 
+def _analytics_range():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in rollups.GRANULARITIES:
+        raise ValueError('granularity must be hour or day')
+    since, until = rollups.parse_range(request.args, granularity)
+    return granularity, since, until
+
+
+@admin_bp.route('/analytics/reports', methods=['GET'])
+@login_required
+@admin_required
+def report_analytics():
+    """Report counts per hour/day bucket from the rollups; `group_by` takes severity, status, cell"""
+    group_by = [d.strip() for d in request.args.get('group_by', '').split(',') if d.strip()]
+    try:
+        granularity, since, until = _analytics_range()
+        if set(group_by) - {'severity', 'status', 'cell'}:
+            raise ValueError('group_by takes severity, status and cell')
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    return {
+        'granularity': granularity,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'series': rollups.report_series(granularity, since, until, group_by)
+    }, 200
+
+
+@admin_bp.route('/analytics/latency', methods=['GET'])
+@login_required
+@admin_required
+def latency_analytics():
+    """Latency percentiles (seconds) per bucket and overall, merged from the rollup sketches"""
+    metric = request.args.get('metric', 'resolve')
+    severities = [s.strip().lower() for s in request.args.get('severity', '').split(',') if s.strip()]
+    try:
+        granularity, since, until = _analytics_range()
+        if metric not in rollups.METRICS:
+            raise ValueError(f"metric must be one of {', '.join(rollups.METRICS)}")
+        quantiles = [float(q) for q in request.args.get('q', '0.5,0.9,0.99').split(',')]
+        if not all(0 <= q <= 1 for q in quantiles):
+            raise ValueError('quantiles must be between 0 and 1')
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    def summary(sketch):
+        data = {'count': sketch.count}
+        for q in quantiles:
+            value = sketch.quantile(q)
+            data[f'p{q * 100:g}'] = round(value, 1) if value is not None else None
+        return data
+    
+    sketches = rollups.latency_sketches(metric, granularity, since, until, severities)
+    overall = rollups.LatencySketch()
+    for sketch in sketches.values():
+        overall.merge(sketch)
+    
+    return {
+        'metric': metric,
+        'granularity': granularity,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'overall': summary(overall),
+        'buckets': [dict(summary(sketch), bucket=bucket.isoformat()) for bucket, sketch in sketches.items()]
+    }, 200
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Request and SQL metrics for Prometheus; an admin session or `Authorization: Bearer <METRICS_TOKEN>`"""
+    if not request_metrics.enabled:
+        return {'error': 'Metrics are disabled'}, 404
+    if not request_metrics.token_matches(request.headers.get('Authorization')):
+        if not current_user.is_authenticated:
+            return {'error': 'Unauthorized - please login'}, 401
+        if current_user.role != UserRole.ADMIN:
+            return {'error': 'Admin access required'}, 403
+    
+    return current_app.response_class(request_metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @admin_bp.route('/reports/export', methods=['GET'])
 @login_required
 @admin_required
 def export_reports():
-    """Export all disaster reports as CSV"""
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    reports = DisasterReport.query.order_by(DisasterReport.created_at.desc()).all()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        'ID', 'Title', 'Description', 'Location', 'Latitude', 'Longitude',
-        'Severity', 'Status', 'Reporter', 'Reporter Email', 'Reporter Phone',
-        'Volunteer Tasks', 'Created At', 'Updated At', 'Resolved At'
-    ])
-    
-    for report in reports:
-        volunteer_count = len(report.volunteer_tasks)
-        writer.writerow([
-            report.id,
-            report.title,
-            report.description,
-            report.location,
-            report.latitude,
-            report.longitude,
-            report.severity.value,
-            report.status.value,
-            report.reporter.name if report.reporter else 'Unknown',
-            report.reporter.email if report.reporter else 'Unknown',
-            report.reporter.phone if report.reporter else 'Unknown',
-            volunteer_count,
-            report.created_at.isoformat(),
-            report.updated_at.isoformat(),
-            report.resolved_at.isoformat() if report.resolved_at else 'Not resolved'
-        ])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=disaster_reports_log.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
+    """Stream disaster reports as CSV, NDJSON or columnar NDJSON.
+
+    Query params: format, start, end (created_at range), status, severity
+    (comma separated), since (incremental export of rows updated after it).
+    """
+    from flask import Response, current_app, stream_with_context
+    from exports import (
+        EXPORT_FORMATS, STREAM_WRITERS, build_export_query, export_watermark,
+        iter_chunks, encode_stream, latest_update, parse_datetime_arg
+    )
+
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return {'error': f"Invalid format, expected one of: {', '.join(EXPORT_FORMATS)}"}, 400
+
+    try:
+        statuses = [ReportStatus[s.strip().upper()] for s in request.args.get('status', '').split(',') if s.strip()]
+        severities = [DisasterSeverity[s.strip().upper()] for s in request.args.get('severity', '').split(',') if s.strip()]
+    except KeyError:
+        return {'error': 'Invalid status or severity'}, 400
+
+    try:
+        start = parse_datetime_arg(request.args.get('start'))
+        end = parse_datetime_arg(request.args.get('end'))
+        since = parse_datetime_arg(request.args.get('since'))
+    except ValueError:
+        return {'error': 'Invalid date, expected ISO 8601'}, 400
+
+    # Incremental exports are pinned to the newest update visible right now,
+    # so rows committed while streaming are left for the next export.
+    incremental = 'since' in request.args
+    until = latest_update(since) if incremental else None
+    watermark = export_watermark(until, since, current_app.config['EXPORT_WATERMARK_LAG']) if incremental else None
+
+    query = build_export_query(
+        start=start, end=end, statuses=statuses, severities=severities,
+        since=since, until=until
+    )
+    chunks = iter_chunks(query, current_app.config['EXPORT_CHUNK_SIZE'])
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    body = encode_stream(STREAM_WRITERS[export_format](chunks), use_gzip=use_gzip)
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=disaster_reports_log.{extension}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    if watermark:
+        response.headers['X-Export-Watermark'] = watermark.isoformat()
+
     return response
@@ -1,76 +1,107 @@
 """
 Public API routes - for public access and real-time data
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from models import DisasterReport, Alert, Resource, ReportStatus
+from queries import report_query
+from stats import public_statistics
+from response_cache import cached_response
+from serializers import REPORT_PLAN, ALERT_PLAN, RESOURCE_PLAN, json_response
+from search import search_index, search_args, search_response
+import spatial
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 
 @api_bp.route('/public/disasters', methods=['GET'])
+@cached_response('reports', 'users')
 def get_active_disasters():
     """Get active/ongoing disaster reports (public)"""
-    disasters = DisasterReport.query.filter(
+    disasters = REPORT_PLAN.all(REPORT_PLAN.select().where(
         DisasterReport.status.in_([ReportStatus.PENDING, ReportStatus.IN_PROGRESS])
-    ).order_by(DisasterReport.created_at.desc()).all()
+    ).order_by(DisasterReport.created_at.desc()))
+    
+    return json_response({
+        'disasters': disasters,
+        'total': len(disasters)
+    })
+
+
+@api_bp.route('/public/disasters/near', methods=['GET'])
+@api_bp.route('/public/disasters/bbox', methods=['GET'])
+def get_nearby_disasters():
+    """Active disasters within radius_km of lat/lon, or inside a bounding box (public)"""
+    try:
+        area = spatial.parse_area_args(request.args)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    
+    hits = spatial.search_area(area, active_only=True, limit=limit)
+    disasters = spatial.serialize_hits(
+        hits, report_query('list').filter(DisasterReport.status.in_(spatial.ACTIVE_STATUSES))
+    )
     
     return {
-        'disasters': [d.to_dict() for d in disasters],
+        'disasters': disasters,
         'total': len(disasters)
     }, 200
 
 
+@api_bp.route('/public/search', methods=['GET'])
+@cached_response('reports', 'users')
+def search_active_disasters():
+    """Ranked full-text search over active disaster reports (public)"""
+    q, page, per_page = search_args(request)
+    if not q:
+        return {'error': 'q is required'}, 400
+    
+    results = search_index.search(q, ('reports',), active_only=True, page=page, per_page=per_page)
+    return search_response(results, page, per_page, report_query('list')), 200
+
+
 @api_bp.route('/public/alerts', methods=['GET'])
+@cached_response('alerts')
 def get_public_alerts():
     """Get public broadcast alerts"""
     limit = request.args.get('limit', 20, type=int)
-    alerts = Alert.query.filter_by(is_broadcast=True).order_by(
+    alerts = ALERT_PLAN.all(ALERT_PLAN.select().where(Alert.is_broadcast.is_(True)).order_by(
         Alert.created_at.desc()
-    ).limit(limit).all()
+    ).limit(limit))
     
-    return {
-        'alerts': [a.to_dict() for a in alerts],
+    return json_response({
+        'alerts': alerts,
         'total': len(alerts)
-    }, 200
+    })
 
 
 @api_bp.route('/public/resources', methods=['GET'])
+@cached_response('resources')
 def get_available_resources():
     """Get available resources (public)"""
     resource_type = request.args.get('type')
     
-    query = Resource.query.filter_by(availability='available')
+    statement = RESOURCE_PLAN.select().where(Resource.availability == 'available')
     
     if resource_type:
-        query = query.filter_by(resource_type=resource_type)
+        statement = statement.where(Resource.resource_type == resource_type)
     
-    resources = query.all()
+    resources = RESOURCE_PLAN.all(statement)
     
-    return {
-        'resources': [r.to_dict() for r in resources],
+    return json_response({
+        'resources': resources,
         'total': len(resources)
-    }, 200
+    })
+
+
+@api_bp.route('/public/config', methods=['GET'])
+def get_public_config():
+    """Client settings: whether real-time updates are served over Socket.IO"""
+    return {'realtime': current_app.config['ENABLE_SOCKETIO']}, 200
 
 
 @api_bp.route('/public/statistics', methods=['GET'])
+@cached_response('reports', 'resources')
 def get_statistics():
     """Get public statistics"""
-    total_reports = DisasterReport.query.count()
-    active_reports = DisasterReport.query.filter(
-        DisasterReport.status.in_([ReportStatus.PENDING, ReportStatus.IN_PROGRESS])
-    ).count()
-    resolved_reports = DisasterReport.query.filter_by(status=ReportStatus.RESOLVED).count()
-    total_resources = Resource.query.count()
-    available_resources = Resource.query.filter_by(availability='available').count()
-    
-    return {
-        'disaster_stats': {
-            'total_reports': total_reports,
-            'active_reports': active_reports,
-            'resolved_reports': resolved_reports
-        },
-        'resource_stats': {
-            'total': total_resources,
-            'available': available_resources
-        }
-    }, 200
+    return public_statistics(), 200
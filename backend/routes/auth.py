@@ -4,10 +4,18 @@ Authentication routes - signup, login, logout
 from flask import Blueprint, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User, UserRole
+from passwords import HasherBusy
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 
+@auth_bp.errorhandler(HasherBusy)
+def hasher_busy(error):
+    """Password hashing is saturated; shed load instead of queueing"""
+    db.session.rollback()
+    return {'error': 'Server busy, please retry shortly'}, 503, {'Retry-After': '1'}
+
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     """User signup endpoint"""
@@ -56,6 +64,11 @@ def login():
     if not user.is_active:
         return {'error': 'Account is inactive'}, 403
     
+    # Upgrade hashes made with older parameters while the password is at hand
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+    
     login_user(user)
     
     return {
@@ -1,19 +1,30 @@
 """
 Citizen routes - submit reports, track status, receive alerts
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
 from models import db, DisasterReport, Alert, UserRole, ReportStatus, DisasterSeverity
+from queries import report_query
+from pagination import InvalidCursor, count_cache, keyset_paginate, page_args
+from ingest import ingest_reports, iter_lines, iter_ndjson
+from serializers import ALERT_PLAN, json_response
+from database import WriteQueueBusy, write_queue
 
 citizen_bp = Blueprint('citizen', __name__, url_prefix='/api/citizen')
 
 
+@citizen_bp.errorhandler(WriteQueueBusy)
+def write_queue_busy(error):
+    """The write queue is backed up; the write was cancelled, so the client can safely retry"""
+    return {'error': 'Server busy, please retry shortly'}, 503, {'Retry-After': '1'}
+
+
 @citizen_bp.route('/dashboard', methods=['GET'])
 @login_required
 def dashboard():
     """Citizen dashboard - their reports and active disasters"""
-    my_reports = DisasterReport.query.filter_by(reporter_id=current_user.id).all()
-    active_reports = DisasterReport.query.filter(
+    my_reports = report_query('list').filter_by(reporter_id=current_user.id).all()
+    active_reports = report_query('list').filter(
         DisasterReport.status.in_([ReportStatus.PENDING, ReportStatus.IN_PROGRESS])
     ).limit(10).all()
     recent_alerts = Alert.query.order_by(Alert.created_at.desc()).limit(5).all()
@@ -30,18 +41,33 @@ def dashboard():
 def reports():
     """Get citizen's reports or submit new report"""
     if request.method == 'GET':
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        query = report_query('list').filter_by(reporter_id=current_user.id)
         
-        paginated = DisasterReport.query.filter_by(
-            reporter_id=current_user.id
-        ).order_by(DisasterReport.created_at.desc()).paginate(page=page, per_page=per_page)
+        if 'page' in request.args:
+            # Legacy offset pagination
+            page = request.args.get('page', 1, type=int)
+            per_page = request.args.get('per_page', 10, type=int)
+            paginated = query.order_by(DisasterReport.created_at.desc()).paginate(page=page, per_page=per_page)
+            
+            return {
+                'reports': [r.to_dict() for r in paginated.items],
+                'total': paginated.total,
+                'pages': paginated.pages,
+                'current_page': page
+            }, 200
+        
+        per_page, cursor = page_args(request)
+        try:
+            page = keyset_paginate(query, DisasterReport.created_at, DisasterReport.id, per_page, cursor)
+        except InvalidCursor as e:
+            return {'error': str(e)}, 400
         
         return {
-            'reports': [r.to_dict() for r in paginated.items],
-            'total': paginated.total,
-            'pages': paginated.pages,
-            'current_page': page
+            'reports': [r.to_dict() for r in page.items],
+            'total': count_cache.get(DisasterReport, {'reporter_id': current_user.id}, query),
+            'per_page': per_page,
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor
         }, 200
     
     else:  # POST - Submit new report
@@ -51,26 +77,62 @@ def reports():
         if not data or not all(field in data for field in required_fields):
             return {'error': 'Missing required fields'}, 400
         
-        report = DisasterReport(
-            title=data['title'],
-            description=data['description'],
-            location=data['location'],
-            latitude=data.get('latitude'),
-            longitude=data.get('longitude'),
-            severity=DisasterSeverity[data.get('severity', 'MEDIUM').upper()],
-            reporter_id=current_user.id,
-            image_url=data.get('image_url')
-        )
+        severity = DisasterSeverity[data.get('severity', 'MEDIUM').upper()]
+        reporter_id = current_user.id
         
-        db.session.add(report)
-        db.session.commit()
+        def submit(session):
+            report = DisasterReport(
+                title=data['title'],
+                description=data['description'],
+                location=data['location'],
+                latitude=data.get('latitude'),
+                longitude=data.get('longitude'),
+                severity=severity,
+                reporter_id=reporter_id,
+                image_url=data.get('image_url')
+            )
+            session.add(report)
+            session.flush()
+            return report.to_dict()
         
+        # Committed by the writer thread together with other waiting inserts (database.py)
         return {
             'message': 'Report submitted successfully',
-            'report': report.to_dict()
+            'report': write_queue.run(submit)
         }, 201
 
 
+@citizen_bp.route('/reports/bulk', methods=['POST'])
+@login_required
+def bulk_reports():
+    """Submit many reports as a JSON array or an NDJSON stream.
+
+    Rows are validated one by one and inserted in batches; the response
+    lists the new ids in input order (null for rejected rows) and the
+    errors by row index.
+    """
+    batch_size = current_app.config['BULK_INGEST_BATCH_SIZE']
+    max_rows = current_app.config['BULK_INGEST_MAX_ROWS']
+    
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = iter_ndjson(iter_lines(request.stream))
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return {'error': 'Expected a JSON array of reports or an NDJSON body'}, 400
+        if len(data) > max_rows:
+            return {'error': f'At most {max_rows} reports per request'}, 413
+        rows = enumerate(data)
+    
+    ids, errors = ingest_reports(rows, current_user.id, batch_size=batch_size, max_rows=max_rows)
+    
+    return {
+        'ids': ids,
+        'inserted': sum(1 for report_id in ids if report_id is not None),
+        'errors': errors
+    }, 201 if not errors else 207
+
+
 @citizen_bp.route('/reports/<int:report_id>', methods=['GET', 'PATCH'])
 @login_required
 def manage_report(report_id):
@@ -120,11 +182,11 @@ def report_status(report_id):
 @login_required
 def get_alerts():
     """Get alerts for citizen"""
-    recent_alerts = Alert.query.filter(
+    recent_alerts = ALERT_PLAN.all(ALERT_PLAN.select().where(
         Alert.is_broadcast == True
-    ).order_by(Alert.created_at.desc()).limit(20).all()
+    ).order_by(Alert.created_at.desc()).limit(20))
     
-    return {
-        'alerts': [a.to_dict() for a in recent_alerts],
+    return json_response({
+        'alerts': recent_alerts,
         'total': len(recent_alerts)
-    }, 200
+    })
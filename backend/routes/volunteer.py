@@ -5,6 +5,9 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime
 from models import db, User, UserRole, VolunteerTask, TaskStatus
+from queries import task_query
+from stats import volunteer_statistics
+from pagination import InvalidCursor, count_cache, keyset_paginate, page_args
 
 volunteer_bp = Blueprint('volunteer', __name__, url_prefix='/api/volunteer')
 
@@ -24,19 +27,14 @@ def volunteer_required(f):
 @login_required
 @volunteer_required
 def dashboard():
-    """Volunteer dashboard - assigned tasks"""
-    tasks = VolunteerTask.query.filter_by(volunteer_id=current_user.id).all()
-    
-    assigned = len([t for t in tasks if t.status == TaskStatus.ASSIGNED])
-    in_progress = len([t for t in tasks if t.status == TaskStatus.IN_PROGRESS])
-    completed = len([t for t in tasks if t.status == TaskStatus.COMPLETED])
+    """Volunteer dashboard - task counts and the most recently assigned tasks"""
+    recent_tasks = task_query('list').filter_by(volunteer_id=current_user.id).order_by(
+        VolunteerTask.assigned_at.desc(), VolunteerTask.id.desc()
+    ).limit(5).all()
     
     return {
-        'total_tasks': len(tasks),
-        'assigned': assigned,
-        'in_progress': in_progress,
-        'completed': completed,
-        'recent_tasks': [t.to_dict() for t in tasks[-5:]]
+        **volunteer_statistics(current_user.id),
+        'recent_tasks': [t.to_dict() for t in recent_tasks]
     }, 200
 
 
@@ -44,19 +42,30 @@ def dashboard():
 @login_required
 @volunteer_required
 def get_tasks():
-    """Get all assigned tasks"""
+    """Get assigned tasks, newest first, a cursor page at a time"""
     status = request.args.get('status')
-    
-    query = VolunteerTask.query.filter_by(volunteer_id=current_user.id)
+    filters = {'volunteer_id': current_user.id}
     
     if status:
-        query = query.filter_by(status=TaskStatus[status.upper()])
+        try:
+            filters['status'] = TaskStatus[status.upper()]
+        except KeyError:
+            return {'error': 'Invalid status'}, 400
+    
+    query = task_query('list').filter_by(**filters)
     
-    tasks = query.order_by(VolunteerTask.assigned_at.desc()).all()
+    per_page, cursor = page_args(request, default_per_page=50, max_per_page=200)
+    try:
+        page = keyset_paginate(query, VolunteerTask.assigned_at, VolunteerTask.id, per_page, cursor)
+    except InvalidCursor as e:
+        return {'error': str(e)}, 400
     
     return {
-        'tasks': [t.to_dict() for t in tasks],
-        'total': len(tasks)
+        'tasks': [t.to_dict() for t in page.items],
+        'total': count_cache.get(VolunteerTask, filters, query),
+        'per_page': per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
     }, 200
 
 
@@ -0,0 +1,442 @@
+"""
+Full-text search over disaster reports, alerts and resources
+
+Three interchangeable backends, picked per database:
+- fts5:       on SQLite, an external-content FTS5 table per model
+              (disaster_reports_fts, ...) kept in sync by triggers, ranked
+              with bm25()
+- postgresql: a GIN expression index on each table's weighted tsvector,
+              ranked with ts_rank(); the index is maintained by PostgreSQL
+- memory:     a pure-Python inverted index with BM25 ranking, for SQLite
+              builds without FTS5 or SEARCH_BACKEND=memory; kept up to
+              date from committed changes (changes.py) and reloaded after
+              SEARCH_INDEX_TTL seconds so writes from other workers show up
+
+The database indexes are created with the tables (create_all) and by the
+search_index migration for existing databases. Because they are maintained
+by the database itself, set-based writes and bulk ingestion are indexed too.
+
+A query is split into words; every word must match, as a prefix, one of the
+indexed columns, with the title weighted highest. Results from all three
+models are merged into a single ranking, best match first.
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from sqlalchemy import event, inspect, text
+import changes
+from models import db, DisasterReport, Alert, Resource, ReportStatus
+from replicas import replica_router
+
+ACTIVE_STATUSES = (ReportStatus.PENDING, ReportStatus.IN_PROGRESS)
+KINDS = ('reports', 'alerts', 'resources')
+MAX_TERMS = 8
+
+SearchHit = namedtuple('SearchHit', ['kind', 'id', 'score'])
+SearchResults = namedtuple('SearchResults', ['hits', 'total'])
+
+
+class Searchable:
+    """How one model is indexed: its text columns, first one weighted highest"""
+
+    def __init__(self, kind, model, columns, title_weight=3.0):
+        self.kind = kind
+        self.model = model
+        self.table = model.__tablename__
+        self.columns = columns
+        self.title_weight = title_weight
+        self.fts_table = f'{self.table}_fts'
+
+    def weights(self):
+        return [self.title_weight] + [1.0] * (len(self.columns) - 1)
+
+    def tsvector(self):
+        """Weighted tsvector expression; the GIN index and the queries must use this exact text"""
+        return ' || '.join(
+            f"setweight(to_tsvector('english', coalesce({column}, '')), '{'A' if n == 0 else 'B'}')"
+            for n, column in enumerate(self.columns)
+        )
+
+
+SEARCHABLES = {
+    'reports': Searchable('reports', DisasterReport, ['title', 'description', 'location']),
+    'alerts': Searchable('alerts', Alert, ['title', 'message']),
+    'resources': Searchable('resources', Resource, ['name', 'resource_type']),
+}
+
+
+def words(value):
+    """Lower-cased words of a text value"""
+    return re.findall(r'\w+', value.lower()) if value else []
+
+
+def query_terms(q):
+    """Words of a search string, at most MAX_TERMS"""
+    return words(q)[:MAX_TERMS]
+
+
+def parse_kinds(value):
+    """Model kinds from a comma separated `type` argument; all when empty"""
+    if not value:
+        return KINDS
+    kinds = tuple(k.strip().lower() for k in value.split(',') if k.strip())
+    unknown = [k for k in kinds if k not in SEARCHABLES]
+    if unknown:
+        raise ValueError(f"Unknown search type: {', '.join(unknown)}")
+    return kinds
+
+
+# --- schema --------------------------------------------------------------
+
+def fts5_available(conn):
+    return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def _fts5_schema(searchable):
+    table, fts, columns = searchable.table, searchable.fts_table, searchable.columns
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    insert = f'INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});'
+    delete = f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column_list}, content='{table}', "
+        f"content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN {delete} {insert} END',
+    ]
+
+
+def create_schema(conn, rebuild=False):
+    """Create the text indexes for conn's dialect if they do not exist.
+
+    With `rebuild` the FTS5 tables are refilled from their content tables
+    (for databases that had rows before the index existed). On PostgreSQL
+    the GIN indexes are built CONCURRENTLY when conn is in autocommit mode.
+    """
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        if not fts5_available(conn):
+            return
+        for searchable in SEARCHABLES.values():
+            for statement in _fts5_schema(searchable):
+                conn.execute(text(statement))
+            if rebuild:
+                conn.execute(text(f"INSERT INTO {searchable.fts_table}({searchable.fts_table}) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        from migrations import create_index
+        concurrent = conn.get_isolation_level() == 'AUTOCOMMIT'
+        for searchable in SEARCHABLES.values():
+            name = f'ix_{searchable.table}_search'
+            if concurrent:
+                create_index(conn, name, searchable.table, [f'({searchable.tsvector()})'], using='GIN')
+            else:
+                conn.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON {searchable.table} USING GIN (({searchable.tsvector()}))'
+                ))
+
+
+def drop_schema(conn):
+    if conn.dialect.name == 'sqlite':
+        for searchable in SEARCHABLES.values():
+            conn.execute(text(f'DROP TABLE IF EXISTS {searchable.fts_table}'))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _after_create(metadata, conn, **kw):
+    create_schema(conn, rebuild=True)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _before_drop(metadata, conn, **kw):
+    drop_schema(conn)
+
+
+# --- database backends ---------------------------------------------------
+
+def _fts5_select(searchable, active_only):
+    fts = searchable.fts_table
+    weights = ', '.join(str(w) for w in searchable.weights())
+    join = ''
+    if active_only:
+        join = f' JOIN {searchable.table} t ON t.id = f.rowid AND t.status IN (:active_0, :active_1)'
+    return (
+        f"SELECT '{searchable.kind}' AS kind, f.rowid AS id, -bm25({fts}, {weights}) AS score "
+        f'FROM {fts} f{join} WHERE {fts} MATCH :query'
+    )
+
+
+def _fts5_query(terms):
+    # each word quoted so FTS5 operators in user input are taken literally
+    return ' '.join('"%s"*' % term.replace('"', '') for term in terms)
+
+
+def _postgresql_select(searchable, active_only):
+    vector = searchable.tsvector()
+    status = ' AND t.status IN (:active_0, :active_1)' if active_only else ''
+    return (
+        f"SELECT '{searchable.kind}' AS kind, t.id AS id, ts_rank({vector}, q) AS score "
+        f"FROM {searchable.table} t, to_tsquery('english', :query) q WHERE {vector} @@ q{status}"
+    )
+
+
+def _postgresql_query(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+class DatabaseBackend:
+    """Searches the database's own text indexes (FTS5 or tsvector/GIN)"""
+
+    def __init__(self, name, select, build_query):
+        self.name = name
+        self._select = select
+        self._build_query = build_query
+
+    def search(self, terms, kinds, active_only, limit, offset):
+        selects = [
+            self._select(SEARCHABLES[kind], active_only and kind == 'reports')
+            for kind in kinds
+        ]
+        union = ' UNION ALL '.join(selects)
+        params = {'query': self._build_query(terms), 'limit': limit, 'offset': offset}
+        params.update({f'active_{n}': status.name for n, status in enumerate(ACTIVE_STATUSES)})
+
+        rows = db.session.execute(text(
+            f'SELECT kind, id, score FROM ({union}) AS matches ORDER BY score DESC, kind, id LIMIT :limit OFFSET :offset'
+        ), params).all()
+        total = db.session.execute(text(f'SELECT count(*) FROM ({union}) AS matches'), params).scalar()
+        return SearchResults([SearchHit(kind, row_id, score) for kind, row_id, score in rows], total)
+
+
+# --- pure-Python fallback ------------------------------------------------
+
+class InvertedIndex:
+    """term -> {(kind, id): weighted term frequency}, ranked with BM25"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, ttl=300):
+        self.name = 'memory'
+        self.ttl = ttl
+        self._postings = None
+        self._lengths = {}
+        self._terms = {}
+        self._active = set()
+        self._vocabulary = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def _ensure_loaded(self):
+        if self._postings is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        self._postings, self._lengths, self._terms, self._active = {}, {}, {}, set()
+        self._vocabulary = None
+        for searchable in SEARCHABLES.values():
+            model = searchable.model
+            columns = [getattr(model, c) for c in searchable.columns]
+            if model is DisasterReport:
+                columns.append(DisasterReport.status)
+            with replica_router.primary():
+                rows = db.session.query(model.id, *columns).all()
+            for row in rows:
+                self._add(searchable, dict(zip(['id'] + searchable.columns + ['status'], row)))
+        self._loaded_at = time.monotonic()
+
+    def _add(self, searchable, values):
+        key = (searchable.kind, values['id'])
+        frequencies = {}
+        length = 0
+        for column, weight in zip(searchable.columns, searchable.weights()):
+            column_words = words(values.get(column))
+            length += len(column_words)
+            for word in column_words:
+                frequencies[word] = frequencies.get(word, 0) + weight
+        for word, frequency in frequencies.items():
+            postings = self._postings.setdefault(word, {})
+            if not postings:
+                self._vocabulary = None
+            postings[key] = frequency
+        self._lengths[key] = length
+        self._terms[key] = list(frequencies)
+        if searchable.kind == 'reports' and values.get('status') in ACTIVE_STATUSES:
+            self._active.add(values['id'])
+
+    def _remove(self, kind, row_id):
+        key = (kind, row_id)
+        for word in self._terms.pop(key, ()):
+            postings = self._postings.get(word, {})
+            postings.pop(key, None)
+            if not postings:
+                self._postings.pop(word, None)
+                self._vocabulary = None
+        self._lengths.pop(key, None)
+        if kind == 'reports':
+            self._active.discard(row_id)
+
+    def apply_changes(self, committed):
+        with self._lock:
+            if self._postings is None:
+                return
+            for change in committed:
+                searchable = next((s for s in SEARCHABLES.values() if s.model is change.model), None)
+                if searchable is None:
+                    continue
+                if change.kind == 'bulk':
+                    self._postings = None
+                    return
+                watched = set(searchable.columns)
+                if change.model is DisasterReport:
+                    watched.add('status')
+                if change.kind == 'update' and not watched & set(change.previous):
+                    continue
+
+                values = change.values
+                if 'id' not in values:
+                    continue
+                self._remove(searchable.kind, values['id'])
+                if change.kind == 'delete':
+                    continue
+                if not watched <= set(values):
+                    # state not fully known; reload on next query
+                    self._postings = None
+                    return
+                self._add(searchable, values)
+
+    def _expand(self, term):
+        """Indexed words starting with term"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect_left(self._vocabulary, term)
+        words = []
+        for word in self._vocabulary[start:]:
+            if not word.startswith(term):
+                break
+            words.append(word)
+        return words
+
+    def search(self, terms, kinds, active_only, limit, offset):
+        with self._lock:
+            self._ensure_loaded()
+            count = len(self._lengths) or 1
+            average = sum(self._lengths.values()) / count or 1.0
+            scores = None
+            for term in terms:
+                matched = {}
+                for word in self._expand(term):
+                    postings = self._postings[word]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, frequency in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self._lengths[key] / average)
+                        matched[key] = matched.get(key, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+                if scores is None:
+                    scores = matched
+                else:
+                    scores = {key: score + matched[key] for key, score in scores.items() if key in matched}
+                if not scores:
+                    break
+            hits = [
+                SearchHit(kind, row_id, score)
+                for (kind, row_id), score in (scores or {}).items()
+                if kind in kinds and not (active_only and kind == 'reports' and row_id not in self._active)
+            ]
+        hits.sort(key=lambda hit: (-hit.score, hit.kind, hit.id))
+        return SearchResults(hits[offset:offset + limit], len(hits))
+
+
+# --- entry point ---------------------------------------------------------
+
+class SearchIndex:
+    """Picks a backend per database and answers ranked, paginated searches"""
+
+    def __init__(self, backend='auto', ttl=300):
+        self.backend_name = backend
+        self.memory = InvertedIndex(ttl)
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.backend_name = app.config.get('SEARCH_BACKEND', self.backend_name)
+        self.memory.ttl = app.config.get('SEARCH_INDEX_TTL', self.memory.ttl)
+        self.memory.invalidate()
+        with self._lock:
+            self._backends = {}
+        changes.on_commit(self.memory.apply_changes)
+
+    def backend(self):
+        engine = db.engine
+        key = str(engine.url)
+        with self._lock:
+            backend = self._backends.get(key)
+        if backend is None:
+            backend = self._detect(engine)
+            with self._lock:
+                self._backends[key] = backend
+        return backend
+
+    def _detect(self, engine):
+        if self.backend_name == 'memory':
+            return self.memory
+        if engine.dialect.name == 'postgresql':
+            return DatabaseBackend('postgresql', _postgresql_select, _postgresql_query)
+        if engine.dialect.name == 'sqlite':
+            tables = inspect(engine).get_table_names()
+            if all(s.fts_table in tables for s in SEARCHABLES.values()):
+                return DatabaseBackend('fts5', _fts5_select, _fts5_query)
+        return self.memory
+
+    def search(self, q, kinds=KINDS, active_only=False, page=1, per_page=20):
+        """SearchResults for one page of matches, best first; empty for a blank query"""
+        terms = query_terms(q)
+        if not terms or not kinds:
+            return SearchResults([], 0)
+        page = max(page, 1)
+        return self.backend().search(terms, kinds, active_only, per_page, (page - 1) * per_page)
+
+
+search_index = SearchIndex()
+
+
+def search_args(request, default_per_page=20, max_per_page=100):
+    """(q, page, per_page) from the request query string"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = request.args.get('per_page', default_per_page, type=int)
+    return request.args.get('q', '').strip(), page, max(1, min(per_page, max_per_page))
+
+
+def search_response(results, page, per_page, report_query):
+    """JSON body for one page of search results"""
+    return {
+        'results': serialize_hits(results.hits, report_query),
+        'total': results.total,
+        'page': page,
+        'per_page': per_page,
+        'pages': math.ceil(results.total / per_page),
+    }
+
+
+def serialize_hits(hits, report_query):
+    """Hits as {'type', 'id', 'score', 'item'} dicts in rank order, one query per model.
+
+    Rows deleted since the search are left out.
+    """
+    queries = {'reports': report_query, 'alerts': Alert.query, 'resources': Resource.query}
+    rows = {}
+    for kind in KINDS:
+        ids = [hit.id for hit in hits if hit.kind == kind]
+        if ids:
+            model = SEARCHABLES[kind].model
+            rows[kind] = {row.id: row for row in queries[kind].filter(model.id.in_(ids))}
+    return [
+        {'type': hit.kind, 'id': hit.id, 'score': round(hit.score, 6), 'item': rows[hit.kind][hit.id].to_dict()}
+        for hit in hits
+        if hit.id in rows.get(hit.kind, {})
+    ]
@@ -0,0 +1,149 @@
+"""
+Row-tuple serialization for list endpoints
+
+`to_dict()` needs a fully hydrated ORM object per row (identity map,
+attribute instrumentation, lazy reporter loads) and then rebuilds a dict
+with an .isoformat() per datetime and a .value per enum; the result goes
+through the stdlib json encoder. For long listings that dominates the
+request.
+
+A RowPlan selects only the columns a model's to_dict() shape needs, as
+plain row tuples, and turns each row into that dict with a function
+built once per plan. Enum columns are read as their stored names and
+mapped to values with a dict lookup; datetimes are left to the encoder.
+Nested objects (a report's reporter) come from an outer join in the same
+statement.
+
+`json_response` encodes with orjson when it is installed and answers with
+the pre-encoded bytes. The output is byte-for-byte what Flask's default
+provider produces for the to_dict() version of the same data (sorted keys,
+compact separators, ASCII escapes, trailing newline); bodies containing
+non-ASCII text are re-encoded with the stdlib so escapes match too.
+"""
+import json
+from datetime import date
+from flask import Response, current_app
+from sqlalchemy import Enum, String, select, type_coerce
+from sqlalchemy.orm import aliased
+from models import db, User, DisasterReport, Alert, Resource
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _stdlib_dumps(data):
+    return (json.dumps(data, ensure_ascii=True, sort_keys=True, separators=(',', ':'), default=_default) + '\n').encode()
+
+
+def dumps(data):
+    """Compact JSON bytes with sorted keys and ASCII escapes, as Flask encodes responses"""
+    if orjson is not None:
+        body = orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+        if body.isascii():
+            return body
+    return _stdlib_dumps(data)
+
+
+class EncodedJSONResponse(Response):
+    """Response whose body is already-encoded JSON bytes"""
+    default_mimetype = 'application/json'
+
+
+def json_response(data, status=200):
+    """Encode `data` with the fast encoder; falls back to Flask's provider when it pretty-prints"""
+    provider = current_app.json
+    if provider.compact is False or (provider.compact is None and current_app.debug):
+        body = provider.dumps(data, default=_default, indent=2) + '\n'
+        return current_app.response_class(body, status, mimetype='application/json')
+    return EncodedJSONResponse(dumps(data), status)
+
+
+class RowPlan:
+    """Columns of a model to select and the compiled row -> dict function.
+
+    `fields` lists column attribute names in to_dict() order, or
+    (key, plan, foreign_key_column) for an object nested through a
+    many-to-one; it is outer-joined and serialized as None when missing.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self._compiled = None
+
+    def _layout(self, entity, columns, joins):
+        """Row -> dict function for one row, appending to columns/joins"""
+        fields = []  # (key, row index, {stored name: value} for enums, else None)
+        nested = []  # (key, row index of the joined id, row -> dict function)
+        for field in self.fields:
+            if isinstance(field, tuple):
+                key, plan, foreign_key = field
+                target = aliased(plan.model)
+                joins.append((target, getattr(target, 'id') == getattr(entity, foreign_key.key)))
+                marker = len(columns)
+                columns.append(target.id)
+                nested.append((key, marker, plan._layout(target, columns, joins)))
+                continue
+
+            column = getattr(entity, field)
+            index = len(columns)
+            if isinstance(column.type, Enum):
+                columns.append(type_coerce(column, String))
+                fields.append((field, index, {None: None, **{m.name: m.value for m in column.type.enum_class}}))
+            else:
+                columns.append(column)
+                fields.append((field, index, None))
+
+        def build(row):
+            data = {key: row[index] if values is None else values[row[index]] for key, index, values in fields}
+            for key, marker, build_nested in nested:
+                data[key] = None if row[marker] is None else build_nested(row)
+            return data
+
+        return build
+
+    def _compile(self):
+        if self._compiled is None:
+            columns, joins = [], []
+            build = self._layout(self.model, columns, joins)
+            self._compiled = (columns, joins, build)
+        return self._compiled
+
+    def select(self):
+        """select() of the plan's columns with its joins; add filters and ordering"""
+        columns, joins, _ = self._compile()
+        statement = select(*columns).select_from(self.model)
+        for target, onclause in joins:
+            statement = statement.outerjoin(target, onclause)
+        return statement
+
+    def all(self, statement):
+        """Serialized rows of a statement built from select()"""
+        build = self._compile()[2]
+        return [build(row) for row in db.session.execute(statement)]
+
+
+USER_PLAN = RowPlan(User, ['id', 'name', 'email', 'phone', 'location', 'role', 'is_active', 'created_at'])
+REPORT_PLAN = RowPlan(DisasterReport, [
+    'id', 'title', 'description', 'location', 'latitude', 'longitude', 'severity', 'status',
+    ('reporter', USER_PLAN, DisasterReport.reporter_id),
+    'image_url', 'cluster_id', 'created_at', 'updated_at', 'resolved_at',
+])
+ALERT_PLAN = RowPlan(Alert, [
+    'id', 'title', 'message', 'alert_level', 'report_id', 'target_role', 'is_broadcast', 'created_at',
+])
+RESOURCE_PLAN = RowPlan(Resource, [
+    'id', 'name', 'resource_type', 'quantity', 'unit', 'location', 'availability',
+    'contact_person', 'contact_phone', 'created_at', 'updated_at',
+])
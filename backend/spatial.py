@@ -0,0 +1,218 @@
+"""
+Spatial lookups for disaster reports
+
+Two indexes answer "what is happening near here":
+- the geohash column on disaster_reports (B-tree), queried as key ranges
+  for the geohash cells covering the search area; used for any status
+- ActiveReportGrid, an in-memory map of geohash cell -> active report
+  coordinates, kept up to date from committed report changes and rebuilt
+  after SPATIAL_GRID_TTL seconds so writes from other workers show up
+
+Either way candidates come from whole cells and are then filtered with
+exact haversine distances (or the exact box), so only rows that are really
+inside the area are loaded and serialized.
+"""
+import threading
+import time
+from sqlalchemy import and_, or_
+import changes
+import geo
+from models import db, DisasterReport, ReportStatus
+from replicas import replica_router
+
+ACTIVE_STATUSES = (ReportStatus.PENDING, ReportStatus.IN_PROGRESS)
+GRID_PRECISION = 5  # ~4.9 km x 4.9 km cells
+
+
+class ActiveReportGrid:
+    """Geohash cell -> {report_id: (latitude, longitude)} for active reports"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._cells = None
+        self._locations = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SPATIAL_GRID_TTL', self.ttl)
+        self.invalidate()
+        changes.on_commit(self.apply_changes)
+
+    def invalidate(self):
+        with self._lock:
+            self._cells = None
+            self._locations = {}
+
+    def _ensure_loaded(self):
+        if self._cells is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with replica_router.primary():
+            rows = db.session.query(
+                DisasterReport.id, DisasterReport.latitude, DisasterReport.longitude
+            ).filter(
+                DisasterReport.status.in_(ACTIVE_STATUSES),
+                DisasterReport.geohash.isnot(None)
+            ).all()
+        self._cells, self._locations = {}, {}
+        for report_id, latitude, longitude in rows:
+            self._add(report_id, latitude, longitude)
+        self._loaded_at = time.monotonic()
+
+    def _add(self, report_id, latitude, longitude):
+        cell = geo.encode(latitude, longitude, GRID_PRECISION)
+        self._cells.setdefault(cell, {})[report_id] = (latitude, longitude)
+        self._locations[report_id] = cell
+
+    def _remove(self, report_id):
+        cell = self._locations.pop(report_id, None)
+        if cell is not None:
+            members = self._cells.get(cell, {})
+            members.pop(report_id, None)
+            if not members:
+                self._cells.pop(cell, None)
+
+    def apply_changes(self, committed):
+        with self._lock:
+            if self._cells is None:
+                return
+            for change in committed:
+                if change.model is not DisasterReport:
+                    continue
+                if change.kind == 'bulk':
+                    self._cells = None
+                    self._locations = {}
+                    return
+                if change.kind == 'update' and not {'status', 'latitude', 'longitude'} & set(change.previous):
+                    continue
+
+                values = change.values
+                if 'id' not in values:
+                    continue
+                self._remove(values['id'])
+                if change.kind == 'delete':
+                    continue
+                if not {'status', 'latitude', 'longitude'} <= set(values):
+                    # state not fully known; rebuild on next query
+                    self._cells = None
+                    self._locations = {}
+                    return
+                if values['status'] in ACTIVE_STATUSES and geo.valid_coordinates(values['latitude'], values['longitude']):
+                    self._add(values['id'], values['latitude'], values['longitude'])
+
+    def candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """[(report_id, latitude, longitude)] in the cells covering a box"""
+        cells = geo.covering_cells(min_lat, min_lon, max_lat, max_lon, max_precision=GRID_PRECISION)
+        with self._lock:
+            self._ensure_loaded()
+            if cells and len(cells[0]) == GRID_PRECISION:
+                groups = [self._cells.get(cell, {}) for cell in cells]
+            else:
+                prefixes = tuple(cells)
+                groups = [members for cell, members in self._cells.items() if cell.startswith(prefixes)]
+            return [(report_id, lat, lon) for members in groups for report_id, (lat, lon) in members.items()]
+
+
+active_grid = ActiveReportGrid()
+
+
+def geohash_ranges(cells):
+    """OR of key-range predicates, one per covering cell"""
+    clauses = []
+    for cell in cells:
+        upper = geo.prefix_upper_bound(cell)
+        if upper is None:
+            clauses.append(DisasterReport.geohash >= cell)
+        else:
+            clauses.append(and_(DisasterReport.geohash >= cell, DisasterReport.geohash < upper))
+    return or_(*clauses)
+
+
+def _indexed_candidates(min_lat, min_lon, max_lat, max_lon, statuses=None):
+    cells = geo.covering_cells(min_lat, min_lon, max_lat, max_lon)
+    query = db.session.query(
+        DisasterReport.id, DisasterReport.latitude, DisasterReport.longitude
+    ).filter(geohash_ranges(cells))
+    if statuses:
+        query = query.filter(DisasterReport.status.in_(statuses))
+    return query.all()
+
+
+def _candidates(box, active_only, statuses):
+    if active_only:
+        return active_grid.candidates(*box)
+    return _indexed_candidates(*box, statuses=statuses)
+
+
+def reports_near(latitude, longitude, radius_km, active_only=True, statuses=None, limit=100):
+    """[(report_id, distance_km)] within radius_km, nearest first"""
+    candidates = _candidates(geo.radius_bbox(latitude, longitude, radius_km), active_only, statuses)
+    if not candidates:
+        return []
+
+    ids, lats, lons = zip(*candidates)
+    distances = geo.haversine_km(latitude, longitude, lats, lons)
+    hits = sorted(
+        (distance, report_id) for report_id, distance in zip(ids, distances) if distance <= radius_km
+    )
+    return [(report_id, distance) for distance, report_id in hits[:limit]]
+
+
+def reports_in_bbox(min_lat, min_lon, max_lat, max_lon, active_only=True, statuses=None, limit=500):
+    """Report ids inside a bounding box, newest first"""
+    candidates = _candidates((min_lat, min_lon, max_lat, max_lon), active_only, statuses)
+    hits = [
+        report_id for report_id, lat, lon in candidates
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+    ]
+    return sorted(hits, reverse=True)[:limit]
+
+
+def parse_area_args(args, max_radius_km=500):
+    """Validated ('near', lat, lon, radius_km) or ('bbox', min_lat, min_lon, max_lat, max_lon).
+
+    Raises ValueError with a client-facing message.
+    """
+    if 'lat' in args or 'lon' in args:
+        latitude = args.get('lat', type=float)
+        longitude = args.get('lon', type=float)
+        radius_km = args.get('radius_km', 10.0, type=float)
+        if not geo.valid_coordinates(latitude, longitude):
+            raise ValueError('lat and lon must be valid coordinates')
+        if not 0 < radius_km <= max_radius_km:
+            raise ValueError(f'radius_km must be between 0 and {max_radius_km}')
+        return ('near', latitude, longitude, radius_km)
+
+    box = [args.get(name, type=float) for name in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+    if None in box or not geo.valid_coordinates(box[0], box[1]) or not geo.valid_coordinates(box[2], box[3]):
+        raise ValueError('Provide lat/lon/radius_km or min_lat/min_lon/max_lat/max_lon')
+    if box[0] > box[2] or box[1] > box[3]:
+        raise ValueError('Bounding box minimums must not exceed maximums')
+    return ('bbox', *box)
+
+
+def search_area(area, active_only=True, statuses=None, limit=100):
+    """[(report_id, distance_km or None)] for a parsed area"""
+    if area[0] == 'near':
+        return reports_near(*area[1:], active_only=active_only, statuses=statuses, limit=limit)
+    return [(report_id, None) for report_id in
+            reports_in_bbox(*area[1:], active_only=active_only, statuses=statuses, limit=limit)]
+
+
+def serialize_hits(hits, query):
+    """to_dict() of the hit reports in hit order, with distance_km when known"""
+    if not hits:
+        return []
+    distances = dict(hits)
+    reports = {r.id: r for r in query.filter(DisasterReport.id.in_(distances)).all()}
+    results = []
+    for report_id, distance in hits:
+        report = reports.get(report_id)
+        if report is None:
+            continue
+        data = report.to_dict()
+        if distance is not None:
+            data['distance_km'] = round(distance, 3)
+        results.append(data)
+    return results
+
@@ -0,0 +1,50 @@
+"""
+Startup settings and timing for serverless and long-running deployments
+
+On serverless platforms (Vercel sets VERCEL=1, or SERVERLESS=1) every cold
+start pays for importing and building the app, so the defaults change:
+- no Socket.IO: flask_socketio/engineio (and eventlet, when installed) are
+  never imported; set ENABLE_SOCKETIO=1 to keep it
+- no per-request database initialization: run `flask db init` as a deploy
+  step instead; set AUTO_INIT_DB=1 to keep it
+- no file logging: the deployment filesystem is read-only; errors go to
+  the platform's log stream
+
+STARTUP_TIMING=1 logs how long each phase of create_app took.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def env_flag(name, default):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def is_serverless():
+    return env_flag('SERVERLESS', bool(os.getenv('VERCEL')))
+
+
+class PhaseTimer:
+    """Wall-clock duration of named startup phases, in order"""
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self):
+        """Human-readable breakdown, one phase per line"""
+        total = sum(duration for _, duration in self.phases)
+        lines = [f'{name:<24} {duration * 1000:8.1f} ms' for name, duration in self.phases]
+        lines.append(f"{'total':<24} {total * 1000:8.1f} ms")
+        return '\n'.join(lines)
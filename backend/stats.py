@@ -0,0 +1,243 @@
+"""
+Aggregate statistics with a process-local counter cache
+
+Each table is counted with a single grouped query (reports by status,
+resources by availability, users by role). The grouped counts are kept in
+memory and adjusted in place as report, resource and user writes commit;
+set-based writes or writes whose old value is unknown drop that table's
+counters instead. The TTL bounds how long a worker can drift from writes
+made by other workers.
+
+Volunteer dashboards use the same approach per volunteer: one grouped
+count of that volunteer's tasks by status, cached and adjusted as task
+assignments and state transitions commit.
+"""
+import threading
+import time
+from sqlalchemy import func
+import changes
+from models import db, User, DisasterReport, Resource, VolunteerTask, ReportStatus, TaskStatus, UserRole
+from replicas import replica_router
+
+# table name -> (model, grouping column attribute)
+GROUPINGS = {
+    'reports': (DisasterReport, 'status'),
+    'resources': (Resource, 'availability'),
+    'users': (User, 'role'),
+}
+_TABLE_FOR_MODEL = {model: table for table, (model, _) in GROUPINGS.items()}
+
+ACTIVE_REPORT_STATUSES = (ReportStatus.PENDING, ReportStatus.IN_PROGRESS)
+
+
+def _group_key(value):
+    return getattr(value, 'value', value)
+
+
+class StatsCache:
+    """Grouped row counts per table, refreshed after `ttl` seconds"""
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._counts = {}
+        self._loaded_at = {}
+        self._generation = 0  # bumped by every invalidation and applied commit
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('STATS_CACHE_TTL', self.ttl)
+        self.invalidate()
+        changes.on_commit(self.apply_changes)
+
+    def counts(self, table):
+        """Return {group value: row count} for one of GROUPINGS"""
+        with self._lock:
+            loaded_at = self._loaded_at.get(table)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+                return dict(self._counts[table])
+            generation = self._generation
+
+        model, column_name = GROUPINGS[table]
+        column = getattr(model, column_name)
+        with replica_router.primary():
+            rows = db.session.query(column, func.count()).group_by(column).all()
+        counts = {_group_key(value): count for value, count in rows}
+
+        with self._lock:
+            # a commit applied while counting may or may not be in the rows; don't cache them
+            if generation == self._generation:
+                self._counts[table] = counts
+                self._loaded_at[table] = time.monotonic()
+        return dict(counts)
+
+    def invalidate(self, table=None):
+        with self._lock:
+            self._generation += 1
+            tables = [table] if table else list(GROUPINGS)
+            for name in tables:
+                self._counts.pop(name, None)
+                self._loaded_at.pop(name, None)
+
+    def apply_changes(self, committed):
+        """Adjust cached counters for committed changes"""
+        with self._lock:
+            for change in committed:
+                table = _TABLE_FOR_MODEL.get(change.model)
+                if table is None:
+                    continue
+                self._generation += 1
+                if table not in self._counts:
+                    continue
+                if not self._apply(self._counts[table], GROUPINGS[table][1], change):
+                    self._counts.pop(table, None)
+                    self._loaded_at.pop(table, None)
+
+    @staticmethod
+    def _apply(counts, column_name, change):
+        """Apply one change in place; False when the counters can't be adjusted"""
+        if change.kind == 'insert' and column_name in change.values:
+            key = _group_key(change.values[column_name])
+            counts[key] = counts.get(key, 0) + 1
+            return True
+        if change.kind == 'delete' and column_name in change.values:
+            key = _group_key(change.values[column_name])
+            counts[key] = counts.get(key, 0) - 1
+            return True
+        if change.kind == 'update':
+            if column_name not in change.previous:
+                return True
+            previous = change.previous[column_name]
+            if previous is changes.UNKNOWN or column_name not in change.values:
+                return False
+            old_key, new_key = _group_key(previous), _group_key(change.values[column_name])
+            counts[old_key] = counts.get(old_key, 0) - 1
+            counts[new_key] = counts.get(new_key, 0) + 1
+            return True
+        return False
+
+
+stats_cache = StatsCache()
+
+
+class VolunteerTaskCounts:
+    """Task counts by status per volunteer, refreshed after `ttl` seconds.
+
+    At most `max_entries` volunteers are kept; the least recently loaded
+    are dropped first. A ttl of 0 disables caching.
+    """
+
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counts = {}
+        self._generation = 0  # bumped by every invalidation and applied task commit
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('VOLUNTEER_SUMMARY_TTL', self.ttl)
+        self.invalidate()
+        changes.on_commit(self.apply_changes)
+
+    def counts(self, volunteer_id):
+        """Return {task status value: count} for one volunteer"""
+        with self._lock:
+            cached = self._counts.get(volunteer_id)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                return dict(cached[0])
+            generation = self._generation
+
+        with replica_router.primary():
+            rows = db.session.query(VolunteerTask.status, func.count()).filter(
+                VolunteerTask.volunteer_id == volunteer_id
+            ).group_by(VolunteerTask.status).all()
+        counts = {_group_key(status): count for status, count in rows}
+
+        if self.ttl:
+            with self._lock:
+                if generation != self._generation:
+                    # a task commit was applied while counting; don't cache what may predate it
+                    return dict(counts)
+                self._counts.pop(volunteer_id, None)
+                self._counts[volunteer_id] = (counts, time.monotonic())
+                while len(self._counts) > self.max_entries:
+                    del self._counts[next(iter(self._counts))]
+        return dict(counts)
+
+    def invalidate(self, volunteer_id=None):
+        with self._lock:
+            self._generation += 1
+            if volunteer_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(volunteer_id, None)
+
+    def apply_changes(self, committed):
+        """Adjust cached counters for committed task changes"""
+        with self._lock:
+            for change in committed:
+                if change.model is not VolunteerTask:
+                    continue
+                self._generation += 1
+                if not self._counts:
+                    continue
+                if change.kind == 'bulk':
+                    self._counts.clear()
+                    continue
+
+                volunteer_id = change.values.get('volunteer_id')
+                previous_volunteer = change.previous.get('volunteer_id', volunteer_id)
+                if previous_volunteer != volunteer_id:
+                    # reassigned: recount both volunteers
+                    self._counts.pop(volunteer_id, None)
+                    self._counts.pop(previous_volunteer, None)
+                    continue
+                cached = self._counts.get(volunteer_id)
+                if cached is not None and not StatsCache._apply(cached[0], 'status', change):
+                    del self._counts[volunteer_id]
+
+
+volunteer_task_counts = VolunteerTaskCounts()
+
+
+def public_statistics():
+    """Statistics shown on the public homepage"""
+    reports = stats_cache.counts('reports')
+    resources = stats_cache.counts('resources')
+
+    return {
+        'disaster_stats': {
+            'total_reports': sum(reports.values()),
+            'active_reports': sum(reports.get(s.value, 0) for s in ACTIVE_REPORT_STATUSES),
+            'resolved_reports': reports.get(ReportStatus.RESOLVED.value, 0)
+        },
+        'resource_stats': {
+            'total': sum(resources.values()),
+            'available': resources.get('available', 0)
+        }
+    }
+
+
+def dashboard_statistics():
+    """Statistics shown on the admin dashboard"""
+    reports = stats_cache.counts('reports')
+    users = stats_cache.counts('users')
+    resources = stats_cache.counts('resources')
+
+    return {
+        'total_reports': sum(reports.values()),
+        'pending_reports': reports.get(ReportStatus.PENDING.value, 0),
+        'active_volunteers': users.get(UserRole.VOLUNTEER.value, 0),
+        'total_resources': sum(resources.values())
+    }
+
+
+def volunteer_statistics(volunteer_id):
+    """Task counts shown on a volunteer's dashboard"""
+    counts = volunteer_task_counts.counts(volunteer_id)
+
+    return {
+        'total_tasks': sum(counts.values()),
+        'assigned': counts.get(TaskStatus.ASSIGNED.value, 0),
+        'in_progress': counts.get(TaskStatus.IN_PROGRESS.value, 0),
+        'completed': counts.get(TaskStatus.COMPLETED.value, 0)
+    }
@@ -0,0 +1,138 @@
+"""
+Alert email throughput against a local SMTP stub.
+
+An in-process app is built against a throwaway SQLite database holding
+RECIPIENTS citizens, and a minimal SMTP server is started on localhost
+that accepts every message and waits DELAY_MS before each reply (a stand-in
+for the round trip to a real relay). One broadcast alert is created; the
+time that commit takes is what the admin request waits for. Its emails are
+then sent:
+- one SMTP connection per email, one email at a time (what sending from
+  the request would do)
+- the outbox worker over 1 and CONNECTIONS pooled connections
+
+    python benchmarks/alert_email.py
+    RECIPIENTS=5000 DELAY_MS=5 CONNECTIONS=8 python benchmarks/alert_email.py
+"""
+import os
+import smtplib
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+RECIPIENTS = int(os.environ.get('RECIPIENTS', 2000))
+DELAY_MS = float(os.environ.get('DELAY_MS', 1))
+CONNECTIONS = int(os.environ.get('CONNECTIONS', 4))
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 200))
+NAIVE_LIMIT = int(os.environ.get('NAIVE_LIMIT', 300))  # emails sent one connection each
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: every command succeeds, messages are counted"""
+
+    def reply(self, line):
+        time.sleep(DELAY_MS / 1000)
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        self.reply(b'220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply(b'250-stub\r\n250 8BITMIME')
+            elif command == b'DATA':
+                self.reply(b'354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply(b'250 queued')
+            elif command == b'QUIT':
+                self.reply(b'221 bye')
+                return
+            else:
+                self.reply(b'250 OK')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.lock = threading.Lock()
+        self.received = 0
+
+
+def main():
+    stub = SMTPStub()
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    host, port = stub.server_address
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", PASSWORD_HASH_WORKERS='0',
+            MAIL_SERVER=host, MAIL_PORT=str(port), MAIL_USE_TLS='0', MAIL_USE_SSL='0', MAIL_USERNAME='',
+            ALERT_EMAIL_ENABLED='1', ALERT_EMAIL_WORKER='0', ALERT_EMAIL_BATCH_SIZE=str(BATCH_SIZE)
+        )
+        from app import create_app
+        from alert_email import alert_mailer, render
+        from models import db, Alert, AlertDelivery, DeliveryStatus, User, UserRole
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(
+                User(name=f'User {n}', email=f'user{n}@example.com', password_hash='x', role=UserRole.CITIZEN)
+                for n in range(RECIPIENTS)
+            )
+            db.session.commit()
+
+            started = time.perf_counter()
+            alert = Alert(title='Flood warning', message='Move to higher ground now.', alert_level='critical',
+                          is_broadcast=True)
+            db.session.add(alert)
+            db.session.commit()
+            enqueue = time.perf_counter() - started
+            queued = AlertDelivery.query.count()
+            print(f'{RECIPIENTS} recipients, {DELAY_MS:g} ms per SMTP reply')
+            print(f'alert commit with {queued} emails queued: {enqueue * 1000:.1f} ms')
+            print(f"{'variant':>34} {'emails':>7} {'seconds':>8} {'emails/s':>9}")
+
+            emails = [row.email for row in AlertDelivery.query.limit(NAIVE_LIMIT)]
+            started = time.perf_counter()
+            for email in emails:
+                with smtplib.SMTP(host, port) as connection:
+                    connection.sendmail(alert_mailer.sender, [email], render(alert, alert_mailer.sender, email).as_bytes())
+            elapsed = time.perf_counter() - started
+            print(f"{'connection per email':>34} {len(emails):>7} {elapsed:>8.2f} {len(emails) / elapsed:>9.0f}")
+
+            for connections in sorted({1, CONNECTIONS}):
+                AlertDelivery.query.update({
+                    AlertDelivery.status: DeliveryStatus.PENDING, AlertDelivery.attempts: 0,
+                    AlertDelivery.next_attempt_at: AlertDelivery.created_at
+                })
+                db.session.commit()
+                app.config['ALERT_EMAIL_CONNECTIONS'] = connections
+                alert_mailer.init_app(app)
+                received = stub.received
+                started = time.perf_counter()
+                totals = alert_mailer.deliver_pending()
+                elapsed = time.perf_counter() - started
+                assert totals['sent'] == queued == stub.received - received, totals
+                name = f'outbox, {connections} pooled connection' + ('s' if connections > 1 else '')
+                print(f'{name:>34} {queued:>7} {elapsed:>8.2f} {queued / elapsed:>9.0f}')
+            alert_mailer.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Batch assignment solver time and quality at growing problem sizes.
+
+Volunteers and reports are scattered over a SPREAD_KM square (a region,
+not one city) with random loads and severities, and solved in memory, no
+database. For each size reports the solver picked, the time, pairs
+matched and their total cost (lower is better at equal pairs); at sizes the exact solver can handle
+the greedy fallback is run too, to show what it gives up.
+
+    python benchmarks/batch_assignment.py
+    SIZES=500,2000,5000 SPREAD_KM=300 python benchmarks/batch_assignment.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from assignment import AssignmentSolver, Report, Volunteer  # noqa: E402
+from models import DisasterSeverity  # noqa: E402
+
+SIZES = [int(s) for s in os.environ.get('SIZES', '100,200,1000,5000').split(',')]
+SPREAD_KM = float(os.environ.get('SPREAD_KM', 300))
+SEED = int(os.environ.get('SEED', 1))
+
+
+def scatter(count, rng):
+    span = SPREAD_KM / 111.32
+    return [(12.0 + rng.random() * span, 77.0 + rng.random() * span) for _ in range(count)]
+
+
+def problem(size, rng):
+    volunteers = [Volunteer(i, lat, lon, rng.randrange(3)) for i, (lat, lon) in enumerate(scatter(size, rng))]
+    severities = list(DisasterSeverity)
+    reports = [Report(i, lat, lon, rng.choice(severities)) for i, (lat, lon) in enumerate(scatter(size, rng))]
+    return volunteers, reports
+
+
+def run(solver, volunteers, reports):
+    started = time.perf_counter()
+    plan = solver.solve(volunteers, reports)
+    elapsed = time.perf_counter() - started
+    pairs = len(plan.assignments)
+    total_cost = sum(a.cost for a in plan.assignments)
+    return plan.solver, elapsed, pairs, total_cost
+
+
+def main():
+    rng = random.Random(SEED)
+    solver = AssignmentSolver()
+    greedy = AssignmentSolver(exact_limit=0)
+    print(f'volunteers = reports = N, spread over {SPREAD_KM:.0f} km, max distance {solver.max_distance_km:.0f} km')
+    print(f"{'N':>6} {'solver':>10} {'seconds':>9} {'pairs':>7} {'total cost':>11}")
+    for size in SIZES:
+        volunteers, reports = problem(size, rng)
+        runs = [run(solver, volunteers, reports)]
+        if runs[0][0] != 'greedy':
+            runs.append(run(greedy, volunteers, reports))
+        for name, elapsed, pairs, total_cost in runs:
+            print(f'{size:>6} {name:>10} {elapsed:>9.2f} {pairs:>7} {total_cost:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Report ingestion throughput: one POST per report against bulk uploads.
+
+An in-process app is built against a throwaway SQLite database and ROWS
+reports are submitted three ways: one POST /api/citizen/reports each, one
+JSON array to /api/citizen/reports/bulk, and the same rows as NDJSON.
+Reports rows/s for each, and the bulk runs at a few batch sizes.
+
+    python benchmarks/bulk_ingest.py
+    ROWS=20000 BATCH_SIZES=100,500,2000 python benchmarks/bulk_ingest.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+ROWS = int(os.environ.get('ROWS', 5000))
+SINGLE_ROWS = int(os.environ.get('SINGLE_ROWS', min(ROWS, 1000)))
+BATCH_SIZES = [int(b) for b in os.environ.get('BATCH_SIZES', '100,500,2000').split(',')]
+
+
+def make_rows(count):
+    return [{
+        'title': f'Flood {n}',
+        'description': 'Water rising near the bridge',
+        'location': 'Riverside',
+        'latitude': 12.9 + (n % 100) / 1000,
+        'longitude': 77.5 + (n % 37) / 1000,
+        'severity': 'HIGH',
+    } for n in range(count)]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['PASSWORD_HASH_WORKERS'] = '0'
+        from app import create_app
+        from models import db, User
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            user = User(name='Bench', email='bench@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+
+        client = app.test_client()
+        client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': 'password'})
+        rows = make_rows(ROWS)
+        ndjson = '\n'.join(json.dumps(row) for row in rows)
+
+        def single():
+            for row in rows[:SINGLE_ROWS]:
+                assert client.post('/api/citizen/reports', json=row).status_code == 201
+
+        def bulk_json():
+            assert client.post('/api/citizen/reports/bulk', json=rows).get_json()['inserted'] == ROWS
+
+        def bulk_ndjson():
+            response = client.post('/api/citizen/reports/bulk', data=ndjson, content_type='application/x-ndjson')
+            assert response.get_json()['inserted'] == ROWS
+
+        print(f'{ROWS} reports ({SINGLE_ROWS} for one-per-request)')
+        print(f"{'mode':<24} {'rows/s':>10}")
+        print(f"{'one POST per report':<24} {SINGLE_ROWS / timed(single):>10.0f}")
+        for batch_size in BATCH_SIZES:
+            app.config['BULK_INGEST_BATCH_SIZE'] = batch_size
+            print(f"{f'JSON array, batch {batch_size}':<24} {ROWS / timed(bulk_json):>10.0f}")
+            print(f"{f'NDJSON, batch {batch_size}':<24} {ROWS / timed(bulk_ndjson):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Cold-start breakdown for the serverless entry point.
+
+Each run starts a fresh interpreter that imports api/index.py (building the
+app) and serves one request, the way a cold serverless invocation does. It
+reports import time grouped by top-level package (from `python -X
+importtime`), the create_app phases and the first request, for the
+serverless defaults and for the long-running server defaults.
+
+    python benchmarks/cold_start.py
+    RUNS=10 python benchmarks/cold_start.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RUNS = int(os.environ.get('RUNS', 5))
+TOP_PACKAGES = int(os.environ.get('TOP_PACKAGES', 12))
+
+# Runs inside the child interpreter; prints one JSON line with its timings
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, 'api')
+import index
+imported = time.perf_counter()
+client = index.app.test_client()
+status = client.get('/api/public/statistics').status_code
+served = time.perf_counter()
+phases = index.app.extensions['startup_timer'].phases
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': status,
+    'phases': [(name, duration * 1000) for name, duration in phases],
+    'socketio_imported': 'flask_socketio' in sys.modules,
+}))
+'''
+
+MODES = {
+    'serverless': {'SERVERLESS': '1'},
+    'server': {'SERVERLESS': '0'},
+}
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # -X importtime: "import time: self [us] | cumulative | imported package"
+    by_package = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_us) / 1000
+    timings['packages'] = by_package
+    return timings
+
+
+def main():
+    for mode, overrides in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'cold.db')}", **overrides)
+            env.pop('VERCEL', None)
+            # schema and admin are created by the deploy step, not the cold start
+            subprocess.run(
+                [sys.executable, '-m', 'flask', '--app', 'app', 'db', 'init'],
+                cwd=os.path.join(ROOT, 'backend'), env=env, capture_output=True, check=True
+            )
+            runs = [run_once(env) for _ in range(RUNS)]
+
+        print(f'== {mode} ({RUNS} runs, median)')
+        print(f"  import + create_app   {statistics.median(r['import_ms'] for r in runs):8.1f} ms")
+        print(f"  first request         {statistics.median(r['first_request_ms'] for r in runs):8.1f} ms")
+        print(f"  flask_socketio loaded {runs[0]['socketio_imported']}")
+        print('  create_app phases:')
+        for index, (name, _) in enumerate(runs[0]['phases']):
+            print(f"    {name:<22} {statistics.median(r['phases'][index][1] for r in runs):8.1f} ms")
+        print('  import time by package (self time):')
+        packages = defaultdict(list)
+        for r in runs:
+            for name, ms in r['packages'].items():
+                packages[name].append(ms)
+        ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        for name, values in ranked[:TOP_PACKAGES]:
+            print(f'    {name:<22} {statistics.median(values):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Login throughput against the number of password hashing workers.
+
+For each worker count an in-process app is built against a throwaway
+SQLite database and CONCURRENCY threads log in repeatedly for DURATION
+seconds while one more thread polls a cheap read (/api/public/statistics).
+Reports logins/s, 503s shed by the pool and the latency of the cheap read.
+Worker count 0 hashes inline on the request threads (the old behaviour).
+
+    python benchmarks/login_throughput.py
+    WORKERS=0,1,2,4 CONCURRENCY=16 DURATION=10 python benchmarks/login_throughput.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+WORKERS = [int(w) for w in os.environ.get('WORKERS', '0,1,2,4').split(',')]
+CONCURRENCY = int(os.environ.get('CONCURRENCY', 8))
+DURATION = float(os.environ.get('DURATION', 5))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(workers, db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+    from app import create_app
+    from models import db, User
+    from passwords import hasher
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if not User.query.filter_by(email='bench@example.com').first():
+            user = User(name='Bench', email='bench@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+        app.test_client().get('/api/public/statistics')  # one-time initialization
+        hasher.verify(User.query.first().password_hash, 'warm up the pool')
+
+    deadline = time.perf_counter() + DURATION
+    counts = {'ok': 0, 'busy': 0, 'other': 0}
+    read_latencies = []
+    lock = threading.Lock()
+
+    def log_in():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            status = client.post('/api/auth/login', json={
+                'email': 'bench@example.com', 'password': 'password'
+            }).status_code
+            key = 'ok' if status == 200 else 'busy' if status == 503 else 'other'
+            with lock:
+                counts[key] += 1
+
+    def read():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.get('/api/public/statistics')
+            read_latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=log_in) for _ in range(CONCURRENCY)]
+    threads.append(threading.Thread(target=read))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hasher.shutdown()
+
+    return counts, read_latencies
+
+
+def main():
+    print(f'{CONCURRENCY} login threads, {DURATION:.0f}s per run, {os.cpu_count()} CPUs')
+    print(f"{'workers':>8} {'logins/s':>10} {'503/s':>8} {'read p50':>10} {'read p99':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in WORKERS:
+            counts, reads = run(workers, os.path.join(tmp, 'bench.db'))
+            print(f"{workers:>8} {counts['ok'] / DURATION:>10.1f} {counts['busy'] / DURATION:>8.1f} "
+                  f"{statistics.median(reads):>8.1f}ms {percentile(reads, 99):>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
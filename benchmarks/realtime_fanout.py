@@ -0,0 +1,93 @@
+"""
+Fan-out latency benchmark for real-time alert delivery.
+
+Connects CLIENTS Socket.IO clients, creates one broadcast alert as the
+admin and measures how long each client takes to receive 'alert:created'.
+
+Start the server with Socket.IO serving (python wsgi.py), then run:
+    pip install "python-socketio[asyncio_client]" requests
+    python benchmarks/realtime_fanout.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import requests
+import socketio
+
+BASE = os.environ.get('BASE', 'http://127.0.0.1:5000')
+CLIENTS = int(os.environ.get('CLIENTS', 2000))
+CONNECT_BATCH = int(os.environ.get('CONNECT_BATCH', 200))
+TIMEOUT = float(os.environ.get('TIMEOUT', 30))
+ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@disaster.com')
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def connect_clients(title, received):
+    clients = []
+
+    def make_handler(client_id):
+        def on_alert(alert):
+            if alert.get('title') == title and client_id not in received:
+                received[client_id] = time.perf_counter()
+        return on_alert
+
+    for start in range(0, CLIENTS, CONNECT_BATCH):
+        batch = []
+        for client_id in range(start, min(start + CONNECT_BATCH, CLIENTS)):
+            client = socketio.AsyncClient(reconnection=False)
+            client.on('alert:created', make_handler(client_id))
+            batch.append(client)
+        await asyncio.gather(*(c.connect(BASE, transports=['websocket']) for c in batch))
+        clients.extend(batch)
+        print(f'connected {len(clients)}/{CLIENTS}')
+    return clients
+
+
+def post_alert(title):
+    session = requests.Session()
+    r = session.post(f'{BASE}/api/auth/login', json={'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD}, timeout=10)
+    r.raise_for_status()
+    sent_at = time.perf_counter()
+    r = session.post(f'{BASE}/api/admin/alerts', json={
+        'title': title, 'message': 'Fan-out benchmark', 'alert_level': 'info', 'is_broadcast': True
+    }, timeout=10)
+    r.raise_for_status()
+    return sent_at
+
+
+async def main():
+    title = f'fanout-benchmark-{int(time.time())}'
+    received = {}
+    clients = await connect_clients(title, received)
+
+    loop = asyncio.get_running_loop()
+    sent_at = await loop.run_in_executor(None, post_alert, title)
+
+    deadline = time.perf_counter() + TIMEOUT
+    while len(received) < CLIENTS and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+    latencies = [(t - sent_at) * 1000 for t in received.values()]
+    print(f'\nclients: {CLIENTS}, received: {len(received)}')
+    if not latencies:
+        print('No client received the alert')
+        return 2
+    print(f'latency ms  p50={statistics.median(latencies):.1f} '
+          f'p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} '
+          f'max={max(latencies):.1f}')
+    return 0 if len(received) == CLIENTS else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
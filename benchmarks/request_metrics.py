@@ -0,0 +1,91 @@
+"""
+Cost of the request and SQL metrics (metrics.py) per request.
+
+For each setting an in-process app is built against a throwaway SQLite
+database holding REPORTS reports, a logged-in admin requests each path in
+PATHS in REPEAT batches of REQUESTS. The mean time per request of the
+best batch is reported with the metrics off, on, and on with the timing
+headers. The paths are admin endpoints, which the response cache skips.
+
+    python benchmarks/request_metrics.py
+    REQUESTS=2000 python benchmarks/request_metrics.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+REPORTS = int(os.environ.get('REPORTS', 200))
+REQUESTS = int(os.environ.get('REQUESTS', 200))
+REPEAT = int(os.environ.get('REPEAT', 10))
+SEED = int(os.environ.get('SEED', 1))
+PATHS = ['/api/admin/alerts', '/api/admin/reports?per_page=20', '/api/admin/reports/1']
+
+SETTINGS = [
+    ('off', {'METRICS_ENABLED': '0'}),
+    ('on', {'METRICS_ENABLED': '1', 'METRICS_TIMING_HEADERS': '0'}),
+    ('on + headers', {'METRICS_ENABLED': '1', 'METRICS_TIMING_HEADERS': '1'}),
+]
+
+
+def run(settings, db_path):
+    rng = random.Random(SEED)
+    os.environ.update(settings, DATABASE_URL=f'sqlite:///{db_path}', PASSWORD_HASH_WORKERS='0',
+                      PASSWORD_HASH_METHOD='pbkdf2:sha256:1', CLUSTERING_ENABLED='0')
+    from app import create_app
+    from models import db, User, UserRole, DisasterReport, DisasterSeverity
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        admin = User(name='Admin', email='bench-admin@example.com', role=UserRole.ADMIN)
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add_all(
+            DisasterReport(
+                title='Flood', description='Water rising near the bridge', location='Riverside',
+                latitude=12 + rng.random(), longitude=77 + rng.random(),
+                severity=rng.choice(list(DisasterSeverity)), reporter_id=admin.id
+            )
+            for _ in range(REPORTS)
+        )
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/api/auth/login', json={'email': 'bench-admin@example.com', 'password': 'password'})
+    timings = {}
+    for path in PATHS:
+        for _ in range(20):  # warm up
+            client.get(path)
+        batches = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            for _ in range(REQUESTS):
+                client.get(path)
+            batches.append((time.perf_counter() - started) / REQUESTS)
+        timings[path] = min(batches)
+    return timings
+
+
+def main():
+    print(f'{REPEAT} batches of {REQUESTS} requests per path, {REPORTS} reports; mean time per request')
+    print(f"{'metrics':>14} " + ' '.join(f'{path:>32}' for path in PATHS))
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (name, settings) in enumerate(SETTINGS):
+            timings = run(settings, os.path.join(tmp, f'bench{n}.db'))
+            baseline = baseline or timings
+            cells = [
+                f'{timings[p] * 1e6:>9.0f}us ({(timings[p] / baseline[p] - 1) * 100:+5.1f}%)'
+                for p in PATHS
+            ]
+            print(f'{name:>14} ' + ' '.join(f'{cell:>32}' for cell in cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Resource allocation plan time, cold and with the distance matrix cached.
+
+An in-process app is built against a throwaway SQLite database holding
+RESOURCES medical resources and REPORTS open reports scattered over a
+SPREAD_KM square. Times the first plan (matrix loaded and built), a plan
+from the cached matrix and a commit that adds a resource and so updates
+the matrix in place; then solves the cached problem with the exact
+min-cost flow and with the greedy fallback, whatever the configured
+solver, to show what the fallback gives up.
+
+    python benchmarks/resource_allocation.py
+    RESOURCES=2000 REPORTS=10000 python benchmarks/resource_allocation.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+RESOURCES = int(os.environ.get('RESOURCES', 500))
+REPORTS = int(os.environ.get('REPORTS', 2000))
+SPREAD_KM = float(os.environ.get('SPREAD_KM', 300))
+SEED = int(os.environ.get('SEED', 1))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    rng = random.Random(SEED)
+    span = SPREAD_KM / 111.32
+
+    def point():
+        return 12.0 + rng.random() * span, 77.0 + rng.random() * span
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['PASSWORD_HASH_WORKERS'] = '0'
+        os.environ['CLUSTERING_ENABLED'] = '0'
+        from app import create_app
+        from allocation import COST_SCALE, SHORTAGE_PENALTY, ResourceAllocator, distance_matrix, resource_allocator
+        from models import db, User, DisasterReport, DisasterSeverity, Resource
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            user = User(name='Bench', email='bench@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            severities = list(DisasterSeverity)
+            reports = []
+            for _ in range(REPORTS):
+                latitude, longitude = point()
+                reports.append(DisasterReport(
+                    title='Flood', description='Water rising', location='Somewhere', reporter_id=user.id,
+                    latitude=latitude, longitude=longitude, severity=rng.choice(severities)
+                ))
+            db.session.add_all(reports)
+            db.session.add_all(
+                Resource(name='Kit', resource_type='medical', quantity=rng.randint(1, 20), location='%f,%f' % point())
+                for _ in range(RESOURCES)
+            )
+            db.session.commit()
+
+            distance_matrix.invalidate()
+            cold, plans = timed(lambda: resource_allocator.plan(['medical']))
+            warm, _ = timed(lambda: resource_allocator.plan(['medical']))
+
+            def add_resource():
+                db.session.add(Resource(name='Kit', resource_type='medical', quantity=5, location='%f,%f' % point()))
+                db.session.commit()
+            update, _ = timed(add_resource)
+
+            plan = plans[0]
+            quantities = resource_allocator.supply(['medical'])['medical']
+            severities_by_id, rows = distance_matrix.snapshot('medical')
+            edges = sum(len(row) for row in rows.values())
+            print(f'{RESOURCES} resources, {REPORTS} reports over {SPREAD_KM:.0f} km, {edges} report-resource edges')
+            print(f'supply {plan.supply}, demand {plan.demand}')
+            print(f'cold plan (load + build matrix + {plan.solver}) {cold:8.3f}s')
+            print(f'warm plan (cached matrix)          {warm:8.3f}s')
+            print(f'add a resource (commit + update)   {update:8.3f}s')
+
+            print(f"{'solver':>14} {'seconds':>9} {'allocated':>10} {'cost':>12}")
+            scale = COST_SCALE / distance_matrix.max_distance_km
+            for exact_limit in (edges, 0):
+                allocator = ResourceAllocator(distance_matrix, resource_allocator.demand, exact_limit)
+                elapsed, result = timed(lambda: allocator.solve('medical', quantities, severities_by_id, rows))
+                # in the flow's own units: distance costs plus shortage penalties
+                cost = sum(a.quantity * round(a.distance_km * scale) for a in result.allocations) + sum(
+                    (s.demand - s.allocated) * SHORTAGE_PENALTY[DisasterSeverity(s.severity)] for s in result.shortages
+                )
+                print(f'{result.solver:>14} {elapsed:>9.3f} {result.allocated:>10} {cost:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+List serialization: ORM objects + to_dict() + Flask's encoder vs row plans.
+
+An in-process app is built against a throwaway SQLite database holding
+REPORTS reports from USERS reporters. Each variant builds the
+/api/public/disasters body for all of them, best of REPEAT runs, split
+into loading the data (query + hydration or row building) and encoding it.
+The row-plan bodies are checked to be byte-for-byte equal to the to_dict()
+body before anything is timed.
+
+    python benchmarks/serialization.py
+    REPORTS=50000 python benchmarks/serialization.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+REPORTS = int(os.environ.get('REPORTS', 10000))
+USERS = int(os.environ.get('USERS', 500))
+REPEAT = int(os.environ.get('REPEAT', 5))
+SEED = int(os.environ.get('SEED', 1))
+
+
+def best(fn):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    rng = random.Random(SEED)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['PASSWORD_HASH_WORKERS'] = '0'
+        os.environ['CLUSTERING_ENABLED'] = '0'
+        from app import create_app
+        from models import db, User, DisasterReport, DisasterSeverity, ReportStatus
+        from queries import report_query
+        import serializers
+        from serializers import REPORT_PLAN
+
+        app = create_app()
+        with app.test_request_context():
+            db.create_all()
+            users = [User(name=f'User {n}', email=f'user{n}@example.com', password_hash='x', phone='9999999999')
+                     for n in range(USERS)]
+            db.session.add_all(users)
+            db.session.flush()
+            db.session.add_all(
+                DisasterReport(
+                    title='Flood', description='Water rising near the bridge ' * 3, location='Riverside',
+                    latitude=12 + rng.random(), longitude=77 + rng.random(),
+                    severity=rng.choice(list(DisasterSeverity)), status=ReportStatus.PENDING,
+                    reporter_id=rng.choice(users).id
+                )
+                for _ in range(REPORTS)
+            )
+            db.session.commit()
+
+            statement = REPORT_PLAN.select().order_by(DisasterReport.created_at.desc())
+
+            def orm_load():
+                db.session.expunge_all()
+                return [r.to_dict() for r in report_query('list').order_by(DisasterReport.created_at.desc())]
+
+            def orm_encode(data):
+                return app.json.response({'disasters': data, 'total': len(data)}).get_data()
+
+            def row_encode(data):
+                return serializers.dumps({'disasters': data, 'total': len(data)})
+
+            orm_data = orm_load()
+            row_data = REPORT_PLAN.all(statement)
+            expected = orm_encode(orm_data)
+            assert row_encode(row_data) == expected
+            orjson = serializers.orjson
+
+            results = []
+            load, _ = best(orm_load)
+            encode, _ = best(lambda: orm_encode(orm_data))
+            results.append(('ORM + to_dict + Flask json', load, encode))
+
+            load, _ = best(lambda: REPORT_PLAN.all(statement))
+            if orjson is not None:
+                encode, _ = best(lambda: row_encode(row_data))
+                results.append(('row plan + orjson', load, encode))
+            serializers.orjson = None
+            assert row_encode(row_data) == expected
+            encode, _ = best(lambda: row_encode(row_data))
+            serializers.orjson = orjson
+            results.append(('row plan + stdlib json', load, encode))
+
+            print(f'{REPORTS} reports, {len(expected) / 1e6:.1f} MB body, best of {REPEAT}')
+            print(f"{'variant':>28} {'load':>8} {'encode':>8} {'total':>8}")
+            for name, load, encode in results:
+                print(f'{name:>28} {load:>8.3f} {encode:>8.3f} {load + encode:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Mixed read/write throughput on SQLite: before and after connection tuning.
+
+For each profile an in-process app is built against a fresh SQLite file
+and CONCURRENCY citizens, one thread each, spend DURATION seconds either
+submitting a report (WRITE_RATIO of the requests) or listing their own
+reports. Profiles:
+- rollback journal: SQLite's defaults (the configuration before tuning)
+- WAL: the tuned pragmas, each request thread committing its own insert
+- WAL + write queue: the tuned pragmas with inserts group-committed by
+  the writer thread (the default)
+
+Reports requests/s, failed requests (5xx, mostly "database is locked")
+and read and write latency.
+
+    python benchmarks/sqlite_concurrency.py
+    CONCURRENCY=32 WRITE_RATIO=0.5 DURATION=10 python benchmarks/sqlite_concurrency.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+CONCURRENCY = int(os.environ.get('CONCURRENCY', 16))
+DURATION = float(os.environ.get('DURATION', 5))
+WRITE_RATIO = float(os.environ.get('WRITE_RATIO', 0.2))
+SEED = int(os.environ.get('SEED', 1))
+
+PROFILES = [
+    ('rollback journal', {
+        'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE_KB': '2000', 'SQLITE_WRITE_QUEUE': '0',
+    }),
+    ('WAL', {'SQLITE_WRITE_QUEUE': '0'}),
+    ('WAL + write queue', {}),
+]
+TUNING = {'SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_MMAP_SIZE', 'SQLITE_CACHE_SIZE_KB', 'SQLITE_WRITE_QUEUE'}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(settings, db_path):
+    for name in TUNING:
+        os.environ.pop(name, None)
+    os.environ.update(settings, DATABASE_URL=f'sqlite:///{db_path}', PASSWORD_HASH_WORKERS='0',
+                      PASSWORD_HASH_METHOD='pbkdf2:sha256:1')
+    from app import create_app
+    from models import db, User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        users = [User(name=f'Citizen {n}', email=f'citizen{n}@example.com') for n in range(CONCURRENCY)]
+        for user in users:
+            user.set_password('password')
+        db.session.add_all(users)
+        db.session.commit()
+        app.test_client().get('/api/public/statistics')  # one-time initialization
+
+    deadline = time.perf_counter() + DURATION
+    reads, writes, failures = [], [], []
+
+    def citizen(n):
+        rng = random.Random(SEED + n)
+        client = app.test_client()
+        client.post('/api/auth/login', json={'email': f'citizen{n}@example.com', 'password': 'password'})
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if rng.random() < WRITE_RATIO:
+                response = client.post('/api/citizen/reports', json={
+                    'title': f'Flood {rng.random():.6f}', 'description': 'Water rising near the bridge',
+                    'location': 'Riverside', 'latitude': 12 + rng.random(), 'longitude': 77 + rng.random(),
+                })
+                latencies = writes
+            else:
+                response = client.get('/api/citizen/reports?per_page=20')
+                latencies = reads
+            elapsed = (time.perf_counter() - started) * 1000
+            (failures if response.status_code >= 500 else latencies).append(elapsed)
+
+    threads = [threading.Thread(target=citizen, args=(n,)) for n in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    from database import write_queue
+    write_queue.shutdown()
+    return reads, writes, failures
+
+
+def main():
+    print(f'{CONCURRENCY} threads, {WRITE_RATIO:.0%} writes, {DURATION:.0f}s per profile')
+    print(f"{'profile':>18} {'req/s':>7} {'failed':>7} {'read p50':>9} {'read p99':>9} "
+          f"{'write p50':>10} {'write p99':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (name, settings) in enumerate(PROFILES):
+            reads, writes, failures = run(settings, os.path.join(tmp, f'bench{n}.db'))
+            total = len(reads) + len(writes) + len(failures)
+            print(f'{name:>18} {total / DURATION:>7.0f} {len(failures):>7} '
+                  f'{statistics.median(reads):>7.1f}ms {percentile(reads, 99):>7.1f}ms '
+                  f'{statistics.median(writes):>8.1f}ms {percentile(writes, 99):>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,17 @@ const API_BASE = `${window.location.protocol}//${window.location.host}/api`;
 // Global state
 let currentUser = null;
 let currentSection = 'home';
+let realtimeSocket = null;
+let realtimeEnabled = null;  // from /api/public/config, on the first connect
+
+// Rendered reports by id, so real-time deltas patch them without refetching
+const ACTIVE_STATUSES = ['pending', 'in_progress'];
+let shownDisasters = null;  // Map, once the disasters list has loaded
+let adminReports = null;    // Map, while the admin dashboard is loaded
+// Statistics refresh at most once per window, spread out so clients don't all hit the API together
+const STATISTICS_REFRESH_MS = 2000;
+const STATISTICS_JITTER_MS = 3000;
+let statisticsTimer = null;
 
 /**
  * Initialize app on page load
@@ -16,8 +27,144 @@ document.addEventListener('DOMContentLoaded', function() {
     setupEventListeners();
     checkAuth();
     loadInitialData();
+    connectRealtime();
 });
 
+/**
+ * Connect to real-time updates (Socket.IO) instead of polling, when the server serves them.
+ * Reconnecting after login/logout moves the socket into the right rooms.
+ */
+async function connectRealtime() {
+    if (typeof io === 'undefined') {
+        return;
+    }
+    
+    if (realtimeEnabled === null) {
+        try {
+            const response = await fetch(`${API_BASE}/public/config`);
+            realtimeEnabled = response.ok && (await response.json()).realtime === true;
+        } catch (error) {
+            realtimeEnabled = false;
+        }
+    }
+    if (!realtimeEnabled) {
+        return;
+    }
+    
+    if (realtimeSocket) {
+        realtimeSocket.disconnect().connect();
+        return;
+    }
+    
+    realtimeSocket = io({ withCredentials: true });
+    
+    // Socket.IO unreachable (e.g. behind a proxy that doesn't forward it): stop retrying
+    let connected = false;
+    realtimeSocket.on('connect', () => {
+        connected = true;
+    });
+    realtimeSocket.on('connect_error', () => {
+        if (!connected) {
+            realtimeSocket.io.reconnection(false);
+        }
+    });
+    
+    realtimeSocket.on('alert:created', (alert) => {
+        showToast(`Alert: ${alert.title}`, alert.alert_level === 'critical' ? 'error' : 'info');
+        loadAlerts();
+    });
+    
+    realtimeSocket.on('report:created', (report) => applyReportDelta(report, true));
+    realtimeSocket.on('report:updated', (delta) => applyReportDelta(delta, false));
+    realtimeSocket.on('task:assigned', (task) => {
+        if (currentUser && currentUser.role === 'volunteer') {
+            showToast('New task assigned', 'info');
+        }
+        applyTaskDelta(task, true);
+    });
+    realtimeSocket.on('task:updated', (delta) => applyTaskDelta(delta, false));
+}
+
+/**
+ * Apply a report:created summary or report:updated delta to the rendered lists
+ */
+function applyReportDelta(delta, created) {
+    if (shownDisasters) {
+        patchDisastersList(delta, created);
+    }
+    if (adminReports && (created || adminReports.has(delta.id))) {
+        const report = Object.assign(adminReports.get(delta.id) || { description: '', volunteer_tasks: [] }, delta);
+        adminReports.set(report.id, report);
+        renderAdminReports();
+    }
+    scheduleStatisticsRefresh();
+}
+
+/**
+ * Apply a task:assigned or task:updated delta to its report on the admin dashboard
+ */
+function applyTaskDelta(delta, assigned) {
+    const report = adminReports && adminReports.get(delta.report_id);
+    if (!report) {
+        return;
+    }
+    const tasks = report.volunteer_tasks || (report.volunteer_tasks = []);
+    const task = tasks.find(t => t.id === delta.id);
+    if (task) {
+        Object.assign(task, delta);
+    } else if (assigned) {
+        tasks.push(delta);
+        renderAdminReports();
+    }
+}
+
+/**
+ * Insert, patch or drop one card of the active disasters list
+ */
+function patchDisastersList(delta, created) {
+    const list = document.getElementById('disastersList');
+    const known = shownDisasters.get(delta.id);
+    if (!known && !created) {
+        return;
+    }
+    
+    const report = Object.assign(known || { description: '' }, delta);
+    const card = list.querySelector(`[data-report-id="${report.id}"]`);
+    if (!ACTIVE_STATUSES.includes(report.status)) {
+        shownDisasters.delete(report.id);
+        if (card) {
+            card.remove();
+        }
+        if (shownDisasters.size === 0) {
+            list.innerHTML = '<p class="empty-state">No active disasters reported</p>';
+        }
+        return;
+    }
+    
+    shownDisasters.set(report.id, report);
+    if (card) {
+        card.outerHTML = disasterCardHTML(report);
+    } else {
+        if (shownDisasters.size === 1) {
+            list.innerHTML = '';
+        }
+        list.insertAdjacentHTML('afterbegin', disasterCardHTML(report));
+    }
+}
+
+/**
+ * Reload the statistics once the current burst of events has passed
+ */
+function scheduleStatisticsRefresh() {
+    if (statisticsTimer) {
+        return;
+    }
+    statisticsTimer = setTimeout(() => {
+        statisticsTimer = null;
+        loadStatistics();
+    }, STATISTICS_REFRESH_MS + Math.random() * STATISTICS_JITTER_MS);
+}
+
 /**
  * Setup event listeners
  */
@@ -122,35 +269,43 @@ async function loadDisasters() {
         const data = await response.json();
         
         const list = document.getElementById('disastersList');
+        shownDisasters = new Map(data.disasters.map(disaster => [disaster.id, disaster]));
         
         if (data.disasters.length === 0) {
             list.innerHTML = '<p class="empty-state">No active disasters reported</p>';
             return;
         }
         
-        list.innerHTML = data.disasters.map(disaster => `
-            <div class="disaster-card">
-                <div class="card-header">
-                    <h3>${disaster.title}</h3>
-                    <span class="severity-badge severity-${disaster.severity.toLowerCase()}">${disaster.severity.toUpperCase()}</span>
-                </div>
-                <div class="card-body">
-                    <p><strong>Location:</strong> ${disaster.location}</p>
-                    <p><strong>Description:</strong> ${disaster.description.substring(0, 100)}...</p>
-                    <p><strong>Status:</strong> ${disaster.status.toUpperCase()}</p>
-                    <p><strong>Reported:</strong> ${new Date(disaster.created_at).toLocaleString()}</p>
-                </div>
-                <div class="card-footer">
-                    <button class="btn btn-small" onclick="viewDisasterDetail(${disaster.id})">View Details</button>
-                </div>
-            </div>
-        `).join('');
+        list.innerHTML = data.disasters.map(disasterCardHTML).join('');
     } catch (error) {
         console.error('Error loading disasters:', error);
         showToast('Error loading disasters', 'error');
     }
 }
 
+/**
+ * One card of the active disasters list
+ */
+function disasterCardHTML(disaster) {
+    return `
+        <div class="disaster-card" data-report-id="${disaster.id}">
+            <div class="card-header">
+                <h3>${disaster.title}</h3>
+                <span class="severity-badge severity-${disaster.severity.toLowerCase()}">${disaster.severity.toUpperCase()}</span>
+            </div>
+            <div class="card-body">
+                <p><strong>Location:</strong> ${disaster.location}</p>
+                <p><strong>Description:</strong> ${(disaster.description || '').substring(0, 100)}...</p>
+                <p><strong>Status:</strong> ${disaster.status.toUpperCase()}</p>
+                <p><strong>Reported:</strong> ${new Date(disaster.created_at).toLocaleString()}</p>
+            </div>
+            <div class="card-footer">
+                <button class="btn btn-small" onclick="viewDisasterDetail(${disaster.id})">View Details</button>
+            </div>
+        </div>
+    `;
+}
+
 /**
  * Load alerts
  */
@@ -205,6 +360,7 @@ async function handleLogin(e) {
             currentUser = data.user;
             closeModal('authModal');
             updateUIForLoggedInUser();
+            connectRealtime();
             showToast('Login successful', 'success');
             navigateTo('dashboard');
         } else {
@@ -264,7 +420,9 @@ async function handleLogout(e) {
         });
         
         currentUser = null;
+        adminReports = null;
         updateUIForLoggedOutUser();
+        connectRealtime();
         navigateTo('home');
         showToast('Logged out', 'info');
     } catch (error) {
@@ -418,64 +576,7 @@ async function loadAdminDashboard() {
             const allReportsData = await allReportsResponse.json();
             const volunteersData = await volunteersResponse.json();
             
-            const statuses = ['pending', 'acknowledged', 'in_progress', 'resolved', 'cancelled'];
-            const statusLabels = {
-                'pending': 'PENDING',
-                'acknowledged': 'ACKNOWLEDGED',
-                'in_progress': 'IN_PROGRESS',
-                'resolved': 'RESOLVED',
-                'cancelled': 'CANCELLED'
-            };
-            const reportsByStatus = {};
-            
-            statuses.forEach(status => {
-                reportsByStatus[status] = allReportsData.reports.filter(r => r.status === status);
-            });
-            
-            const reportsHTML = statuses.map(status => `
-                <div class="admin-section">
-                    <h3>${statusLabels[status]} Reports (${reportsByStatus[status].length})</h3>
-                    <div class="reports-container">
-                        ${reportsByStatus[status].length === 0 ? 
-                            '<p class="empty-state">No reports with this status</p>' :
-                            reportsByStatus[status].map(report => `
-                                <div class="report-card">
-                                    <div class="card-header">
-                                        <h4>${report.title}</h4>
-                                        <span class="severity-badge severity-${report.severity.toLowerCase()}">${report.severity}</span>
-                                    </div>
-                                    <div class="card-body">
-                                        <p><strong>Location:</strong> ${report.location}</p>
-                                        <p><strong>Description:</strong> ${report.description.substring(0, 100)}...</p>
-                                        <p><strong>Status:</strong> <span class="status-badge">${report.status}</span></p>
-                                        <p><strong>Reported by:</strong> ${report.reporter.name} (${report.reporter.phone})</p>
-                                        <p><strong>Created:</strong> ${new Date(report.created_at).toLocaleString()}</p>
-                                        ${report.volunteer_tasks && report.volunteer_tasks.length > 0 ? 
-                                            `<p><strong>Assigned Tasks:</strong> ${report.volunteer_tasks.length}</p>` : 
-                                            '<p><strong>No volunteers assigned</strong></p>'
-                                        }
-                                    </div>
-                                    <div class="card-actions">
-                                        <select class="form-control" onchange="changeReportStatus(${report.id}, this.value)">
-                                            <option value="">Change Status...</option>
-                                            <option value="acknowledged">Acknowledge</option>
-                                            <option value="in_progress">In Progress</option>
-                                            <option value="resolved">Resolved</option>
-                                            <option value="cancelled">Cancel</option>
-                                        </select>
-                                        <button class="btn btn-small" onclick="openAssignVolunteerModal(${report.id}, '${report.title}')">
-                                            Assign Volunteer
-                                        </button>
-                                        <button class="btn btn-small btn-secondary" onclick="viewReportDetails(${report.id})">
-                                            View Details
-                                        </button>
-                                    </div>
-                                </div>
-                            `).join('')
-                        }
-                    </div>
-                </div>
-            `).join('');
+            adminReports = new Map(allReportsData.reports.map(report => [report.id, report]));
             
             dashboardContent.innerHTML = `
                 <div class="admin-dashboard">
@@ -506,11 +607,10 @@ async function loadAdminDashboard() {
                         </div>
                     </div>
                     
-                    <div class="reports-list">
-                        ${reportsHTML}
-                    </div>
+                    <div class="reports-list" id="adminReportsList"></div>
                 </div>
             `;
+            renderAdminReports();
         }
     } catch (error) {
         console.error('Admin dashboard error:', error);
@@ -518,6 +618,77 @@ async function loadAdminDashboard() {
     }
 }
 
+/**
+ * Render the admin dashboard's reports, grouped by status, from adminReports
+ */
+function renderAdminReports() {
+    const container = document.getElementById('adminReportsList');
+    if (!container) {
+        return;
+    }
+    // newest first, as the API lists them
+    const reports = [...adminReports.values()].sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    
+    const statuses = ['pending', 'acknowledged', 'in_progress', 'resolved', 'cancelled'];
+    const statusLabels = {
+        'pending': 'PENDING',
+        'acknowledged': 'ACKNOWLEDGED',
+        'in_progress': 'IN_PROGRESS',
+        'resolved': 'RESOLVED',
+        'cancelled': 'CANCELLED'
+    };
+    const reportsByStatus = {};
+
+    statuses.forEach(status => {
+        reportsByStatus[status] = reports.filter(r => r.status === status);
+    });
+
+    container.innerHTML = statuses.map(status => `
+        <div class="admin-section">
+            <h3>${statusLabels[status]} Reports (${reportsByStatus[status].length})</h3>
+            <div class="reports-container">
+                ${reportsByStatus[status].length === 0 ? 
+                    '<p class="empty-state">No reports with this status</p>' :
+                    reportsByStatus[status].map(report => `
+                        <div class="report-card">
+                            <div class="card-header">
+                                <h4>${report.title}</h4>
+                                <span class="severity-badge severity-${report.severity.toLowerCase()}">${report.severity}</span>
+                            </div>
+                            <div class="card-body">
+                                <p><strong>Location:</strong> ${report.location}</p>
+                                <p><strong>Description:</strong> ${(report.description || '').substring(0, 100)}...</p>
+                                <p><strong>Status:</strong> <span class="status-badge">${report.status}</span></p>
+                                <p><strong>Reported by:</strong> ${report.reporter ? `${report.reporter.name} (${report.reporter.phone})` : '-'}</p>
+                                <p><strong>Created:</strong> ${new Date(report.created_at).toLocaleString()}</p>
+                                ${report.volunteer_tasks && report.volunteer_tasks.length > 0 ? 
+                                    `<p><strong>Assigned Tasks:</strong> ${report.volunteer_tasks.length}</p>` : 
+                                    '<p><strong>No volunteers assigned</strong></p>'
+                                }
+                            </div>
+                            <div class="card-actions">
+                                <select class="form-control" onchange="changeReportStatus(${report.id}, this.value)">
+                                    <option value="">Change Status...</option>
+                                    <option value="acknowledged">Acknowledge</option>
+                                    <option value="in_progress">In Progress</option>
+                                    <option value="resolved">Resolved</option>
+                                    <option value="cancelled">Cancel</option>
+                                </select>
+                                <button class="btn btn-small" onclick="openAssignVolunteerModal(${report.id}, '${report.title}')">
+                                    Assign Volunteer
+                                </button>
+                                <button class="btn btn-small btn-secondary" onclick="viewReportDetails(${report.id})">
+                                    View Details
+                                </button>
+                            </div>
+                        </div>
+                    `).join('')
+                }
+            </div>
+        </div>
+    `).join('');
+}
+
 /**
  * Change report status
  */
@@ -0,0 +1,131 @@
+"""
+Shared pytest fixtures.
+
+The backend modules import each other as top-level modules (``from models
+import db``), so the backend directory is put on sys.path here, the same way
+running ``python app.py`` from inside backend/ does.
+Run: python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# The module-level app in backend/app.py is built at import time; keep it off
+# whatever DATABASE_URL the local .env points at.
+os.environ['DATABASE_URL'] = 'sqlite://'
+# Hash inline; tests that exercise the hashing pool configure it themselves
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+# Never mail the server a local .env points at; the alert email tests configure a fake one
+os.environ['ALERT_EMAIL_ENABLED'] = '0'
+# Keep test-run tracebacks out of the repository's logs/error.log
+os.environ['LOG_TO_FILE'] = '0'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Fresh application bound to a throwaway SQLite file"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+
+    from app import create_app
+    from models import db
+
+    application = create_app()
+    application.config['TESTING'] = True
+
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create and commit a user; password is always 'password'"""
+    from models import db, User, UserRole
+
+    def _make_user(role=UserRole.CITIZEN, email=None, **fields):
+        _make_user.count += 1
+        user = User(
+            name=fields.pop('name', f'User {_make_user.count}'),
+            email=email or f'user{_make_user.count}@example.com',
+            role=role,
+            **fields
+        )
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    _make_user.count = 0
+    return _make_user
+
+
+@pytest.fixture
+def login(client):
+    def _login(user):
+        response = client.post('/api/auth/login', json={'email': user.email, 'password': 'password'})
+        assert response.status_code == 200, response.get_json()
+        return response
+
+    return _login
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements executed inside it"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from models import db
+
+    @contextmanager
+    def _count_queries():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return _count_queries
+
+
+@pytest.fixture
+def query_budget(app):
+    """Context manager failing the test when the code inside runs more than
+    `max_queries` statements, or one statement shape more than `max_repeats`
+    times (an N+1); the failure lists every shape with the line that ran it"""
+    from contextlib import contextmanager
+    from models import db
+    from query_profiler import QueryProfile
+
+    @contextmanager
+    def _query_budget(max_queries, max_repeats=None):
+        with QueryProfile.capture(db.engine) as profile:
+            yield profile
+        problems = []
+        if profile.count > max_queries:
+            problems.append(f'{profile.count} statements, budget {max_queries}')
+        if max_repeats is not None:
+            problems.extend(
+                f'{shape.count}x the same query from {shape.source}, budget {max_repeats}'
+                for shape in profile.repeated(max_repeats)
+            )
+        if problems:
+            pytest.fail('\n'.join(problems) + '\n' + profile.summary(), pytrace=False)
+
+    return _query_budget
@@ -0,0 +1,147 @@
+"""
+Alert email outbox: recipients queued with the alert, batched pooled sending, retries.
+"""
+import smtplib
+import time
+from datetime import timedelta
+from email import message_from_bytes
+
+import pytest
+
+from alert_email import alert_mailer
+from models import db, AlertDelivery, DeliveryStatus, UserRole
+
+
+class FakeSMTP:
+    """Records what is sent; `failures` maps a recipient to the errors its next sends raise"""
+
+    def __init__(self, server):
+        self.server = server
+        self.sent = []
+
+    def sendmail(self, sender, recipients, message):
+        errors = self.server.failures.get(recipients[0])
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((recipients[0], message_from_bytes(message)))
+
+    def noop(self):
+        return 250, b'OK'
+
+    def quit(self):
+        self.server.closed += 1
+
+    close = quit
+
+
+class FakeServer:
+    def __init__(self):
+        self.connections = []
+        self.failures = {}
+        self.closed = 0
+
+    def connect(self):
+        connection = FakeSMTP(self)
+        self.connections.append(connection)
+        return connection
+
+    @property
+    def sent(self):
+        return {to: message for c in self.connections for to, message in c.sent}
+
+
+@pytest.fixture
+def smtp(app):
+    server = FakeServer()
+    app.config.update(ALERT_EMAIL_ENABLED=True, ALERT_EMAIL_WORKER=False, ALERT_EMAIL_BATCH_SIZE=2,
+                      ALERT_EMAIL_CONNECTIONS=1, MAIL_DEFAULT_SENDER='alerts@example.com')
+    alert_mailer.init_app(app, connect=server.connect)
+    yield server
+    app.config['ALERT_EMAIL_ENABLED'] = False
+    alert_mailer.init_app(app)
+
+
+def _deliveries():
+    db.session.expire_all()
+    return {d.email: d for d in AlertDelivery.query.all()}
+
+
+def test_alert_queues_target_role_and_sends_in_batches(client, make_user, login, smtp):
+    volunteers = [make_user(role=UserRole.VOLUNTEER) for _ in range(3)]
+    make_user(role=UserRole.VOLUNTEER, is_active=False)
+    make_user()
+    login(make_user(role=UserRole.ADMIN))
+
+    response = client.post('/api/admin/alerts', json={
+        'title': 'Levee breach', 'message': 'Report to the north depot', 'alert_level': 'critical',
+        'target_role': 'volunteer', 'is_broadcast': False
+    })
+
+    assert response.status_code == 201
+    assert response.get_json()['alert']['target_role'] == 'volunteer'
+    assert smtp.connections == []  # the request only queued the emails
+    assert set(_deliveries()) == {v.email for v in volunteers}
+
+    assert alert_mailer.deliver_pending() == {'sent': 3, 'retry': 0, 'failed': 0}
+    assert len(smtp.connections) == 1  # reused across both batches
+    message = smtp.sent[volunteers[0].email]
+    assert message['Subject'] == '[CRITICAL] Levee breach'
+    assert message['From'] == 'alerts@example.com'
+    assert 'Report to the north depot' in message.get_payload()
+    assert all(d.status == DeliveryStatus.SENT and d.attempts == 1 for d in _deliveries().values())
+    assert alert_mailer.deliver_pending() == {'sent': 0, 'retry': 0, 'failed': 0}
+
+    assert client.post('/api/admin/alerts', json={
+        'title': 'x', 'message': 'y', 'target_role': 'mayor'
+    }).status_code == 400
+
+
+def test_failed_sends_back_off_and_give_up(client, make_user, login, smtp):
+    flaky, refused, doomed = make_user(), make_user(), make_user()
+    login(make_user(role=UserRole.ADMIN))
+    smtp.failures = {
+        flaky.email: [smtplib.SMTPServerDisconnected('gone')],
+        refused.email: [smtplib.SMTPRecipientsRefused({refused.email: (550, b'No such user')})],
+        doomed.email: [smtplib.SMTPResponseException(451, b'Try later')] * 5,
+    }
+    alert_mailer.max_attempts = 2
+    client.post('/api/admin/alerts', json={'title': 'Storm', 'message': 'Stay indoors', 'is_broadcast': True})
+
+    # the admins (including the default one) are broadcast to as well
+    assert alert_mailer.deliver_pending() == {'sent': 2, 'retry': 2, 'failed': 1}
+    deliveries = _deliveries()
+    assert deliveries[refused.email].status == DeliveryStatus.FAILED
+    assert 'No such user' in deliveries[refused.email].last_error
+    retry = deliveries[flaky.email]
+    assert retry.status == DeliveryStatus.PENDING and retry.attempts == 1
+    assert timedelta(seconds=25) < retry.next_attempt_at - deliveries[refused.email].next_attempt_at
+    assert len(smtp.connections) == 2  # the dropped connection was replaced
+
+    # nothing is due until the backoff has passed
+    assert alert_mailer.deliver_pending()['sent'] == 0
+    AlertDelivery.query.filter_by(status=DeliveryStatus.PENDING).update(
+        {AlertDelivery.next_attempt_at: AlertDelivery.created_at}
+    )
+    db.session.commit()
+
+    assert alert_mailer.deliver_pending() == {'sent': 1, 'retry': 0, 'failed': 1}
+    deliveries = _deliveries()
+    assert deliveries[flaky.email].status == DeliveryStatus.SENT
+    assert deliveries[doomed.email].status == DeliveryStatus.FAILED
+    assert deliveries[doomed.email].attempts == 2
+
+
+def test_worker_thread_delivers_after_commit(app, client, make_user, login, smtp):
+    citizen = make_user()
+    login(make_user(role=UserRole.ADMIN))
+    app.config.update(ALERT_EMAIL_WORKER=True, ALERT_EMAIL_POLL_SECONDS=0.05)
+    alert_mailer.init_app(app, connect=smtp.connect)
+    try:
+        client.post('/api/admin/alerts', json={'title': 'Flood', 'message': 'Move uphill', 'is_broadcast': False})
+        deadline = time.monotonic() + 5
+        while citizen.email not in smtp.sent and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert citizen.email in smtp.sent
+    finally:
+        alert_mailer.shutdown()
+    assert smtp.closed == 1  # shutdown closes the pooled connection
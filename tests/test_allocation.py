@@ -0,0 +1,123 @@
+"""
+Resource allocation: the min-cost flow, the cached distance matrix and the plan endpoint.
+"""
+import random
+
+import pytest
+
+import allocation
+from allocation import ResourceAllocator, distance_matrix, greedy_flow, min_cost_flow
+from models import db, DisasterReport, DisasterSeverity, ReportStatus, Resource, UserRole
+
+
+def _report(reporter, latitude, longitude, severity=DisasterSeverity.MEDIUM, **fields):
+    report = DisasterReport(title='Flood', description='Water rising', location='Here', severity=severity,
+                            latitude=latitude, longitude=longitude, reporter_id=reporter.id, **fields)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def _resource(location, quantity=10, resource_type='medical', **fields):
+    resource = Resource(name='Kit', resource_type=resource_type, quantity=quantity, location=location, **fields)
+    db.session.add(resource)
+    db.session.commit()
+    return resource
+
+
+def test_min_cost_flow_serves_the_most_valuable_demand():
+    # one supplier with 3 units; the near consumer is worth less than the far one
+    flows = min_cost_flow([3], [2, 2], [2000, 5000], [(0, 0, 100), (0, 1, 900)])
+    assert flows == [1, 2]
+
+    # two suppliers, cross edges: the cheapest way to fill both consumers
+    flows = min_cost_flow([2, 2], [2, 2], [3000, 3000], [(0, 0, 10), (0, 1, 20), (1, 0, 15), (1, 1, 50)])
+    assert flows == [0, 2, 2, 0]
+
+    # nothing is sent where transport costs more than the demand is worth
+    assert min_cost_flow([5], [5], [100], [(0, 0, 200)]) == [0]
+
+
+def test_greedy_fallback_and_solver_choice():
+    # greedy gives the shared supplier to the first consumer and leaves the other short
+    problem = ([1, 1], [1, 1], [2000, 2000], [(0, 0, 1), (0, 1, 2), (1, 0, 100)])
+    assert greedy_flow(*problem) == [1, 0, 0]
+    assert min_cost_flow(*problem) == [0, 1, 1]
+
+    # both reports want resource 2; the high severity one gets what it needs first
+    severities = {10: DisasterSeverity.HIGH, 11: DisasterSeverity.MEDIUM}
+    rows = {10: [(1.0, 1), (2.0, 2)], 11: [(1.5, 2)]}
+    exact = ResourceAllocator(distance_matrix).solve('medical', {1: 2, 2: 2}, severities, rows)
+    greedy = ResourceAllocator(distance_matrix, exact_limit=0).solve('medical', {1: 2, 2: 2}, severities, rows)
+
+    assert exact.solver in ('scipy', 'min_cost_flow') and greedy.solver in ('scipy', 'greedy')
+    assert (exact.demand, exact.allocated, exact.shortages) == (5, 4, [(11, 'medium', 2, 1)])
+    assert {(a.resource_id, a.report_id, a.quantity) for a in exact.allocations} == {(1, 10, 2), (2, 10, 1), (2, 11, 1)}
+    assert greedy.allocations == exact.allocations
+
+
+@pytest.mark.skipif(allocation.linprog is None or allocation.np is None, reason='needs scipy and numpy')
+def test_scipy_solver_matches_min_cost_flow():
+    rng = random.Random(5)
+    supply = [rng.randint(0, 6) for _ in range(6)]
+    demand = [rng.randint(1, 5) for _ in range(10)]
+    penalty = [rng.choice([2000, 3000, 4000, 5000]) for _ in range(10)]
+    edges = [(i, j, rng.randint(0, 1000)) for i in range(6) for j in range(10) if rng.random() < 0.5]
+
+    def cost(flows):
+        return sum((c - penalty[j]) * units for (_, j, c), units in zip(edges, flows))
+
+    assert cost(allocation._linprog_flow(supply, demand, penalty, edges)) == cost(min_cost_flow(supply, demand, penalty, edges))
+
+
+def test_distance_matrix_updates_match_a_fresh_load(make_user):
+    citizen = make_user()
+    reports = [_report(citizen, 12.9 + n / 100, 77.5 + n / 100) for n in range(6)]
+    resources = [_resource(f'{12.9 + n / 50},{77.5 + n / 50}') for n in range(4)]
+    _resource('13.0,77.6', resource_type='food')
+    distance_matrix.neighbours = 2
+    distance_matrix.snapshot('medical')
+
+    _resource('12.93,77.53')
+    _resource('12.95,77.55', quantity=0)
+    resources[0].location = '12.95,77.55'
+    resources[1].availability = 'exhausted'
+    reports[2].status = ReportStatus.RESOLVED
+    reports[3].severity = DisasterSeverity.CRITICAL
+    db.session.delete(resources[2])
+    db.session.commit()
+    _report(citizen, 12.97, 77.57)
+    updated = distance_matrix.snapshot('medical')
+
+    distance_matrix.invalidate()
+    assert distance_matrix.snapshot('medical') == updated
+    severities, rows = updated
+    assert reports[2].id not in severities and severities[reports[3].id] == DisasterSeverity.CRITICAL
+    assert all(len(row) == 2 for row in rows.values())
+
+
+def test_allocation_endpoint(client, make_user, login):
+    citizen = make_user()
+    critical = _report(citizen, 12.99, 77.69, DisasterSeverity.CRITICAL)
+    low = _report(citizen, 12.97, 77.59, DisasterSeverity.LOW)
+    _report(citizen, 12.97, 77.59, status=ReportStatus.RESOLVED)
+    kits = _resource('12.97,77.59', quantity=5)
+    _resource('Central depot', quantity=50)  # no position, not allocated
+    _resource('13.5,78.5', quantity=50, resource_type='food')  # ~125 km from everything
+    login(make_user(role=UserRole.ADMIN))
+
+    plans = client.get('/api/admin/resources/allocation?type=medical,food').get_json()['plans']
+
+    food, medical = plans
+    assert (food['resource_type'], food['allocated'], food['demand']) == ('food', 0, 6)
+    assert {(a['resource_id'], a['report_id'], a['quantity']) for a in medical['allocations']} == {
+        (kits.id, critical.id, 5)
+    }
+    assert medical['shortages'] == [
+        {'report_id': low.id, 'severity': 'low', 'demand': 1, 'allocated': 0}
+    ]
+
+    kits.quantity = 10
+    db.session.commit()
+    medical = client.get('/api/admin/resources/allocation').get_json()['plans'][-1]
+    assert (medical['supply'], medical['demand'], medical['allocated'], medical['shortages']) == (60, 6, 6, [])
@@ -0,0 +1,143 @@
+"""
+Batch volunteer assignment: global matching, dry runs and the solvers.
+"""
+import random
+
+import pytest
+
+import assignment
+from assignment import AssignmentSolver, Report, Volunteer, hungarian, parse_location
+from models import db, DisasterReport, DisasterSeverity, ReportStatus, TaskStatus, UserRole, VolunteerTask
+
+
+def _report(reporter, latitude, longitude, **fields):
+    report = DisasterReport(title='Flood', description=f'Water at {latitude},{longitude}', location='Here',
+                            latitude=latitude, longitude=longitude, reporter_id=reporter.id, **fields)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def test_parse_location():
+    assert parse_location('12.97, 77.59') == (12.97, 77.59)
+    assert parse_location('Bangalore') == (None, None)
+    assert parse_location('95,10') == (None, None)
+    assert parse_location(None) == (None, None)
+
+
+def test_hungarian_finds_the_global_minimum():
+    # greedy would take the 1 and then be forced into the 10
+    assert hungarian([[1, 2], [2, 10]]) == [1, 0]
+    assert hungarian([[4, 1, 3], [2, 0, 5]]) == [1, 0]
+
+
+def test_solvers_agree_on_small_problems():
+    rng = random.Random(7)
+    volunteers = [Volunteer(i, 12.9 + rng.random() / 10, 77.5 + rng.random() / 10, rng.randrange(3)) for i in range(8)]
+    reports = [Report(100 + i, 12.9 + rng.random() / 10, 77.5 + rng.random() / 10,
+                      rng.choice(list(DisasterSeverity))) for i in range(12)]
+
+    exact = AssignmentSolver().solve(volunteers, reports)
+    greedy = AssignmentSolver(exact_limit=0).solve(volunteers, reports)
+
+    assert (exact.solver, greedy.solver) == ('hungarian', 'greedy')
+    assert len(exact.assignments) == len(greedy.assignments) == 8
+    assert sum(a.cost for a in exact.assignments) <= sum(a.cost for a in greedy.assignments) + 1e-9
+    assert len({a.volunteer_id for a in exact.assignments}) == 8
+
+
+def test_scarce_volunteers_go_to_severe_reports_within_range():
+    volunteers = [Volunteer(1, 12.97, 77.59, 0)]
+    reports = [
+        Report(10, 12.97, 77.59, DisasterSeverity.LOW),
+        Report(11, 12.99, 77.61, DisasterSeverity.CRITICAL),
+        Report(12, 28.61, 77.21, DisasterSeverity.CRITICAL),  # ~1700 km away
+    ]
+
+    plan = AssignmentSolver().solve(volunteers, reports)
+
+    assert [(a.report_id, a.volunteer_id) for a in plan.assignments] == [(11, 1)]
+    assert plan.unassigned_report_ids == [10, 12]
+
+
+def test_batch_endpoint_dry_run_then_assigns_in_one_go(client, make_user, login):
+    citizen = make_user()
+    near = make_user(role=UserRole.VOLUNTEER, location='12.97,77.59')
+    far = make_user(role=UserRole.VOLUNTEER, location='13.10,77.70')
+    busy = make_user(role=UserRole.VOLUNTEER, location='12.97,77.59')
+    make_user(role=UserRole.VOLUNTEER, location='12.97,77.59', is_active=False)
+    covered = _report(citizen, 12.5, 77.0)
+    for _ in range(3):
+        db.session.add(VolunteerTask(volunteer_id=busy.id, report_id=covered.id, task_description='x'))
+    first = _report(citizen, 12.971, 77.591)
+    second = _report(citizen, 13.09, 77.69)
+    _report(citizen, 12.97, 77.59, status=ReportStatus.RESOLVED)
+    login(make_user(role=UserRole.ADMIN))
+
+    available = client.get('/api/admin/volunteers?available=1').get_json()
+    assert [v['id'] for v in available['volunteers']] == [near.id, far.id]
+
+    dry = client.post('/api/admin/assignments/batch', json={'dry_run': True})
+    assert dry.status_code == 200
+    plan = dry.get_json()
+    assert {(a['report_id'], a['volunteer_id']) for a in plan['assignments']} == {(first.id, near.id), (second.id, far.id)}
+    assert VolunteerTask.query.count() == 3
+
+    response = client.post('/api/admin/assignments/batch', json={'task_description': 'Check on residents'})
+    assert response.status_code == 201
+    data = response.get_json()
+    assert all('task_id' in a for a in data['assignments'])
+    assert data['skipped_report_ids'] == []
+    tasks = VolunteerTask.query.filter(VolunteerTask.report_id.in_([first.id, second.id])).all()
+    assert {(t.report_id, t.volunteer_id, t.status) for t in tasks} == {
+        (first.id, near.id, TaskStatus.ASSIGNED), (second.id, far.id, TaskStatus.ASSIGNED)
+    }
+
+    again = client.post('/api/admin/assignments/batch', json={}).get_json()
+    assert again['assignments'] == []
+    assert client.post('/api/admin/assignments/batch', json={'report_ids': 'all'}).status_code == 400
+
+
+def test_batch_skips_reports_and_volunteers_taken_since_planning(client, make_user, login, monkeypatch):
+    citizen = make_user()
+    near = make_user(role=UserRole.VOLUNTEER, location='12.97,77.59')
+    far = make_user(role=UserRole.VOLUNTEER, location='13.10,77.70')
+    first = _report(citizen, 12.971, 77.591)
+    second = _report(citizen, 13.09, 77.69)
+    other = _report(citizen, 11.0, 76.0)
+    login(make_user(role=UserRole.ADMIN))
+    plan = assignment.assignment_solver.plan
+
+    def plan_then_race(report_ids=None):
+        made = plan(report_ids)
+        # committed by other requests between planning and applying
+        client.post(f'/api/admin/reports/{first.id}/assign', json={'volunteer_id': far.id, 'task_description': 'x'})
+        for _ in range(2):
+            client.post(f'/api/admin/reports/{other.id}/assign', json={'volunteer_id': far.id, 'task_description': 'x'})
+        return made
+
+    monkeypatch.setattr(assignment.assignment_solver, 'plan', plan_then_race)
+    data = client.post('/api/admin/assignments/batch', json={}).get_json()
+
+    assert data['assignments'] == []
+    assert sorted(data['skipped_report_ids']) == [first.id, second.id]  # covered; volunteer now at the limit
+    assert VolunteerTask.query.filter_by(volunteer_id=near.id).count() == 0
+    assert VolunteerTask.query.filter_by(volunteer_id=far.id).count() == 3
+
+
+@pytest.mark.skipif(assignment.linear_sum_assignment is None or assignment.np is None, reason='needs scipy and numpy')
+def test_scipy_solver_matches_hungarian():
+    rng = random.Random(3)
+    volunteers = [Volunteer(i, 12.9 + rng.random() / 10, 77.5 + rng.random() / 10, rng.randrange(3)) for i in range(6)]
+    reports = [Report(100 + i, 12.9 + rng.random() / 10, 77.5 + rng.random() / 10, DisasterSeverity.HIGH) for i in range(6)]
+
+    plan = AssignmentSolver().solve(volunteers, reports)
+    scipy_solver = assignment.linear_sum_assignment
+    try:
+        assignment.linear_sum_assignment = None
+        exact = AssignmentSolver().solve(volunteers, reports)
+    finally:
+        assignment.linear_sum_assignment = scipy_solver
+
+    assert plan.solver == 'scipy'
+    assert sum(a.cost for a in plan.assignments) == pytest.approx(sum(a.cost for a in exact.assignments), abs=1e-3)
@@ -0,0 +1,87 @@
+"""
+Bulk admin operations: set-based status changes and volunteer assignment.
+"""
+from models import db, DisasterReport, DisasterSeverity, ReportStatus, TaskStatus, UserRole, VolunteerTask
+from stats import stats_cache
+
+
+def _reports(reporter, count, **fields):
+    reports = [
+        DisasterReport(title=f'Report {n}', description='Details', location='Here', reporter_id=reporter.id, **fields)
+        for n in range(count)
+    ]
+    db.session.add_all(reports)
+    db.session.commit()
+    return reports
+
+
+def test_bulk_status_in_one_update(client, make_user, login, count_queries):
+    citizen = make_user()
+    pending = _reports(citizen, 3)
+    resolved = _reports(citizen, 1, status=ReportStatus.RESOLVED)[0]
+    login(make_user(role=UserRole.ADMIN))
+    assert stats_cache.counts('reports') == {'pending': 3, 'resolved': 1}
+
+    ids = [pending[0].id, resolved.id, 999, pending[1].id]
+    with count_queries() as statements:
+        body = client.post('/api/admin/reports/bulk/resolve', json={'report_ids': ids}).get_json()
+
+    assert len([s for s in statements if s.lstrip().upper().startswith('UPDATE')]) == 1
+    assert body['updated'] == 2
+    assert body['results'] == [
+        {'id': ids[0], 'result': 'updated'}, {'id': ids[1], 'result': 'unchanged'},
+        {'id': 999, 'result': 'not_found'}, {'id': ids[3], 'result': 'updated'},
+    ]
+    assert db.session.get(DisasterReport, pending[0].id).resolved_at is not None
+    # the cached counters follow the recorded changes
+    assert stats_cache.counts('reports') == {'pending': 1, 'resolved': 3}
+
+    # reopening by filter clears resolved_at
+    body = client.post('/api/admin/reports/bulk/status', json={
+        'status': 'in_progress', 'filter': {'status': 'resolved'}
+    }).get_json()
+    assert body['updated'] == 3
+    assert db.session.query(DisasterReport).filter(DisasterReport.resolved_at.isnot(None)).count() == 0
+
+    assert client.post('/api/admin/reports/bulk/status', json={'status': 'bogus', 'report_ids': ids}).status_code == 400
+    assert client.post('/api/admin/reports/bulk/resolve', json={}).status_code == 400
+    assert client.post('/api/admin/reports/bulk/resolve', json={'filter': {'colour': 'red'}}).status_code == 400
+    client.application.config['BULK_ADMIN_MAX_REPORTS'] = 2
+    response = client.post('/api/admin/reports/bulk/resolve', json={'filter': {'status': 'in_progress'}})
+    assert response.status_code == 400 and 'narrow' in response.get_json()['error']
+
+
+def test_single_status_change_stamps_resolved_at(client, make_user, login):
+    report = _reports(make_user(), 1)[0]
+    login(make_user(role=UserRole.ADMIN))
+
+    body = client.patch(f'/api/admin/reports/{report.id}/status', json={'status': 'resolved'}).get_json()
+    assert body['resolved_at'] is not None
+    body = client.patch(f'/api/admin/reports/{report.id}/status', json={'status': 'pending'}).get_json()
+    assert body['resolved_at'] is None
+
+
+def test_bulk_assign_skips_open_tasks(client, make_user, login):
+    citizen = make_user()
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    high = _reports(citizen, 3, severity=DisasterSeverity.HIGH)
+    _reports(citizen, 2, severity=DisasterSeverity.LOW)
+    db.session.add(VolunteerTask(volunteer_id=volunteer.id, report_id=high[0].id, task_description='Earlier'))
+    db.session.commit()
+    login(make_user(role=UserRole.ADMIN))
+
+    response = client.post('/api/admin/reports/bulk/assign', json={
+        'volunteer_id': volunteer.id, 'task_description': 'Sandbags', 'filter': {'severity': ['high', 'critical']}
+    })
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['assigned'] == 2
+    assert [r['result'] for r in body['results']] == ['already_assigned', 'assigned', 'assigned']
+    tasks = VolunteerTask.query.filter_by(task_description='Sandbags').all()
+    assert {(t.id, t.report_id) for t in tasks} == {(r['task_id'], r['id']) for r in body['results'][1:]}
+    assert all(t.status == TaskStatus.ASSIGNED for t in tasks)
+
+    assert client.post('/api/admin/reports/bulk/assign', json={
+        'volunteer_id': citizen.id, 'task_description': 'x', 'report_ids': [high[1].id]
+    }).status_code == 400
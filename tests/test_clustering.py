@@ -0,0 +1,123 @@
+"""
+Near-duplicate reports are clustered as they are inserted.
+"""
+from datetime import datetime, timedelta, timezone
+
+from clustering import cluster_index, signature, similarity
+from models import db, DisasterReport, ReportCluster, ReportStatus, UserRole
+
+
+def _report(reporter, title, description, latitude=12.9716, longitude=77.5946, location='MG Road', **fields):
+    report = DisasterReport(
+        title=title, description=description, location=location,
+        latitude=latitude, longitude=longitude, reporter_id=reporter.id, **fields
+    )
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def test_signature_similarity_tracks_text_overlap():
+    first = signature('Building fire', 'Smoke from the third floor of the mall')
+    assert similarity(first, signature('Building fire', 'Smoke from the third floor of the mall')) == 1.0
+    assert similarity(first, signature('Building fire!', 'smoke from third floor of the mall')) >= 0.5
+    assert similarity(first, signature('Road blocked', 'Tree fell across both lanes')) < 0.2
+    assert signature('', '...') is None
+
+
+def test_duplicates_join_one_cluster_and_others_start_their_own(make_user):
+    citizen = make_user()
+
+    first = _report(citizen, 'Building fire', 'Smoke from the third floor of City Mall')
+    duplicate = _report(citizen, 'Building fire', 'Smoke coming from the third floor of City Mall',
+                        latitude=12.9720, longitude=77.5950)
+    other_text = _report(citizen, 'Road blocked', 'A tree fell across both lanes')
+    far_away = _report(citizen, 'Building fire', 'Smoke from the third floor of City Mall',
+                       latitude=13.2, longitude=77.8)
+    much_later = _report(citizen, 'Building fire', 'Smoke from the third floor of City Mall',
+                         created_at=datetime.now(timezone.utc) + timedelta(days=2))
+
+    assert first.cluster_id is not None
+    assert duplicate.cluster_id == first.cluster_id
+    assert len({first.cluster_id, other_text.cluster_id, far_away.cluster_id, much_later.cluster_id}) == 4
+    assert db.session.get(ReportCluster, first.cluster_id).report_count == 2
+
+
+def test_clusters_survive_a_cold_index_and_rollbacks(make_user):
+    citizen = make_user()
+    first = _report(citizen, 'Flooded underpass', 'Water two feet deep under the railway bridge',
+                    latitude=None, longitude=None)
+
+    db.session.add(DisasterReport(
+        title='Flooded underpass', description='Water two feet deep under the railway bridge',
+        location='MG Road', reporter_id=citizen.id
+    ))
+    db.session.flush()
+    db.session.rollback()
+
+    cluster_index.clear()  # as after a restart: the bucket is loaded from the database
+    second = _report(citizen, 'Flooded underpass', 'Water is two feet deep under the railway bridge',
+                     latitude=None, longitude=None, location='  mg road ')
+
+    assert second.cluster_id == first.cluster_id
+    assert db.session.get(ReportCluster, first.cluster_id).report_count == 2
+
+
+def test_admin_listing_export_and_collapsed_view(client, make_user, login):
+    citizen = make_user()
+    for n in range(3):
+        _report(citizen, 'Building fire', f'Smoke from the third floor of City Mall {"!" * n}')
+    lone = _report(citizen, 'Road blocked', 'A tree fell across both lanes', status=ReportStatus.RESOLVED)
+    login(make_user(role=UserRole.ADMIN))
+
+    reports = client.get('/api/admin/reports').get_json()['reports']
+    assert [r['cluster_size'] for r in reports] == [1, 3, 3, 3]
+
+    data = client.get('/api/admin/reports?collapse=cluster').get_json()
+    assert data['total'] == 2
+    assert [c['report_count'] for c in data['clusters']] == [1, 3]
+    assert data['clusters'][0]['latest_report']['id'] == lone.id
+
+    pending = client.get('/api/admin/reports?collapse=cluster&status=pending').get_json()
+    assert [c['report_count'] for c in pending['clusters']] == [3]
+    assert pending['clusters'][0]['latest_report']['id'] == reports[1]['id']
+
+    rows = client.get('/api/admin/reports/export?format=ndjson').get_data(as_text=True).splitlines()
+    assert '"cluster_size": 3' in rows[1]
+
+
+def test_collapsed_view_lists_unclustered_reports_on_their_own(client, make_user, login, monkeypatch,
+                                                               count_queries):
+    citizen = make_user()
+    monkeypatch.setattr(cluster_index, 'enabled', False)
+    legacy = [_report(citizen, 'Flood', f'Water rising in block {n}') for n in range(2)]
+    monkeypatch.setattr(cluster_index, 'enabled', True)
+    for n in range(2):
+        _report(citizen, 'Building fire', f'Smoke from the third floor of City Mall {"!" * n}')
+    login(make_user(role=UserRole.ADMIN))
+
+    first = client.get('/api/admin/reports?collapse=cluster&per_page=2').get_json()
+    with count_queries() as statements:
+        second = client.get(f'/api/admin/reports?collapse=cluster&per_page=2&cursor={first["next_cursor"]}')
+    second = second.get_json()
+
+    assert first['total'] == second['total'] == 3
+    assert [c['report_count'] for c in first['clusters']] == [2, 1]
+    assert first['clusters'][1]['id'] is None
+    assert [c['latest_report']['id'] for c in first['clusters'][1:] + second['clusters']] == \
+        [legacy[1].id, legacy[0].id]
+    assert second['next_cursor'] is None
+    assert not [s for s in statements if 'count(' in s.lower()]  # the total is cached
+
+
+def test_bulk_ingest_clusters_within_and_across_batches(app, client, make_user, login):
+    app.config['BULK_INGEST_BATCH_SIZE'] = 2
+    login(make_user())
+    row = {'title': 'Gas leak', 'description': 'Strong smell of gas near the school gate',
+           'location': 'Station Road', 'latitude': 12.95, 'longitude': 77.6}
+
+    ids = client.post('/api/citizen/reports/bulk', json=[row] * 5).get_json()['ids']
+
+    cluster_ids = {db.session.get(DisasterReport, report_id).cluster_id for report_id in ids}
+    assert len(cluster_ids) == 1
+    assert db.session.get(ReportCluster, cluster_ids.pop()).report_count == 5
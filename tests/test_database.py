@@ -0,0 +1,99 @@
+"""
+SQLite tuning: connection pragmas and the group-committing write queue.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+from database import write_queue
+from models import db, DisasterReport
+
+
+def test_sqlite_connections_are_tuned(app):
+    pragma = lambda name: db.session.execute(text(f'PRAGMA {name}')).scalar()
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('busy_timeout') == 5000
+    assert pragma('cache_size') == -64 * 1024
+    assert write_queue.enabled
+
+
+def _report_job(title, fail=False):
+    def job(session):
+        if fail:
+            raise ValueError(title)
+        report = DisasterReport(title=title, description='d', location='l', reporter_id=1)
+        session.add(report)
+        session.flush()
+        return report.id
+    return job
+
+
+def test_waiting_jobs_commit_together_and_fail_alone(app, make_user, count_queries):
+    make_user()
+    release = threading.Event()
+
+    def blocker(session):
+        release.wait(5)
+        return 'first'
+
+    with count_queries() as statements, ThreadPoolExecutor(8) as pool:
+        first = pool.submit(write_queue.run, blocker)
+        # wait until the writer is busy with the first job, then queue more behind it
+        while not any('BEGIN IMMEDIATE' in s for s in statements):
+            time.sleep(0.001)
+        jobs = [_report_job(f'Report {n}', fail=(n == 2)) for n in range(5)]
+        futures = [pool.submit(write_queue.run, job) for job in jobs]
+        while write_queue._jobs.qsize() < len(jobs):
+            time.sleep(0.001)
+        release.set()
+
+        assert first.result() == 'first'
+        ids = [f.result() for n, f in enumerate(futures) if n != 2]
+        with pytest.raises(ValueError, match='Report 2'):
+            futures[2].result()
+
+    # the first job, the batch of five (rolled back), then each job on its own
+    assert sum('BEGIN IMMEDIATE' in s for s in statements) == 1 + 1 + 5
+    assert sorted(r.id for r in DisasterReport.query.all()) == sorted(ids)
+
+
+def test_submitted_report_is_committed_by_the_writer(client, make_user, login):
+    login(make_user())
+    response = client.post('/api/citizen/reports', json={
+        'title': 'Flood', 'description': 'Water rising', 'location': 'Riverside'
+    })
+
+    assert response.status_code == 201
+    report = response.get_json()['report']
+    assert report['reporter']['name'] == 'User 1'
+    assert db.session.get(DisasterReport, report['id']).title == 'Flood'
+
+
+def test_jobs_still_queued_after_the_timeout_are_cancelled(client, make_user, login, monkeypatch):
+    login(make_user())
+    monkeypatch.setattr(write_queue, 'timeout', 0.2)
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(session):
+        started.set()
+        release.wait(5)
+        return 'first'
+
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(write_queue.run, blocker)
+        started.wait(5)
+        response = client.post('/api/citizen/reports', json={
+            'title': 'Flood', 'description': 'Water rising', 'location': 'Riverside'
+        })
+        release.set()
+        # still running when its wait ran out: waited for rather than failed
+        assert first.result() == 'first'
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    write_queue.run(lambda session: None)  # the writer is past the cancelled job
+    assert DisasterReport.query.count() == 0
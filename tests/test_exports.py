@@ -0,0 +1,119 @@
+"""
+Streaming report export: formats, filters and incremental exports.
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+from models import db, UserRole, DisasterReport, VolunteerTask, ReportStatus, DisasterSeverity
+
+
+def _seed(make_user):
+    citizen = make_user()
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    base = datetime(2026, 1, 1, 12, 0)
+    for i, (severity, status) in enumerate([
+        (DisasterSeverity.LOW, ReportStatus.PENDING),
+        (DisasterSeverity.HIGH, ReportStatus.IN_PROGRESS),
+        (DisasterSeverity.CRITICAL, ReportStatus.RESOLVED),
+    ]):
+        report = DisasterReport(
+            title=f'Report {i}', description='Flooding', location='Riverside',
+            severity=severity, status=status, reporter_id=citizen.id,
+            created_at=base + timedelta(days=i), updated_at=base + timedelta(days=i),
+        )
+        db.session.add(report)
+        db.session.flush()
+        for _ in range(i):
+            db.session.add(VolunteerTask(volunteer_id=volunteer.id, report_id=report.id, task_description='Help'))
+    db.session.commit()
+
+
+def test_csv_export_keeps_legacy_layout(client, make_user, login):
+    _seed(make_user)
+    login(make_user(role=UserRole.ADMIN))
+
+    response = client.get('/api/admin/reports/export')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:3] == ['ID', 'Title', 'Description']
+    assert [r[1] for r in rows[1:]] == ['Report 2', 'Report 1', 'Report 0']
+    assert [r[11] for r in rows[1:]] == ['2', '1', '0']
+    assert rows[1][14] == 'Not resolved'
+
+
+def test_ndjson_export_filters(client, make_user, login):
+    _seed(make_user)
+    login(make_user(role=UserRole.ADMIN))
+
+    response = client.get('/api/admin/reports/export?format=ndjson&severity=high,critical&start=2026-01-02')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['title'] for line in lines] == ['Report 2', 'Report 1']
+
+    response = client.get('/api/admin/reports/export?format=ndjson&status=pending')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['status'] for line in lines] == ['pending']
+
+    assert client.get('/api/admin/reports/export?status=bogus').status_code == 400
+    assert client.get('/api/admin/reports/export?start=yesterday').status_code == 400
+    assert client.get('/api/admin/reports/export?format=xml').status_code == 400
+
+
+def test_columnar_export_is_gzipped_on_request(client, make_user, login, app):
+    _seed(make_user)
+    login(make_user(role=UserRole.ADMIN))
+    app.config['EXPORT_CHUNK_SIZE'] = 2
+
+    response = client.get('/api/admin/reports/export?format=columnar', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    columns = json.loads(lines[0])['columns']
+    chunks = [json.loads(line) for line in lines[1:]]
+    assert len(chunks) == 2
+    ids = [i for chunk in chunks for i in chunk[columns.index('id')]]
+    assert len(ids) == 3
+
+
+def _titles(response):
+    return [json.loads(line)['title'] for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_incremental_export_since_watermark(app, client, make_user, login):
+    _seed(make_user)
+    login(make_user(role=UserRole.ADMIN))
+
+    first = client.get('/api/admin/reports/export?format=ndjson&since=2026-01-01T12:00:00')
+    assert _titles(first) == ['Report 1', 'Report 2']
+    watermark = first.headers['X-Export-Watermark']
+    assert watermark == '2026-01-03T12:00:00'
+
+    report = DisasterReport.query.filter_by(title='Report 0').one()
+    report.status = ReportStatus.ACKNOWLEDGED
+    db.session.commit()
+
+    second = client.get(f'/api/admin/reports/export?format=ndjson&since={watermark}')
+    assert _titles(second) == ['Report 0']
+    # held back behind the clock: a transaction flushed before this export but committed after it
+    held_back = second.headers['X-Export-Watermark']
+    assert datetime.fromisoformat(held_back) < report.updated_at
+    late = DisasterReport(
+        title='Late', description='Flooding', location='Riverside', reporter_id=report.reporter_id,
+        updated_at=datetime.fromisoformat(held_back) + timedelta(seconds=1),
+    )
+    db.session.add(late)
+    db.session.commit()
+
+    third = client.get(f'/api/admin/reports/export?format=ndjson&since={held_back}')
+    assert _titles(third) == ['Late', 'Report 0']
+
+    # nothing changed since: an empty export that hands the same watermark back
+    app.config['EXPORT_WATERMARK_LAG'] = 0
+    latest = client.get(f'/api/admin/reports/export?format=ndjson&since={held_back}').headers['X-Export-Watermark']
+    fourth = client.get(f'/api/admin/reports/export?format=ndjson&since={latest}')
+    assert fourth.get_data(as_text=True) == ''
+    assert fourth.headers['X-Export-Watermark'] == latest
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Cached Flask-Login identities and their invalidation.
+"""
+import pytest
+
+from identity import SessionUser, identity_cache
+from models import db, User, UserRole
+
+
+def _user_queries(statements):
+    return [s for s in statements if 'FROM users' in s]
+
+
+def test_authenticated_requests_skip_the_users_table(client, make_user, login, count_queries):
+    login(make_user(role=UserRole.VOLUNTEER))
+    client.get('/api/auth/me')
+
+    with count_queries() as statements:
+        response = client.get('/api/auth/me')
+        client.get('/api/volunteer/tasks')
+
+    assert response.get_json()['role'] == 'volunteer'
+    assert _user_queries(statements) == []
+
+
+def test_role_and_active_changes_apply_on_the_next_request(client, make_user, login):
+    user = make_user(role=UserRole.ADMIN)
+    login(user)
+    assert client.get('/api/admin/dashboard').status_code == 200
+
+    user = db.session.get(User, user.id)
+    user.role = UserRole.CITIZEN
+    db.session.commit()
+    assert client.get('/api/admin/dashboard').status_code == 403
+
+    user = db.session.get(User, user.id)
+    user.is_active = False
+    db.session.commit()
+    assert client.get('/api/auth/me').status_code == 401
+
+
+def test_password_change_drops_the_cached_identity(app, make_user):
+    user = make_user()
+    cached = identity_cache.get(user.id)
+    assert identity_cache.get(user.id) is cached
+
+    user.set_password('new password')
+    db.session.commit()
+
+    assert identity_cache.get(user.id) is not cached
+
+
+def test_session_user_is_read_only(make_user):
+    identity = identity_cache.get(make_user().id)
+
+    assert isinstance(identity, SessionUser)
+    with pytest.raises(AttributeError):
+        identity.role = UserRole.ADMIN
@@ -0,0 +1,71 @@
+"""
+Bulk report ingestion: batched inserts, per-row errors, ids in input order.
+"""
+import json
+
+import geo
+from models import db, DisasterReport, ReportStatus, DisasterSeverity
+
+
+def _row(n, **fields):
+    return dict({'title': f'Flood {n}', 'description': 'Water rising', 'location': 'Riverside'}, **fields)
+
+
+def test_json_array_inserts_valid_rows_in_order(app, client, make_user, login):
+    app.config['BULK_INGEST_BATCH_SIZE'] = 2
+    citizen = make_user()
+    login(citizen)
+    client.get('/api/public/statistics')  # warm the statistics cache
+
+    rows = [
+        _row(0, latitude=12.5, longitude=77.25, severity='high'),
+        _row(1, title=''),
+        _row(2),
+        'not an object',
+        _row(4, latitude=95, longitude=0),
+        _row(5, severity='CRITICAL'),
+    ]
+    response = client.post('/api/citizen/reports/bulk', json=rows)
+
+    assert response.status_code == 207
+    data = response.get_json()
+    assert data['inserted'] == 3
+    assert [e['row'] for e in data['errors']] == [1, 3, 4]
+    assert data['errors'][0]['error'] == 'title is required'
+    ids = data['ids']
+    assert [i is None for i in ids] == [False, True, False, True, True, False]
+    assert ids[0] < ids[2] < ids[5]
+
+    first = db.session.get(DisasterReport, ids[0])
+    assert first.title == 'Flood 0'
+    assert first.reporter_id == citizen.id
+    assert first.status == ReportStatus.PENDING
+    assert first.severity == DisasterSeverity.HIGH
+    assert first.geohash == geo.encode(12.5, 77.25)
+    assert db.session.get(DisasterReport, ids[5]).severity == DisasterSeverity.CRITICAL
+
+    stats = client.get('/api/public/statistics').get_json()
+    assert stats['disaster_stats']['total_reports'] == 3
+
+
+def test_ndjson_stream_reports_bad_lines_and_row_limit(app, client, make_user, login):
+    app.config['BULK_INGEST_MAX_ROWS'] = 3
+    login(make_user())
+
+    body = '\n'.join([json.dumps(_row(0)), '{not json', '', json.dumps(_row(2)), json.dumps(_row(3))]) + '\n'
+    response = client.post('/api/citizen/reports/bulk', data=body, content_type='application/x-ndjson')
+
+    data = response.get_json()
+    assert data['inserted'] == 2
+    assert data['errors'][0] == {'row': 1, 'error': 'invalid JSON'}
+    assert data['errors'][1]['row'] == 3
+    assert DisasterReport.query.count() == 2
+
+
+def test_rejects_non_array_and_oversized_bodies(app, client, make_user, login):
+    app.config['BULK_INGEST_MAX_ROWS'] = 2
+    login(make_user())
+
+    assert client.post('/api/citizen/reports/bulk', json={'title': 'x'}).status_code == 400
+    assert client.post('/api/citizen/reports/bulk', json=[_row(n) for n in range(3)]).status_code == 413
+    assert client.post('/api/citizen/reports/bulk', json=[_row(0), _row(1)]).status_code == 201
@@ -0,0 +1,77 @@
+"""
+Request and SQL metrics: the Prometheus endpoint and the timing headers.
+"""
+import re
+
+from metrics import Histogram, render
+from models import UserRole
+
+
+def _sample(text, name, **labels):
+    wanted = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf'^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_histograms_render_cumulative_buckets():
+    histogram = Histogram('request_seconds', 'Request time.', (0.1, 1.0), ('endpoint',))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'api.home')
+
+    assert render([histogram]).splitlines() == [
+        '# HELP request_seconds Request time.',
+        '# TYPE request_seconds histogram',
+        'request_seconds_bucket{endpoint="api.home",le="0.1"} 2',
+        'request_seconds_bucket{endpoint="api.home",le="1.0"} 3',
+        'request_seconds_bucket{endpoint="api.home",le="+Inf"} 4',
+        'request_seconds_sum{endpoint="api.home"} 3.65',
+        'request_seconds_count{endpoint="api.home"} 4',
+    ]
+
+
+def test_requests_and_their_sql_are_counted_per_endpoint(client, make_user, login):
+    login(make_user(role=UserRole.ADMIN))
+    for _ in range(2):
+        assert client.get('/api/admin/alerts').status_code == 200
+    assert client.get('/api/admin/reports/999').status_code == 404
+
+    response = client.get('/api/admin/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    alerts = {'endpoint': 'admin.alerts', 'method': 'GET', 'status': '200'}
+    assert _sample(text, 'http_request_duration_seconds_count', **alerts) == 2
+    assert _sample(text, 'http_request_db_queries_count', **alerts) == 2
+    assert _sample(text, 'http_request_db_queries_sum', **alerts) >= 2
+    assert _sample(text, 'http_response_size_bytes_count', **alerts) == 2
+    assert _sample(text, 'http_request_duration_seconds_count',
+                   endpoint='admin.get_report', method='GET', status='404') == 1
+    assert _sample(text, 'db_queries_total', database='primary') > 0
+    assert _sample(text, 'db_pool_checkout_wait_seconds_count', database='primary') > 0
+
+
+def test_metrics_need_an_admin_or_the_token(app, client, make_user, login):
+    assert client.get('/api/admin/metrics').status_code == 401
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/api/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/api/admin/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+
+    login(make_user())
+    assert client.get('/api/admin/metrics').status_code == 403
+
+
+def test_timing_headers_report_the_request_sql(app, client, make_user, login, count_queries):
+    login(make_user(role=UserRole.ADMIN))
+    client.get('/api/admin/alerts')
+    assert 'X-DB-Queries' not in client.get('/api/admin/alerts').headers
+
+    app.config['METRICS_TIMING_HEADERS'] = True
+    with count_queries() as statements:
+        response = client.get('/api/admin/alerts')
+
+    assert int(response.headers['X-DB-Queries']) == len(statements)
+    assert re.fullmatch(
+        rf'db;dur=[\d.]+;desc="{len(statements)} queries", pool;dur=[\d.]+, app;dur=[\d.]+',
+        response.headers['Server-Timing']
+    )
@@ -0,0 +1,112 @@
+"""
+Versioned migrations and the EXPLAIN report.
+"""
+import threading
+
+from sqlalchemy import inspect, text
+
+import geo
+import migrations
+from models import db, UserRole, DisasterReport
+from search import search_index
+from query_plans import explain_endpoints, explain_statement
+
+
+def _make_legacy_schema():
+    """Tables as they were before geohash and the composite indexes"""
+    db.drop_all()
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE disaster_reports ('
+            'id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, description TEXT NOT NULL, '
+            'location VARCHAR(255) NOT NULL, latitude FLOAT, longitude FLOAT, severity VARCHAR(8), '
+            'status VARCHAR(11), reporter_id INTEGER NOT NULL, image_url VARCHAR(500), '
+            'created_at DATETIME, updated_at DATETIME, resolved_at DATETIME)'
+        ))
+        conn.execute(text('CREATE INDEX ix_disaster_reports_created_at ON disaster_reports (created_at)'))
+        conn.execute(text(
+            "INSERT INTO disaster_reports (title, description, location, latitude, longitude, status, reporter_id) "
+            "VALUES ('Flood', 'Water rising', 'Riverside', 28.6139, 77.209, 'PENDING', 1)"
+        ))
+
+
+def test_upgrade_adds_columns_and_indexes_in_place(app):
+    _make_legacy_schema()
+
+    applied = migrations.upgrade()
+
+    assert [m.version for m in applied] == [m.version for m in migrations.MIGRATIONS]
+    inspector = inspect(db.engine)
+    assert {'geohash', 'cluster_id'} <= {c['name'] for c in inspector.get_columns('disaster_reports')}
+    assert {'report_clusters', 'alert_deliveries'} <= set(inspector.get_table_names())
+    assert {name for name, table, _ in migrations.COMPOSITE_INDEXES if table == 'disaster_reports'} \
+        <= {i['name'] for i in inspector.get_indexes('disaster_reports')}
+    assert 'ix_volunteer_tasks_volunteer_id_status_assigned_at' in \
+        {i['name'] for i in inspector.get_indexes('volunteer_tasks')}
+
+    report = db.session.query(DisasterReport).one()
+    assert report.geohash == geo.encode(28.6139, 77.209)
+    # rows that predate the search index are indexed by the migration
+    assert [hit.id for hit in search_index.search('riverside').hits] == [report.id]
+    assert migrations.upgrade() == []
+
+
+def test_upgrade_stamps_a_database_created_from_the_models(app):
+    assert migrations.pending_migrations() == migrations.MIGRATIONS
+
+    migrations.upgrade()
+
+    assert migrations.applied_versions() == {m.version for m in migrations.MIGRATIONS}
+
+
+def test_concurrent_upgrades_of_a_fresh_database_apply_each_migration_once(app):
+    db.drop_all()
+    start = threading.Barrier(8)
+    results, errors = [], []
+
+    def upgrade():
+        with app.app_context():
+            start.wait()
+            try:
+                results.append(migrations.upgrade())
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=upgrade) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(len(applied) for applied in results) == [0] * 7 + [len(migrations.MIGRATIONS)]
+    with db.engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM schema_migrations')).scalar() == len(migrations.MIGRATIONS)
+
+
+def test_status_filter_uses_composite_index(app):
+    plan = explain_statement(
+        'SELECT id FROM disaster_reports WHERE status = ? ORDER BY created_at DESC', ('PENDING',)
+    )
+
+    assert plan.indexes == ['ix_disaster_reports_status_created_at']
+    assert plan.full_scans == []
+
+
+def test_explain_endpoints_covers_roles_with_users(app, make_user):
+    make_user(role=UserRole.VOLUNTEER)
+
+    results = dict(explain_endpoints(app))
+
+    assert results['/api/citizen/reports'] is None
+    task_plans = results['/api/volunteer/tasks?status=assigned']
+    assert any('ix_volunteer_tasks_volunteer_id_status_assigned_at' in p.indexes for p in task_plans)
+    assert any('ix_alerts_is_broadcast_created_at' in p.indexes for p in results['/api/public/alerts'])
+
+
+def test_db_cli_status_and_upgrade(app):
+    runner = app.test_cli_runner()
+
+    assert 'pending' in runner.invoke(args=['db', 'status']).output
+    assert 'Applied 0001 baseline' in runner.invoke(args=['db', 'upgrade']).output
+    assert 'pending' not in runner.invoke(args=['db', 'status']).output
@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination of report and task listings.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, UserRole, DisasterReport, VolunteerTask
+from pagination import decode_cursor, encode_cursor, InvalidCursor
+
+
+def _reports(reporter, count, same_timestamp=False):
+    base = datetime(2024, 1, 1)
+    reports = [
+        DisasterReport(
+            title=f'Report {i}', description='Water rising', location='Riverside',
+            reporter_id=reporter.id,
+            created_at=base if same_timestamp else base + timedelta(minutes=i)
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(reports)
+    db.session.commit()
+    return reports
+
+
+def _walk(client, url, key, direction='next_cursor', cursor=None):
+    """Titles/ids page by page following one cursor direction"""
+    pages = []
+    while True:
+        data = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        pages.append([item['id'] for item in data[key]])
+        cursor = data[direction]
+        if not cursor:
+            return pages, data
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    token = encode_cursor(datetime(2024, 1, 1, 12, 30), 42, 'next')
+    assert decode_cursor(token) == (datetime(2024, 1, 1, 12, 30), 42, 'next')
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not-a-cursor')
+
+
+def test_admin_reports_walk_forward_and_back_without_gaps(client, make_user, login):
+    reports = _reports(make_user(), 7, same_timestamp=True)
+    login(make_user(role=UserRole.ADMIN))
+
+    pages, last = _walk(client, '/api/admin/reports?per_page=3', 'reports')
+    newest_first = [r.id for r in sorted(reports, key=lambda r: r.id, reverse=True)]
+    assert pages == [newest_first[0:3], newest_first[3:6], newest_first[6:7]]
+    assert last['total'] == 7
+
+    # walking back from the last page mirrors the forward walk
+    back, _ = _walk(client, '/api/admin/reports?per_page=3', 'reports', 'prev_cursor', last['prev_cursor'])
+    assert back == [newest_first[3:6], newest_first[0:3]]
+
+
+def test_admin_reports_legacy_page_param_still_offsets(client, make_user, login):
+    _reports(make_user(), 5)
+    login(make_user(role=UserRole.ADMIN))
+
+    data = client.get('/api/admin/reports?page=2&per_page=2').get_json()
+    assert data['current_page'] == 2 and data['pages'] == 3 and data['total'] == 5
+    assert [r['title'] for r in data['reports']] == ['Report 2', 'Report 1']
+
+
+def test_invalid_cursor_and_status_are_rejected(client, make_user, login):
+    login(make_user(role=UserRole.ADMIN))
+
+    assert client.get('/api/admin/reports?cursor=garbage').status_code == 400
+    assert client.get('/api/admin/reports?status=unknown').status_code == 400
+
+
+def test_citizen_total_is_cached_and_dropped_on_own_writes(app, client, make_user, login, count_queries):
+    citizen = make_user()
+    _reports(citizen, 3)
+    login(citizen)
+
+    assert client.get('/api/citizen/reports').get_json()['total'] == 3
+    with count_queries() as statements:
+        client.get('/api/citizen/reports')
+    assert not any('count(' in s.lower() for s in statements)
+
+    client.post('/api/citizen/reports', json={
+        'title': 'Storm', 'description': 'Roof damage', 'location': 'Town', 'severity': 'high'
+    })
+    assert client.get('/api/citizen/reports').get_json()['total'] == 4
+
+
+def test_volunteer_tasks_page_by_cursor(client, make_user, login):
+    report = _reports(make_user(), 1)[0]
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    base = datetime(2024, 1, 1)
+    db.session.add_all([
+        VolunteerTask(volunteer_id=volunteer.id, report_id=report.id,
+                      task_description=f'Task {i}', assigned_at=base + timedelta(hours=i))
+        for i in range(5)
+    ])
+    db.session.commit()
+    login(volunteer)
+
+    pages, last = _walk(client, '/api/volunteer/tasks?per_page=2', 'tasks')
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted(sum(pages, []), reverse=True)
+    assert last['total'] == 5
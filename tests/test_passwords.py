@@ -0,0 +1,59 @@
+"""
+Pooled password hashing, backpressure and rehash on login.
+"""
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from passwords import PasswordHasher, hasher
+
+
+@pytest.fixture
+def pooled_hasher(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+    hasher.init_app(app)
+    yield hasher
+    app.config.update(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_MAX_PENDING=None)
+    hasher.init_app(app)
+
+
+def test_pool_hashes_and_verifies_in_a_worker_process(pooled_hasher):
+    pwhash = pooled_hasher.hash('correct horse')
+
+    assert pwhash.startswith('scrypt:')
+    assert pooled_hasher.verify(pwhash, 'correct horse')
+    assert not pooled_hasher.verify(pwhash, 'wrong')
+
+
+def test_signup_is_shed_with_503_when_the_pool_is_full(client, pooled_hasher):
+    pooled_hasher._slots.acquire()  # the one slot is taken by another request
+    try:
+        response = client.post('/api/auth/signup', json={
+            'name': 'Asha', 'email': 'asha@example.com', 'password': 'secret'
+        })
+    finally:
+        pooled_hasher._slots.release()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert User.query.filter_by(email='asha@example.com').first() is None
+
+
+def test_login_rehashes_passwords_made_with_old_parameters(client, make_user):
+    user = make_user()
+    user.password_hash = generate_password_hash('password', method='pbkdf2:sha256:1000')
+    db.session.commit()
+
+    response = client.post('/api/auth/login', json={'email': user.email, 'password': 'password'})
+
+    assert response.status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash.startswith('scrypt:32768:8:1$')
+    assert user.check_password('password')
+
+
+def test_needs_rehash_compares_full_parameters():
+    cheap = PasswordHasher(method='scrypt:16384:8:1')
+
+    assert cheap.needs_rehash(generate_password_hash('x', method='scrypt'))
+    assert not cheap.needs_rehash(cheap.hash('x'))
@@ -0,0 +1,89 @@
+"""
+Listing endpoints must run a fixed number of SQL statements per request, none of them repeated (N+1).
+"""
+from models import db, UserRole, DisasterReport, VolunteerTask, ReportStatus
+from response_cache import response_cache
+
+
+def _seed_reports(make_user, count, tasks_per_report=2):
+    volunteers = [make_user(role=UserRole.VOLUNTEER) for _ in range(3)]
+    citizens = [make_user() for _ in range(4)]
+
+    for i in range(count):
+        report = DisasterReport(
+            title=f'Report {i}',
+            description='Water rising',
+            location='Riverside',
+            reporter_id=citizens[i % len(citizens)].id,
+        )
+        db.session.add(report)
+        db.session.flush()
+        for j in range(tasks_per_report):
+            db.session.add(VolunteerTask(
+                volunteer_id=volunteers[(i + j) % len(volunteers)].id,
+                report_id=report.id,
+                task_description='Evacuate',
+            ))
+    db.session.commit()
+    return volunteers, citizens
+
+
+def _get_within(client, query_budget, url, max_queries):
+    """GET `url` within `max_queries` statements, each shape run once (no N+1)"""
+    # The first request of an app also runs the database initialization hook
+    client.get(url)
+    db.session.expunge_all()
+    with query_budget(max_queries, max_repeats=1) as profile:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), profile
+
+
+def test_admin_report_listing_statement_count_is_constant(client, make_user, login, query_budget):
+    _seed_reports(make_user, 30)
+    login(make_user(role=UserRole.ADMIN))
+
+    # at most count + page (with reporter joined) + tasks (with volunteer joined);
+    # the session user comes from the identity cache
+    small, small_profile = _get_within(client, query_budget, '/api/admin/reports?per_page=5', 4)
+    large, large_profile = _get_within(client, query_budget, '/api/admin/reports?per_page=30', 4)
+
+    assert len(small['reports']) == 5
+    assert len(large['reports']) == 30
+    assert all(len(r['volunteer_tasks']) == 2 for r in large['reports'])
+    assert all(t['volunteer'] for r in large['reports'] for t in r['volunteer_tasks'])
+    assert small_profile.count == large_profile.count
+
+
+def test_public_disasters_statement_count_is_constant(client, make_user, query_budget, monkeypatch):
+    monkeypatch.setattr(response_cache, 'enabled', False)
+    _seed_reports(make_user, 25, tasks_per_report=0)
+
+    data, _ = _get_within(client, query_budget, '/api/public/disasters', 1)
+
+    assert data['total'] == 25
+    assert all(d['reporter'] for d in data['disasters'])
+
+
+def test_volunteer_task_listing_statement_count_is_constant(client, make_user, login, query_budget):
+    volunteers, _ = _seed_reports(make_user, 12)
+    login(volunteers[0])
+
+    # at most count + tasks (with volunteer joined)
+    data, _ = _get_within(client, query_budget, '/api/volunteer/tasks', 2)
+
+    assert data['total'] == 8
+    assert all(t['volunteer']['id'] == volunteers[0].id for t in data['tasks'])
+
+
+def test_citizen_dashboard_statement_count_is_constant(client, make_user, login, query_budget):
+    _, citizens = _seed_reports(make_user, 20, tasks_per_report=0)
+    db.session.query(DisasterReport).update({DisasterReport.status: ReportStatus.IN_PROGRESS})
+    db.session.commit()
+    login(citizens[0])
+
+    # user loader + my reports + active reports + alerts
+    data, _ = _get_within(client, query_budget, '/api/citizen/dashboard', 4)
+
+    assert len(data['my_reports']) == 5
+    assert len(data['active_disasters']) == 10
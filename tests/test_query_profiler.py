@@ -0,0 +1,80 @@
+"""
+N+1 and slow query detection, and the query_budget fixture.
+"""
+import logging
+
+import pytest
+
+from models import db, UserRole, DisasterReport
+from query_profiler import QueryProfile, normalize, query_profiler
+
+
+def _reports_by_different_citizens(make_user, count=4):
+    for citizen in [make_user() for _ in range(count)]:
+        db.session.add(DisasterReport(
+            title='Flood', description='Water rising', location='Riverside', reporter_id=citizen.id
+        ))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def _serialize_lazily():
+    # to_dict() loads each reporter on its own: an N+1
+    return [r.to_dict() for r in DisasterReport.query.all()]
+
+
+def test_statements_with_different_values_have_one_shape():
+    assert normalize("SELECT *\n  FROM users WHERE id = 3 AND name = 'Ann'") == \
+        'SELECT * FROM users WHERE id = ? AND name = ?'
+    assert normalize('SELECT * FROM users WHERE id IN (?, ?, ?)') == \
+        normalize('SELECT * FROM users WHERE id IN (%(id_1)s, %(id_2)s)') == \
+        'SELECT * FROM users WHERE id IN (?, ...)'
+    assert normalize('SELECT anon_1.id FROM t LIMIT ? OFFSET ?') == 'SELECT anon_1.id FROM t LIMIT ? OFFSET ?'
+
+
+def test_lazy_loads_in_a_loop_are_repeated_shapes_with_their_source_line(app, make_user):
+    _reports_by_different_citizens(make_user)
+
+    with QueryProfile.capture(db.engine) as profile:
+        _serialize_lazily()
+
+    assert profile.count == 5
+    [repeated] = profile.repeated(3)
+    assert repeated.count == 4
+    assert 'FROM users WHERE users.id = ?' in repeated.sql
+    assert repeated.source.startswith('backend/models.py:') and repeated.source.endswith(' in to_dict')
+
+
+def test_requests_log_repeated_and_slow_queries(app, client, make_user, caplog):
+    app.config.update(QUERY_PROFILER=True, QUERY_PROFILER_SLOW_MS=0)
+    query_profiler.init_app(app)
+    app.add_url_rule('/test/reports', 'test_reports', lambda: {'reports': _serialize_lazily()})
+    client.get('/api/public/statistics')  # the one-time database initialization
+    _reports_by_different_citizens(make_user)
+    caplog.clear()
+
+    with caplog.at_level(logging.WARNING, logger='query_profiler'):
+        assert client.get('/test/reports?page=1').status_code == 200
+
+    messages = [r.getMessage() for r in caplog.records if r.name == 'query_profiler']
+    [repeated] = [m for m in messages if m.startswith('Repeated query')]
+    assert repeated.startswith('Repeated query at GET /test/reports?page=1 (test_reports): 4x')
+    assert 'from backend/models.py:' in repeated and 'in to_dict' in repeated
+    [listing] = [m for m in messages if m.startswith('Slow query') and 'FROM disaster_reports' in m]
+    assert 'from tests/test_query_profiler.py:' in listing and 'SCAN disaster_reports' in listing
+
+
+def test_query_budget_fails_an_endpoint_over_budget(client, make_user, login, query_budget):
+    _reports_by_different_citizens(make_user, count=6)
+    login(make_user(role=UserRole.ADMIN))
+    client.get('/api/admin/reports')
+
+    with query_budget(4, max_repeats=1):
+        assert client.get('/api/admin/reports').status_code == 200
+
+    with pytest.raises(pytest.fail.Exception, match='statements, budget 1'):
+        with query_budget(1):
+            client.get('/api/admin/reports')
+    with pytest.raises(pytest.fail.Exception, match=r'6x the same query from backend/models.py:\d+ in to_dict'):
+        with query_budget(20, max_repeats=1):
+            _serialize_lazily()
@@ -0,0 +1,109 @@
+"""
+Socket.IO push of alerts, report changes and task assignments.
+"""
+import pytest
+
+from app import socketio
+from models import db, UserRole, DisasterReport, ReportStatus
+from realtime import broadcaster
+
+
+@pytest.fixture
+def emitted(app, monkeypatch):
+    """Events emitted by the broadcaster as (event, payload, rooms)"""
+    events = []
+    # tests flush explicitly instead of waiting for the coalescing window
+    monkeypatch.setattr(broadcaster, '_ensure_flusher', lambda: None)
+    monkeypatch.setattr(socketio, 'emit', lambda event, payload, to=None: events.append((event, payload, to)))
+    broadcaster.flush()
+    return events
+
+
+def _rooms_of(socket_client):
+    rooms = socketio.server.manager.rooms['/']
+    # every client also sits in a room named after its own sid; leave that out
+    return {room for room, members in rooms.items()
+            if room and socket_client.eio_sid in members.values() and room not in members}
+
+
+def _report(reporter):
+    report = DisasterReport(title='Fire', description='Smoke', location='Hill', reporter_id=reporter.id)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def test_connections_join_public_user_and_role_rooms(app, client, make_user, login):
+    anonymous = socketio.test_client(app, flask_test_client=app.test_client())
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    login(volunteer)
+    authenticated = socketio.test_client(app, flask_test_client=client)
+
+    assert 'public' in _rooms_of(anonymous)
+    assert {'public', f'user:{volunteer.id}', 'role:volunteer'} <= _rooms_of(authenticated)
+
+
+def test_config_tells_clients_to_connect(client):
+    assert client.get('/api/public/config').get_json() == {'realtime': True}
+
+
+def test_broadcast_alert_goes_to_public_room(client, make_user, login, emitted):
+    login(make_user(role=UserRole.ADMIN))
+
+    response = client.post('/api/admin/alerts', json={'title': 'Flood', 'message': 'Move uphill'})
+    assert response.status_code == 201
+    broadcaster.flush()
+
+    assert [(e, p['title'], rooms) for e, p, rooms in emitted] == [('alert:created', 'Flood', ['public'])]
+
+
+def test_status_change_burst_is_coalesced_per_report(make_user, emitted):
+    citizen = make_user()
+    report = _report(citizen)
+    broadcaster.flush()
+    emitted.clear()
+
+    for status in (ReportStatus.ACKNOWLEDGED, ReportStatus.IN_PROGRESS):
+        report = db.session.get(DisasterReport, report.id)
+        report.status = status
+        db.session.commit()
+    broadcaster.flush()
+
+    assert len(emitted) == 1
+    event, payload, rooms = emitted[0]
+    assert event == 'report:updated'
+    assert payload['id'] == report.id and payload['status'] == 'in_progress'
+    assert 'description' not in payload
+    assert set(rooms) == {'public', f'report:{report.id}', f'user:{citizen.id}', 'role:admin'}
+
+
+def test_task_assignment_goes_to_volunteer_and_report_rooms(client, make_user, login, emitted):
+    report = _report(make_user())
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    login(make_user(role=UserRole.ADMIN))
+    broadcaster.flush()
+    emitted.clear()
+
+    client.post(f'/api/admin/reports/{report.id}/assign',
+                json={'volunteer_id': volunteer.id, 'task_description': 'Evacuate'})
+    broadcaster.flush()
+
+    (event, payload, rooms), = emitted
+    assert event == 'task:assigned'
+    assert payload['volunteer_id'] == volunteer.id and payload['status'] == 'assigned'
+    assert set(rooms) == {f'user:{volunteer.id}', f'report:{report.id}', 'role:admin'}
+
+
+def test_report_subscription_requires_access(app, client, make_user, login):
+    owner = make_user()
+    report = _report(owner)
+
+    login(make_user())
+    stranger_socket = socketio.test_client(app, flask_test_client=client)
+    assert stranger_socket.emit('subscribe', {'report_id': report.id}, callback=True) == {'error': 'Unauthorized'}
+
+    owner_client = app.test_client()
+    owner_client.post('/api/auth/login', json={'email': owner.email, 'password': 'password'})
+    owner_socket = socketio.test_client(app, flask_test_client=owner_client)
+    assert owner_socket.emit('subscribe', {'report_id': report.id}, callback=True) == {'subscribed': f'report:{report.id}'}
+    assert f'report:{report.id}' in _rooms_of(owner_socket)
@@ -0,0 +1,103 @@
+"""
+Replica routing, with two SQLite files standing in for the primary and a replica.
+"""
+import sqlite3
+
+import pytest
+
+from models import db, Alert, UserRole
+from replicas import STICKY_KEY, replica_router
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    """A copy of the primary as it is now, serving GET requests"""
+    path = tmp_path / 'replica.db'
+
+    def start(*extra_urls):
+        db.session.commit()
+        source = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///'))
+        with sqlite3.connect(path) as target:
+            source.backup(target)
+        source.close()
+        app.config['DATABASE_REPLICA_URLS'] = ','.join([*extra_urls, f'sqlite:///{path}'])
+        replica_router.init_app(app)
+
+    yield start
+    app.config['DATABASE_REPLICA_URLS'] = ''
+    replica_router.init_app(app)
+
+
+def _titles(client):
+    return [a['title'] for a in client.get('/api/admin/alerts').get_json()['alerts']]
+
+
+def _forget_writes(client):
+    with client.session_transaction() as session:
+        session.pop(STICKY_KEY, None)
+
+
+def test_reads_go_to_the_replica_until_the_client_writes(client, make_user, login, replica):
+    login(make_user(role=UserRole.ADMIN))
+    db.session.add(Alert(title='Replicated', message='On both'))
+    replica()
+    db.session.add(Alert(title='Not replicated yet', message='Primary only'))
+    db.session.commit()
+    _forget_writes(client)
+
+    assert _titles(client) == ['Replicated']
+
+    assert client.post('/api/admin/alerts', json={'title': 'Mine', 'message': 'New'}).status_code == 201
+    # right after writing, this client reads its own writes from the primary
+    assert set(_titles(client)) == {'Replicated', 'Not replicated yet', 'Mine'}
+
+    _forget_writes(client)
+    assert _titles(client) == ['Replicated']
+
+
+def test_writes_and_locking_reads_stay_on_the_primary(app, make_user, login, client, replica):
+    login(make_user(role=UserRole.ADMIN))
+    replica()
+    _forget_writes(client)
+
+    with app.test_request_context('/api/admin/alerts', method='GET'):
+        assert db.session.get_bind(clause=db.select(Alert)) is replica_router.engines[0]
+        with replica_router.primary():
+            assert db.session.get_bind(clause=db.select(Alert)) is db.engine
+        assert db.session.get_bind(clause=db.select(Alert).with_for_update()) is db.engine
+        assert db.session.get_bind(clause=db.update(Alert)) is db.engine
+        # once the session has written, its reads follow it to the primary
+        assert db.session.get_bind(clause=db.select(Alert)) is db.engine
+        db.session.rollback()
+    with app.test_request_context('/api/admin/alerts', method='POST'):
+        assert db.session.get_bind(clause=db.select(Alert)) is db.engine
+    # outside a request (CLI, worker threads) everything uses the primary
+    assert db.session.get_bind(clause=db.select(Alert)) is db.engine
+
+
+def test_shared_response_cache_is_filled_from_the_primary(app, client, make_user, login, replica):
+    login(make_user(role=UserRole.ADMIN))
+    replica()
+    other = app.test_client()
+    assert other.get('/api/public/alerts').get_json()['alerts'] == []
+
+    assert client.post('/api/admin/alerts', json={'title': 'Mine', 'message': 'New'}).status_code == 201
+    # another client misses the cache first; what it stores must not come from the lagging replica
+    assert [a['title'] for a in other.get('/api/public/alerts').get_json()['alerts']] == ['Mine']
+    assert [a['title'] for a in client.get('/api/public/alerts').get_json()['alerts']] == ['Mine']
+
+
+def test_unhealthy_replicas_are_skipped(app, client, make_user, login, replica, tmp_path):
+    login(make_user(role=UserRole.ADMIN))
+    db.session.add(Alert(title='Replicated', message='On both'))
+    replica(f"sqlite:///{tmp_path / 'missing' / 'down.db'}")
+    _forget_writes(client)
+
+    healthy = replica_router.engines[1]
+    for _ in range(3):
+        assert _titles(client) == ['Replicated']
+    assert replica_router.read_engine() is healthy
+
+    replica_router.engines = replica_router.engines[:1]
+    assert replica_router.read_engine() is None
+    assert client.get('/api/admin/alerts').status_code == 200  # served by the primary
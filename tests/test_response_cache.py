@@ -0,0 +1,82 @@
+"""
+Public endpoint response cache: ETags, 304s and commit-driven invalidation.
+"""
+from models import db, DisasterReport, Alert, Resource
+from response_cache import MemoryBackend, ResponseCache, response_cache
+
+
+def test_etag_revalidation_skips_database(client, count_queries):
+    first = client.get('/api/public/alerts')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'public, max-age=5'
+
+    with count_queries() as statements:
+        second = client.get('/api/public/alerts', headers={'If-None-Match': etag})
+
+    assert second.status_code == 304
+    assert second.get_data() == b''
+    assert [s for s in statements if 'alerts' in s] == []
+
+
+def test_commit_invalidates_only_matching_tags(client, make_user):
+    resources_etag = client.get('/api/public/resources').headers['ETag']
+    alerts_etag = client.get('/api/public/alerts').headers['ETag']
+
+    db.session.add(Alert(title='Flood', message='Move uphill', is_broadcast=True))
+    db.session.commit()
+
+    resources = client.get('/api/public/resources', headers={'If-None-Match': resources_etag})
+    alerts = client.get('/api/public/alerts', headers={'If-None-Match': alerts_etag})
+    assert resources.status_code == 304
+    assert alerts.status_code == 200
+    assert alerts.get_json()['total'] == 1
+
+
+def test_cache_key_includes_query_args(client):
+    db.session.add_all([
+        Resource(name='Water', resource_type='food'),
+        Resource(name='Ambulance', resource_type='transport'),
+    ])
+    db.session.commit()
+
+    assert client.get('/api/public/resources').get_json()['total'] == 2
+    assert client.get('/api/public/resources?type=food').get_json()['total'] == 1
+
+
+def test_reporter_update_invalidates_disasters(client, make_user):
+    citizen = make_user(name='Asha')
+    db.session.add(DisasterReport(title='Fire', description='Smoke', location='Hill', reporter_id=citizen.id))
+    db.session.commit()
+    assert client.get('/api/public/disasters').get_json()['disasters'][0]['reporter']['name'] == 'Asha'
+
+    citizen.name = 'Asha K'
+    db.session.commit()
+
+    assert client.get('/api/public/disasters').get_json()['disasters'][0]['reporter']['name'] == 'Asha K'
+
+
+def test_workers_sharing_a_backend_agree(app):
+    shared = MemoryBackend()
+    worker_a, worker_b = ResponseCache(shared), ResponseCache(shared)
+    calls = []
+
+    def view():
+        calls.append(1)
+        return {'value': len(calls)}
+
+    with app.test_request_context('/api/public/alerts'):
+        body_a = worker_a.serve(view, ('alerts',), (), {}).get_data()
+        body_b = worker_b.serve(view, ('alerts',), (), {}).get_data()
+        assert body_a == body_b and len(calls) == 1
+
+        worker_a.invalidate('alerts')
+        worker_b.serve(view, ('alerts',), (), {})
+        assert len(calls) == 2
+
+
+def test_disabled_cache_passes_through(client, app):
+    response_cache.enabled = False
+    try:
+        assert 'ETag' not in client.get('/api/public/alerts').headers
+    finally:
+        response_cache.enabled = True
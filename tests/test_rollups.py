@@ -0,0 +1,125 @@
+"""
+Analytics rollups: sketch accuracy, incremental maintenance vs backfill, and the endpoints.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import rollups
+from models import (
+    db, DisasterReport, DisasterSeverity, LatencyRollup, ReportRollup, ReportStatus, UserRole, VolunteerTask
+)
+from rollups import LatencySketch
+
+START = datetime(2026, 3, 1, 8, 30)
+
+
+def _rollup_rows():
+    rows = {}
+    for model, count in ((ReportRollup, 'report_count'), (LatencyRollup, 'sample_count')):
+        table = model.__table__
+        key = [c for c in table.c if c.primary_key]
+        rows[model.__tablename__] = {
+            tuple(row[:-1]): row[-1]
+            for row in db.session.execute(select(*key, table.c[count])) if row[-1]
+        }
+    return rows
+
+
+def test_sketch_quantiles_are_within_accuracy_and_merge():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(7, 1.5) + 1 for _ in range(5000)]
+    halves = LatencySketch(), LatencySketch()
+    for n, value in enumerate(values):
+        halves[n % 2].add(value)
+    merged = LatencySketch().merge(halves[0]).merge(halves[1])
+
+    whole = LatencySketch()
+    for value in values:
+        whole.add(value)
+    assert merged.bins == whole.bins and merged.count == 5000
+
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(merged.quantile(q) - exact) / exact <= rollups.SKETCH_ACCURACY + 1e-9
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_incremental_rollups_match_a_backfill(client, make_user, login):
+    citizen = make_user()
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    reports = []
+    for n in range(6):
+        report = DisasterReport(
+            title='Flood', description='Water rising', location='Here', reporter_id=citizen.id,
+            latitude=12.97 + n, longitude=77.59, severity=list(DisasterSeverity)[n % 4],
+            created_at=START + timedelta(minutes=50 * n)
+        )
+        reports.append(report)
+    db.session.add_all(reports)
+    db.session.commit()
+
+    login(make_user(role=UserRole.ADMIN))
+    client.patch(f'/api/admin/reports/{reports[0].id}/status', json={'status': 'acknowledged'})
+    client.post('/api/admin/reports/bulk/resolve', json={'report_ids': [reports[0].id, reports[1].id]})
+    client.patch(f'/api/admin/reports/{reports[1].id}/status', json={'status': 'in_progress'})  # reopened
+    reports[2].severity = DisasterSeverity.CRITICAL
+    reports[3].latitude = None
+    db.session.commit()
+    db.session.delete(reports[4])
+    db.session.commit()
+
+    client.post(f'/api/admin/reports/{reports[0].id}/assign',
+                json={'volunteer_id': volunteer.id, 'task_description': 'Help'})
+    task = VolunteerTask.query.one()
+    task.started_at = task.assigned_at + timedelta(minutes=20)
+    task.completed_at = task.started_at + timedelta(hours=2)
+    db.session.commit()
+
+    incremental = _rollup_rows()
+    with db.engine.begin() as conn:
+        rollups.backfill(conn)
+    assert _rollup_rows() == incremental
+    assert sum(n for key, n in incremental['report_rollups'].items() if key[0] == 'day') == 5
+    metrics = {key[2] for key in incremental['latency_rollups']}
+    assert metrics == {'acknowledge', 'resolve', 'task_start', 'task_complete'}
+
+    # a partial backfill leaves earlier days alone and rebuilds the rest identically
+    with db.engine.begin() as conn:
+        rollups.backfill(conn, since=START + timedelta(days=1))
+    assert _rollup_rows() == incremental
+
+
+def test_analytics_endpoints_read_only_rollups(client, make_user, login, count_queries):
+    citizen = make_user()
+    reports = [
+        DisasterReport(title='Fire', description='Smoke', location='Here', reporter_id=citizen.id,
+                       severity=DisasterSeverity.HIGH, created_at=START + timedelta(hours=n % 2))
+        for n in range(4)
+    ]
+    db.session.add_all(reports)
+    db.session.commit()
+    for n, report in enumerate(reports):
+        report.status = ReportStatus.RESOLVED
+        report.resolved_at = report.created_at + timedelta(minutes=10 * (n + 1))
+    db.session.commit()
+    login(make_user(role=UserRole.ADMIN))
+    window = 'since=2026-03-01T00:00:00&until=2026-03-02T00:00:00'
+
+    with count_queries() as statements:
+        hourly = client.get(f'/api/admin/analytics/reports?granularity=hour&group_by=status&{window}').get_json()
+        latency = client.get(f'/api/admin/analytics/latency?metric=resolve&severity=high&{window}').get_json()
+
+    assert not [s for s in statements if 'disaster_reports' in s or 'volunteer_tasks' in s]
+    assert hourly['series'] == [
+        {'bucket': '2026-03-01T08:00:00', 'status': 'resolved', 'count': 2},
+        {'bucket': '2026-03-01T09:00:00', 'status': 'resolved', 'count': 2},
+    ]
+    assert latency['overall']['count'] == 4
+    assert abs(latency['overall']['p50'] - 1200) <= 12  # 10, 20, 30, 40 minutes
+    assert [b['count'] for b in latency['buckets']] == [4]
+
+    assert client.get('/api/admin/analytics/latency?metric=sleep').status_code == 400
+    assert client.get('/api/admin/analytics/reports?granularity=week').status_code == 400
@@ -0,0 +1,95 @@
+"""
+Full-text search: the FTS5 and in-memory backends and the search endpoints.
+"""
+import pytest
+from sqlalchemy import update
+
+from models import db, Alert, DisasterReport, ReportStatus, Resource, UserRole
+from search import search_index
+
+
+@pytest.fixture(params=['auto', 'memory'])
+def backend(request, app):
+    app.config['SEARCH_BACKEND'] = request.param
+    search_index.init_app(app)
+    yield request.param
+    app.config['SEARCH_BACKEND'] = 'auto'
+    search_index.init_app(app)
+
+
+def _report(reporter, title, description='Details to follow', location='Riverside', **fields):
+    report = DisasterReport(title=title, description=description, location=location,
+                            reporter_id=reporter.id, **fields)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def _found(q, **kwargs):
+    return [(hit.kind, hit.id) for hit in search_index.search(q, **kwargs).hits]
+
+
+def test_ranks_matches_across_models(app, make_user, backend):
+    citizen = make_user()
+    in_description = _report(citizen, 'Road blocked', 'Flood water over the bridge')
+    in_title = _report(citizen, 'Flood near school')
+    alert = Alert(title='Evacuate', message='Flood warning for the valley')
+    boats = Resource(name='Rescue boats', resource_type='flood')
+    db.session.add_all([alert, boats])
+    db.session.commit()
+
+    assert search_index.backend().name == ('fts5' if backend == 'auto' else 'memory')
+    found = _found('flood')
+    assert len(found) == 4 and found[0] == ('reports', in_title.id)
+    assert _found('FLO school') == [('reports', in_title.id)]
+    assert _found('rescue', kinds=('alerts',)) == []
+    assert _found('"bridge*: (-') == [('reports', in_description.id)]
+
+    page = search_index.search('flood', page=2, per_page=3)
+    assert page.total == 4 and [(h.kind, h.id) for h in page.hits] == found[3:]
+
+
+def test_index_follows_writes(app, make_user, backend):
+    citizen = make_user()
+    report = _report(citizen, 'Landslide on highway')
+    other = _report(citizen, 'Landslide near farm')
+    assert _found('landslide highway') == [('reports', report.id)]
+
+    report.title = 'Cleared road'
+    report.location = 'Hill station'
+    db.session.commit()
+    assert _found('landslide') == [('reports', other.id)]
+    assert _found('hill cleared') == [('reports', report.id)]
+
+    db.session.delete(other)
+    db.session.commit()
+    assert _found('landslide') == []
+
+    # set-based writes bypass the unit of work and are indexed all the same
+    db.session.execute(update(DisasterReport).values(description='Mudslide reported'))
+    db.session.commit()
+    assert _found('mudslide') == [('reports', report.id)]
+
+
+def test_search_endpoints(client, make_user, login):
+    citizen = make_user()
+    active = _report(citizen, 'Fire in market', status=ReportStatus.IN_PROGRESS)
+    _report(citizen, 'Fire at depot', status=ReportStatus.RESOLVED)
+    db.session.add(Resource(name='Fire extinguishers', resource_type='equipment'))
+    db.session.commit()
+
+    public = client.get('/api/public/search?q=fire').get_json()
+    assert [(r['type'], r['id']) for r in public['results']] == [('reports', active.id)]
+    assert public['results'][0]['item']['title'] == 'Fire in market'
+    assert client.get('/api/public/search').status_code == 400
+
+    assert client.get('/api/admin/search?q=fire').status_code == 401
+    login(make_user(role=UserRole.ADMIN))
+    body = client.get('/api/admin/search?q=fire&per_page=2').get_json()
+    assert (body['total'], body['pages'], len(body['results'])) == (3, 2, 2)
+    second = client.get('/api/admin/search?q=fire&per_page=2&page=2').get_json()
+    assert {r['id'] for r in body['results'] + second['results']} >= {active.id}
+
+    resources = client.get('/api/admin/search?q=fire&type=resources').get_json()
+    assert [r['item']['name'] for r in resources['results']] == ['Fire extinguishers']
+    assert client.get('/api/admin/search?q=fire&type=users').status_code == 400
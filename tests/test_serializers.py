@@ -0,0 +1,67 @@
+"""
+Row-tuple serializers: byte-for-byte parity with to_dict() encoded by Flask.
+"""
+import pytest
+
+import serializers
+from models import db, Alert, DisasterReport, DisasterSeverity, ReportStatus, Resource
+from queries import report_query
+from serializers import ALERT_PLAN, REPORT_PLAN, RESOURCE_PLAN
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson' and serializers.orjson is None:
+        pytest.skip('orjson is not installed')
+    if request.param == 'stdlib':
+        monkeypatch.setattr(serializers, 'orjson', None)
+    return request.param
+
+
+def _seed(make_user):
+    citizen = make_user(name='Zoë Ödegaard', phone='+91 98765', location='Pune')
+    db.session.add_all([
+        DisasterReport(title='Flood', description='Water "rising" \\ fast', location='Riverside',
+                       latitude=12.971599, longitude=77.594566, severity=DisasterSeverity.CRITICAL,
+                       reporter_id=citizen.id, image_url='http://img/1.png'),
+        DisasterReport(title='Fire ☲', description='Smoke\nseen', location='Market',
+                       status=ReportStatus.RESOLVED, reporter_id=citizen.id),
+        Alert(title='Evacuate', message='Move to higher ground', is_broadcast=True),
+        Resource(name='Boats', resource_type='transport', quantity=4, location='Depot'),
+    ])
+    db.session.commit()
+
+
+def test_plans_match_to_dict_byte_for_byte(app, make_user, encoder):
+    _seed(make_user)
+
+    def flask_bytes(data):
+        return app.json.response(data).get_data()
+
+    reports = report_query('list').order_by(DisasterReport.id).all()
+    assert serializers.dumps({'disasters': REPORT_PLAN.all(REPORT_PLAN.select().order_by(DisasterReport.id))}) == \
+        flask_bytes({'disasters': [r.to_dict() for r in reports]})
+    assert serializers.dumps(ALERT_PLAN.all(ALERT_PLAN.select())) == \
+        flask_bytes([a.to_dict() for a in Alert.query.all()])
+    assert serializers.dumps(RESOURCE_PLAN.all(RESOURCE_PLAN.select())) == \
+        flask_bytes([r.to_dict() for r in Resource.query.all()])
+
+
+def test_list_endpoints_select_rows_in_one_statement(client, make_user, count_queries):
+    _seed(make_user)
+    # a report whose reporter is gone serializes reporter as null, as to_dict() does
+    db.session.add(DisasterReport(title='Orphan', description='?', location='?', reporter_id=999))
+    db.session.commit()
+    client.get('/api/public/alerts')  # first request brings the schema up to date
+
+    with count_queries() as statements:
+        response = client.get('/api/public/disasters')
+
+    assert response.mimetype == 'application/json'
+    assert len([s for s in statements if s.lstrip().upper().startswith('SELECT')]) == 1
+    body = response.get_json()
+    assert [d['title'] for d in body['disasters']] == ['Orphan', 'Flood']
+    assert body['disasters'][0]['reporter'] is None
+    assert body['disasters'][1]['reporter']['name'] == 'Zoë Ödegaard'
+    assert client.get('/api/public/alerts?limit=5').get_json()['total'] == 1
+    assert client.get('/api/public/resources?type=transport').get_json()['resources'][0]['name'] == 'Boats'
@@ -0,0 +1,77 @@
+"""
+Radius and bounding-box report lookups through the geohash index.
+"""
+import geo
+from models import db, UserRole, DisasterReport, ReportStatus
+from spatial import active_grid
+
+DELHI = (28.6139, 77.2090)
+NOIDA = (28.5355, 77.3910)       # ~20 km from Delhi
+MUMBAI = (19.0760, 72.8777)
+
+
+def _report(reporter, coords, title, status=ReportStatus.PENDING):
+    report = DisasterReport(title=title, description='-', location=title, latitude=coords[0],
+                            longitude=coords[1], status=status, reporter_id=reporter.id)
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+
+def test_geohash_tracks_coordinates(make_user):
+    report = _report(make_user(), DELHI, 'Delhi')
+    assert report.geohash == geo.encode(*DELHI)
+
+    report = db.session.get(DisasterReport, report.id)
+    report.latitude, report.longitude = MUMBAI
+    db.session.commit()
+    assert report.geohash == geo.encode(*MUMBAI)
+
+
+def test_near_returns_active_reports_within_radius_nearest_first(client, make_user):
+    citizen = make_user()
+    _report(citizen, NOIDA, 'Noida')
+    _report(citizen, DELHI, 'Delhi')
+    _report(citizen, MUMBAI, 'Mumbai')
+    _report(citizen, DELHI, 'Resolved', status=ReportStatus.RESOLVED)
+
+    data = client.get(f'/api/public/disasters/near?lat={DELHI[0]}&lon={DELHI[1]}&radius_km=30').get_json()
+    assert [d['title'] for d in data['disasters']] == ['Delhi', 'Noida']
+    assert 15 < data['disasters'][1]['distance_km'] < 25
+
+    data = client.get(f'/api/public/disasters/near?lat={DELHI[0]}&lon={DELHI[1]}&radius_km=5').get_json()
+    assert [d['title'] for d in data['disasters']] == ['Delhi']
+
+
+def test_grid_follows_status_changes(client, make_user):
+    report = _report(make_user(), DELHI, 'Delhi')
+    url = f'/api/public/disasters/near?lat={DELHI[0]}&lon={DELHI[1]}&radius_km=1'
+    assert client.get(url).get_json()['total'] == 1
+
+    report = db.session.get(DisasterReport, report.id)
+    report.status = ReportStatus.RESOLVED
+    db.session.commit()
+
+    assert active_grid._cells == {}
+    assert client.get(url).get_json()['total'] == 0
+
+
+def test_bbox_and_admin_lookup_use_indexed_column(client, make_user, login, count_queries):
+    citizen = make_user()
+    _report(citizen, DELHI, 'Delhi')
+    _report(citizen, MUMBAI, 'Mumbai', status=ReportStatus.RESOLVED)
+
+    data = client.get('/api/public/disasters/bbox?min_lat=18&min_lon=72&max_lat=29&max_lon=78').get_json()
+    assert [d['title'] for d in data['disasters']] == ['Delhi']
+
+    login(make_user(role=UserRole.ADMIN))
+    with count_queries() as statements:
+        data = client.get(f'/api/admin/reports/near?lat={MUMBAI[0]}&lon={MUMBAI[1]}&radius_km=10').get_json()
+    assert [r['title'] for r in data['reports']] == ['Mumbai']
+    assert any('disaster_reports.geohash >=' in s for s in statements)
+
+
+def test_invalid_area_is_rejected(client):
+    assert client.get('/api/public/disasters/near?lat=100&lon=0').status_code == 400
+    assert client.get('/api/public/disasters/near?lat=0&lon=0&radius_km=5000').status_code == 400
+    assert client.get('/api/public/disasters/bbox?min_lat=10').status_code == 400
@@ -0,0 +1,73 @@
+"""
+Serverless startup defaults and the one-time database initialization.
+"""
+import threading
+
+import pytest
+
+import migrations
+from models import db, User
+
+
+@pytest.fixture
+def serverless_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'serverless.db'}")
+    monkeypatch.setenv('SERVERLESS', '1')
+
+    from app import create_app
+    application = create_app()
+    with application.app_context():
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def test_serverless_app_skips_socketio_and_per_request_init(serverless_app):
+    assert 'socketio' not in serverless_app.extensions
+    assert not serverless_app.config['LOG_TO_FILE']
+    assert serverless_app.before_request_funcs.get(None, []) == []
+    assert [name for name, _ in serverless_app.extensions['startup_timer'].phases] == \
+        ['error handlers', 'extensions', 'blueprints']
+    # so the frontend doesn't keep polling /socket.io/ for a server that isn't there
+    assert serverless_app.test_client().get('/api/public/config').get_json() == {'realtime': False}
+
+
+def test_db_init_command_migrates_and_seeds_admin(serverless_app):
+    runner = serverless_app.test_cli_runner()
+
+    output = runner.invoke(args=['db', 'init']).output
+
+    assert 'Created default admin' in output
+    assert User.query.filter_by(email='admin@disaster.com').count() == 1
+    assert 'Created default admin' not in runner.invoke(args=['db', 'init']).output
+    assert serverless_app.test_client().get('/api/public/statistics').status_code == 200
+
+
+def test_concurrent_first_requests_initialize_once(app, monkeypatch):
+    db.drop_all()  # a fresh database: the first request creates the schema
+    calls = []
+    initialize_database = migrations.initialize_database
+
+    def counted():
+        calls.append(1)
+        initialize_database()
+
+    monkeypatch.setattr(migrations, 'initialize_database', counted)
+    start = threading.Barrier(8)
+    statuses = []
+
+    def first_request():
+        client = app.test_client()
+        start.wait()
+        statuses.append(client.get('/api/public/statistics').status_code)
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app.test_client().get('/api/public/statistics')
+
+    assert statuses == [200] * 8
+    assert len(calls) == 1
+    assert User.query.filter_by(email='admin@disaster.com').count() == 1
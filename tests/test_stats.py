@@ -0,0 +1,160 @@
+"""
+Cached aggregate statistics stay correct across writes without re-counting.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import changes
+from models import db, UserRole, DisasterReport, Resource, VolunteerTask, ReportStatus
+from stats import stats_cache, volunteer_task_counts
+
+
+def _report(reporter, **fields):
+    report = DisasterReport(title='Fire', description='Smoke', location='Hill', reporter_id=reporter.id, **fields)
+    db.session.add(report)
+    return report
+
+
+def test_public_statistics_follow_writes_without_recounting(client, make_user, count_queries):
+    citizen = make_user()
+    _report(citizen)
+    _report(citizen, status=ReportStatus.RESOLVED)
+    db.session.add(Resource(name='Water', resource_type='food'))
+    db.session.commit()
+    client.get('/api/public/statistics')
+
+    report = _report(citizen)
+    db.session.add(Resource(name='Beds', resource_type='shelter', availability='in_use'))
+    db.session.commit()
+    report = db.session.get(DisasterReport, report.id)
+    report.status = ReportStatus.IN_PROGRESS
+    db.session.commit()
+    db.session.delete(DisasterReport.query.filter_by(status=ReportStatus.RESOLVED).one())
+    db.session.commit()
+
+    with count_queries() as statements:
+        data = client.get('/api/public/statistics').get_json()
+
+    assert statements == []
+    assert data == {
+        'disaster_stats': {'total_reports': 2, 'active_reports': 2, 'resolved_reports': 0},
+        'resource_stats': {'total': 2, 'available': 1},
+    }
+
+
+def test_admin_dashboard_uses_one_grouped_query_per_table(client, make_user, login, count_queries):
+    make_user(role=UserRole.VOLUNTEER)
+    make_user(role=UserRole.VOLUNTEER)
+    login(make_user(role=UserRole.ADMIN))
+    stats_cache.invalidate()
+
+    with count_queries() as statements:
+        data = client.get('/api/admin/dashboard').get_json()
+
+    assert data['active_volunteers'] == 2
+    assert data['total_reports'] == 0
+    assert sum('GROUP BY' in s for s in statements) == 3
+
+
+def test_bulk_update_drops_cached_counts(client, make_user):
+    citizen = make_user()
+    _report(citizen)
+    _report(citizen)
+    db.session.commit()
+    assert client.get('/api/public/statistics').get_json()['disaster_stats']['active_reports'] == 2
+
+    db.session.query(DisasterReport).update({DisasterReport.status: ReportStatus.RESOLVED})
+    db.session.commit()
+
+    stats = client.get('/api/public/statistics').get_json()['disaster_stats']
+    assert stats == {'total_reports': 2, 'active_reports': 0, 'resolved_reports': 2}
+
+
+def test_counts_expire_after_ttl(app, make_user):
+    citizen = make_user()
+    stats_cache.counts('reports')
+    db.session.execute(DisasterReport.__table__.insert().values(
+        title='Raw', description='Raw', location='Raw', reporter_id=citizen.id))
+    db.session.commit()
+
+    assert sum(stats_cache.counts('reports').values()) == 0
+    stats_cache.ttl = 0
+    assert sum(stats_cache.counts('reports').values()) == 1
+
+
+def test_commits_applied_during_a_reload_are_not_blocked_or_lost(app, make_user, count_queries):
+    citizen = make_user()
+    _report(citizen)
+    db.session.commit()
+    stats_cache.invalidate()
+    applied = []
+
+    def commit_lands(conn, cursor, statement, parameters, context, executemany):
+        if 'GROUP BY disaster_reports.status' in statement and not applied:
+            # another request's commit: its rows may or may not be in this count
+            insert = changes.Change('insert', DisasterReport, {'status': ReportStatus.PENDING}, {})
+            worker = threading.Thread(target=stats_cache.apply_changes, args=([insert],))
+            worker.start()
+            worker.join(timeout=5)
+            applied.append(not worker.is_alive())
+
+    event.listen(db.engine, 'after_cursor_execute', commit_lands)
+    try:
+        assert stats_cache.counts('reports') == {'pending': 1}
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', commit_lands)
+
+    assert applied == [True]  # the commit didn't wait for the query
+    with count_queries() as statements:
+        stats_cache.counts('reports')
+    assert len(statements) == 1  # the count taken during the commit wasn't kept
+
+
+def test_volunteer_dashboard_counts_follow_task_transitions(client, make_user, login, count_queries):
+    report = _report(make_user())
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    db.session.commit()
+    tasks = [
+        VolunteerTask(volunteer_id=volunteer.id, report_id=report.id, task_description=f'Task {i}',
+                      assigned_at=datetime(2024, 1, 1) + timedelta(hours=i))
+        for i in range(7)
+    ]
+    db.session.add_all(tasks)
+    db.session.commit()
+    task_ids = [t.id for t in tasks]
+    login(volunteer)
+    client.get('/api/volunteer/dashboard')
+
+    client.post(f'/api/volunteer/tasks/{task_ids[0]}/start')
+    client.post(f'/api/volunteer/tasks/{task_ids[1]}/complete')
+    client.patch(f'/api/volunteer/tasks/{task_ids[2]}', json={'status': 'failed'})
+
+    with count_queries() as statements:
+        data = client.get('/api/volunteer/dashboard').get_json()
+
+    assert not any('GROUP BY' in s for s in statements)
+    assert (data['total_tasks'], data['assigned'], data['in_progress'], data['completed']) == (7, 4, 1, 1)
+    assert [t['id'] for t in data['recent_tasks']] == task_ids[:1:-1][:5]
+
+
+def test_volunteer_counts_taken_during_a_task_commit_are_not_cached(app, make_user, count_queries):
+    volunteer = make_user(role=UserRole.VOLUNTEER)
+    applied = []
+
+    def commit_lands(conn, cursor, statement, parameters, context, executemany):
+        if 'GROUP BY volunteer_tasks.status' in statement and not applied:
+            assigned = changes.Change('insert', VolunteerTask, {'volunteer_id': volunteer.id, 'status': 'assigned'}, {})
+            volunteer_task_counts.apply_changes([assigned])
+            applied.append(True)
+
+    event.listen(db.engine, 'after_cursor_execute', commit_lands)
+    try:
+        assert volunteer_task_counts.counts(volunteer.id) == {}
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', commit_lands)
+
+    with count_queries() as statements:
+        volunteer_task_counts.counts(volunteer.id)
+    assert len(statements) == 1
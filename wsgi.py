@@ -1,7 +1,17 @@
 """
 WSGI entry point for production deployment with Gunicorn
 """
+import os
+import sys
+
+# The backend modules import each other as top-level modules (`from models import db`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
 from backend.app import app, socketio
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5000)
+    if socketio is not None:
+        socketio.run(app, host='0.0.0.0', port=5000)
+    else:
+        # ENABLE_SOCKETIO=0: no Socket.IO server was created
+        app.run(host='0.0.0.0', port=5000)